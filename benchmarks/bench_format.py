@@ -0,0 +1,58 @@
+"""Benchmark reordering the files in tests/large.
+
+Usage:
+    python benchmarks/bench_format.py --repeat 5
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import libcst as cst
+from libcst.codemod import CodemodContext
+
+from tato._debug import debug_source_code
+from tato.tato import ReorderFileCodemod
+
+LARGE = Path(__file__).parent.parent.joinpath("tests/large")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'file':<24} {'format':>10} {'debug source':>14}")
+    for path in sorted(LARGE.glob("*/before.py")):
+        source = path.read_text()
+        module = cst.parse_module(source)
+        format_times = []
+        debug_times = []
+        for _ in range(args.repeat):
+            format_times.append(_time(lambda: _format(path, source)))
+            # What every run used to pay for, whether or not anyone was debugging.
+            debug_times.append(
+                _time(lambda: [debug_source_code(node) for node in module.body])
+            )
+        name = path.parent.name
+        print(
+            f"{name:<24} {statistics.median(format_times) * 1e3:>8.1f}ms"
+            f" {statistics.median(debug_times) * 1e3:>12.1f}ms"
+        )
+
+
+def _format(path: Path, source: str) -> None:
+    context = CodemodContext(filename=str(path))
+    ReorderFileCodemod(context).transform_module(cst.parse_module(source))
+
+
+def _time(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Benchmark building and querying an index of a synthetic package.
+
+Reports the build time, rows written per second, index size, peak RSS and the
+latency of `count_references`.
+
+Usage:
+    python benchmarks/bench_index.py --modules 50 --definitions 40 --fan-in 3 --reexports 10
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from libcst.helpers import paths
+
+from tato.index.index import Index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modules", type=int, default=50)
+    parser.add_argument("--definitions", type=int, default=40)
+    parser.add_argument(
+        "--fan-in", type=int, default=3, help="Earlier modules each module imports"
+    )
+    parser.add_argument(
+        "--reexports", type=int, default=0, help="Number of re-export chains"
+    )
+    parser.add_argument(
+        "--reexport-depth", type=int, default=3, help="Modules in each chain"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--libcst", action="store_true", help="Collect rows with libcst, not ast"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        generate_package(
+            root / "pkg",
+            args.modules,
+            args.definitions,
+            args.seed,
+            fan_in=args.fan_in,
+            reexports=args.reexports,
+            reexport_depth=args.reexport_depth,
+        )
+        with paths.chdir(root):
+            index_path = Path("pkg").joinpath("tato-index.sqlite3")
+
+            start = time.perf_counter()
+            with _quiet():
+                Index(index_path, ast_analysis=not args.libcst).create()
+            build_time = time.perf_counter() - start
+
+            index = Index(index_path)
+            index.db.cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            rows = _count_rows(index)
+            size = sum(p.stat().st_size for p in Path("pkg").glob("tato-index*"))
+            fqnames = [
+                f"pkg.mod{m}.fn{m}_{d}"
+                for m in range(args.modules)
+                for d in range(args.definitions)
+            ]
+            latencies = []
+            for fqname in fqnames:
+                start = time.perf_counter()
+                index.count_references(fqname)
+                latencies.append(time.perf_counter() - start)
+
+    print(f"modules:                {args.modules}")
+    print(f"definitions per module: {args.definitions}")
+    print(f"fan-in:                 {args.fan_in}")
+    print(f"re-export chains:       {args.reexports} x {args.reexport_depth}")
+    print(f"analysis:               {'libcst' if args.libcst else 'ast'}")
+    print(f"build time:             {build_time:.2f}s")
+    print(f"rows:                   {rows} ({rows / build_time:.0f}/s)")
+    print(f"index size:             {size / 1024:.0f} KiB")
+    print(f"peak RSS:               {_peak_rss() / 1024:.0f} MiB")
+    print(f"count_references mean:  {statistics.mean(latencies) * 1e6:.1f}us")
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"count_references p50:   {quantiles[49] * 1e6:.1f}us")
+    print(f"count_references p99:   {quantiles[98] * 1e6:.1f}us")
+
+
+def generate_package(
+    path: Path,
+    modules: int,
+    definitions: int,
+    seed: int,
+    fan_in: int = 3,
+    reexports: int = 0,
+    reexport_depth: int = 3,
+) -> None:
+    """Write a package where each module imports and calls earlier modules.
+
+    Each module imports from `fan_in` earlier modules. `reexports` chains of
+    `reexport_depth` modules re-export a function, and modules import it from
+    the end of a chain.
+    """
+    rng = random.Random(seed)
+    path.mkdir(parents=True)
+    path.joinpath("__init__.py").write_text("")
+
+    chains = []
+    for c in range(reexports):
+        name = f"fn0_{rng.randrange(definitions)}"
+        source = "pkg.mod0"
+        for k in range(reexport_depth):
+            path.joinpath(f"reexport{c}_{k}.py").write_text(
+                f"from {source} import {name}\n"
+            )
+            source = f"pkg.reexport{c}_{k}"
+        chains.append((source, name))
+
+    for m in range(modules):
+        lines = []
+        imported = []
+        for other in rng.sample(range(m), min(m, fan_in)):
+            names = [f"fn{other}_{d}" for d in rng.sample(range(definitions), min(definitions, 5))]
+            lines.append(f"from pkg.mod{other} import {', '.join(names)}")
+            imported.extend(names)
+        if m > 0 and chains:
+            source, name = rng.choice(chains)
+            if name not in imported:
+                lines.append(f"from {source} import {name}")
+                imported.append(name)
+        lines.append("")
+        for d in range(definitions):
+            calls = rng.sample(imported, min(len(imported), 3))
+            if d > 0:
+                calls.append(f"fn{m}_{rng.randrange(d)}")
+            body = "".join(f"    {c}()\n" for c in calls) or "    pass\n"
+            lines.append(f"\ndef fn{m}_{d}():\n{body}")
+        path.joinpath(f"mod{m}.py").write_text("\n".join(lines))
+
+
+def _count_rows(index: Index) -> int:
+    tables = index.db.cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'"
+    ).fetchall()
+    return sum(
+        index.db.cursor.execute(f"SELECT COUNT(*) FROM {t[0]}").fetchone()[0]
+        for t in tables
+    )
+
+
+def _peak_rss() -> int:
+    """Peak RSS in KiB of this process or any of its worker processes."""
+    return max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+
+
+@contextlib.contextmanager
+def _quiet():
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+        io.StringIO()
+    ):
+        yield
+
+
+if __name__ == "__main__":
+    sys.exit(main())
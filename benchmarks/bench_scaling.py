@@ -0,0 +1,199 @@
+"""Time each phase of the formatter on synthetic modules of growing size.
+
+Prints the time of each phase per module size, and the growth exponent
+between sizes (1.0 is linear, 2.0 is quadratic).
+
+Usage:
+    python benchmarks/bench_scaling.py --sizes 100 200 400 800 --cycle-ratio 0.05
+"""
+
+import argparse
+import math
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import libcst as cst
+from libcst.codemod import CodemodContext
+from libcst.metadata import MetadataWrapper
+
+from tato._graph import Graphs, create_graphs, topological_sort
+from tato._node import rank_nodes
+from tato._section import categorize_sections
+from tato.index.index import NoopIndex
+from tato.tato import ReorderFileCodemod
+
+PHASES = [
+    "metadata",
+    "create_graphs",
+    "topological_sort",
+    "categorize_sections",
+    "end_to_end",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 400, 800])
+    parser.add_argument(
+        "--density", type=int, default=3, help="Calls from each function"
+    )
+    parser.add_argument(
+        "--cycle-ratio",
+        type=float,
+        default=0.05,
+        help="Calls that close a cycle, per definition",
+    )
+    parser.add_argument(
+        "--decorators", type=float, default=0.1, help="Share of decorated functions"
+    )
+    parser.add_argument(
+        "--constant-deps", type=int, default=2, help="Constants each constant uses"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp).joinpath("mod.py")
+        for size in args.sizes:
+            path.write_text(
+                generate_module(
+                    size,
+                    density=args.density,
+                    cycle_ratio=args.cycle_ratio,
+                    decorators=args.decorators,
+                    constant_deps=args.constant_deps,
+                    seed=args.seed,
+                )
+            )
+            timings = [time_phases(path) for _ in range(args.repeat)]
+            rows.append(
+                (size, {p: statistics.median(t[p] for t in timings) for p in PHASES})
+            )
+
+    print(f"{'size':>6} " + " ".join(f"{p:>20}" for p in PHASES))
+    previous = None
+    for size, times in rows:
+        cells = []
+        for phase in PHASES:
+            cell = f"{times[phase] * 1e3:.1f}ms"
+            if previous is not None:
+                prev_size, prev_times = previous
+                exponent = math.log(
+                    max(times[phase], 1e-9) / max(prev_times[phase], 1e-9)
+                ) / math.log(size / prev_size)
+                cell += f" (^{exponent:.2f})"
+            cells.append(f"{cell:>20}")
+        print(f"{size:>6} " + " ".join(cells))
+        previous = (size, times)
+
+
+def generate_module(
+    definitions: int,
+    density: int,
+    cycle_ratio: float,
+    decorators: float,
+    constant_deps: int,
+    seed: int,
+) -> str:
+    """Write a module of constants, classes and functions in a random order.
+
+    Functions call `density` functions with a higher number, so the call graph
+    is acyclic until calls back to a lower number are added, `cycle_ratio`
+    per definition, so the cycles grow with the module.
+    """
+    rng = random.Random(seed)
+    n_constants = definitions // 5
+    n_classes = definitions // 10
+    n_functions = max(2, definitions - n_constants - n_classes)
+    n_decorators = max(1, n_functions // 50)
+
+    calls: dict[int, list[int]] = {
+        i: rng.sample(range(i + 1, n_functions), min(density, n_functions - i - 1))
+        for i in range(n_functions)
+    }
+    for _ in range(round(definitions * cycle_ratio)):
+        src = rng.randrange(1, n_functions)
+        calls[src].append(rng.randrange(src))
+
+    statements = []
+    for i in range(n_constants):
+        deps = rng.sample(range(i), min(i, constant_deps))
+        value = " + ".join(f"C{d}" for d in deps) or str(i)
+        statements.append(f"C{i} = {value}\n")
+    for i in range(n_classes):
+        base = f"(K{rng.randrange(i)})" if i and rng.random() < 0.5 else ""
+        constant = f"C{rng.randrange(n_constants)}" if n_constants else "0"
+        statements.append(f"class K{i}{base}:\n    value = {constant}\n")
+    for i in range(n_decorators):
+        statements.append(f"def deco{i}(fn):\n    return fn\n")
+    for i in range(n_functions):
+        decorator = (
+            f"@deco{rng.randrange(n_decorators)}\n"
+            if rng.random() < decorators
+            else ""
+        )
+        body = "".join(f"    f{c}()\n" for c in calls[i]) or "    pass\n"
+        statements.append(f"{decorator}def f{i}():\n{body}")
+
+    rng.shuffle(statements)
+    return "\n\n".join(statements)
+
+
+def time_phases(path: Path) -> dict[str, float]:
+    source = path.read_text()
+    providers = ReorderFileCodemod.get_inherited_dependencies()
+    index = NoopIndex(path.parent)
+    times = {}
+
+    wrapper = MetadataWrapper(cst.parse_module(source))
+    metadata = _timed(times, "metadata", lambda: wrapper.resolve_many(providers))
+    graphs = _timed(
+        times,
+        "create_graphs",
+        lambda: create_graphs(wrapper.module, metadata, index),
+    )
+    called_by, calls = _timed(
+        times, "topological_sort", lambda: _topological_sort(graphs)
+    )
+    _timed(
+        times,
+        "categorize_sections",
+        lambda: categorize_sections(called_by, index, calls),
+    )
+
+    context = CodemodContext(filename=str(path))
+    _timed(
+        times,
+        "end_to_end",
+        lambda: ReorderFileCodemod(context)
+        .transform_module(cst.parse_module(source))
+        .code,
+    )
+    return times
+
+
+def _topological_sort(graphs: Graphs) -> tuple[list, list]:
+    # As `sort_graphs` does, ranking the nodes is part of ordering them.
+    ranks = rank_nodes(graphs["calls"])
+    return (
+        topological_sort(graphs["called_by"], ranks),
+        topological_sort(graphs["calls"], ranks),
+    )
+
+
+def _timed(times: dict[str, float], phase: str, fn: Callable):
+    start = time.perf_counter()
+    result = fn()
+    times[phase] = time.perf_counter() - start
+    return result
+
+
+if __name__ == "__main__":
+    sys.exit(main())
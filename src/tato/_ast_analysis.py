@@ -0,0 +1,507 @@
+"""Decide whether a module is in order with `ast`, without libcst.
+
+Checking a file needs its graphs, not a tree that can be written back, and
+`ast` parses several times faster than libcst. The visitor records the same
+assignments and accesses as `tato._metadata.GlobalDependencyProvider`, and
+the graphs are ordered by the same code, so both agree on the order. Files
+that are out of order are still reordered with libcst.
+"""
+
+from __future__ import annotations
+
+import ast
+from typing import Iterable, Iterator, Optional, Union
+
+from tato._graph import Graphs, build_graphs, sort_graphs
+from tato._scope import Access, GlobalAssignment, Import, Scope, global_assignments
+from tato.index.index import Index
+
+# `GlobalAccess.order` of a position is `lineno * _LINE + 2 * col_offset`, so
+# `first_access` is the line and twice the column.
+_LINE = 1 << 32
+
+_FunctionT = Union[ast.FunctionDef, ast.AsyncFunctionDef]
+_ComprehensionT = Union[ast.GeneratorExp, ast.ListComp, ast.SetComp, ast.DictComp]
+
+
+def in_order(source: bytes, index: Index, module_name: Optional[str] = None) -> bool:
+    """Whether `ReorderFileCodemod` would leave `source` as it is.
+
+    Raises `SyntaxError` (or `ValueError`) if `ast` can't parse `source`.
+    """
+    lines = top_level_lines(ast.parse(source), source)
+    graphs = create_graphs(lines, index, module_name)
+    imports, sections = sort_graphs(graphs, index)
+    body = [n.node for n in imports] + [n.node for s in sections for n in s.flatten()]
+    return len(body) == len(lines) and all(
+        node is line[0] for node, line in zip(body, lines)
+    )
+
+
+def top_level_lines(module: ast.Module, source: bytes) -> list[list[ast.stmt]]:
+    """The statements of `module`, by line.
+
+    Like `cst.SimpleStatementLine`, statements separated by `;` make one line.
+    The first statement stands for its line, as `cst.Module.body` does.
+    """
+    source_lines = source.splitlines(keepends=True)
+    lines: list[list[ast.stmt]] = []
+    for node in module.body:
+        if lines and _same_line(source_lines, lines[-1][-1], node):
+            lines[-1].append(node)
+        else:
+            lines.append([node])
+    return lines
+
+
+def create_graphs(
+    lines: list[list[ast.stmt]], index: Index, module_name: Optional[str] = None
+) -> Graphs:
+    """`tato._graph.create_graphs` of a module parsed by `ast`.
+
+    `lines` are the `top_level_lines` of the module.
+    """
+    visitor = DependencyVisitor()
+    for line in lines:
+        visitor.statement = line[0]
+        for node in line:
+            visitor.visit(node)
+
+    statements = [line[0] for line in lines]
+    node_fqns = {}
+    if module_name:
+        node_fqns = {
+            node: f"{module_name}.{node.name}"
+            for node in statements
+            if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef))
+        }
+    num_references = index.count_references_many(node_fqns.values())
+    return build_graphs(
+        statements,
+        visitor.global_assignments(),
+        {node: num_references[fqn] for node, fqn in node_fqns.items()},
+        position=lambda access: divmod(access.order, _LINE),
+    )
+
+
+def _same_line(source_lines: list[bytes], prev: ast.stmt, node: ast.stmt) -> bool:
+    """Whether `node` follows `prev` after a `;`, on the same logical line."""
+    end_lineno = prev.end_lineno or prev.lineno
+    if node.lineno == end_lineno:
+        return True
+    if not source_lines[end_lineno - 1].rstrip(b"\r\n").endswith(b"\\"):
+        return False
+    gap = b"".join(
+        [
+            source_lines[end_lineno - 1][prev.end_col_offset :],
+            *source_lines[end_lineno : node.lineno - 1],
+            source_lines[node.lineno - 1][: node.col_offset],
+        ]
+    )
+    for continuation in (b"\\\r\n", b"\\\n", b"\\\r"):
+        gap = gap.replace(continuation, b"")
+    return (
+        gap.lstrip(b" \t\f").startswith(b";") and b"\n" not in gap and b"\r" not in gap
+    )
+
+
+def _order(lineno: int, col_offset: int, before: bool = False) -> int:
+    """`GlobalAccess.order` of a position, or of just before it."""
+    return lineno * _LINE + 2 * col_offset - before
+
+
+class DependencyVisitor(ast.NodeVisitor):
+    """Records assignments and accesses like `_metadata._DependencyVisitor`.
+
+    Nodes are visited in the same order, so assignment-like nodes are counted
+    the same. Accesses are ordered by their position rather than numbered.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.scope = Scope()
+        self.statement: ast.stmt
+        self.accesses: list[Access[ast.AST]] = []
+        self.attributes: list[Optional[ast.Attribute]] = [None]
+        self.in_annotation = [False]
+        self.in_type_hint = [False]
+        self.ignored_subscripts: set[ast.Subscript] = set()
+        self.string_annotation: Optional[ast.Constant] = None
+        self.string_annotation_order = 0
+
+    def global_assignments(self) -> list[GlobalAssignment]:
+        return global_assignments(self.scope.globals, self.accesses, dotted_names)
+
+    def _visit_all(self, nodes: Iterable[Optional[ast.AST]]) -> None:
+        for node in nodes:
+            if node is not None:
+                self.visit(node)
+
+    def _record(
+        self, name: str, node: ast.AST, imported: Optional[Import] = None
+    ) -> None:
+        self.scope.record(name, node, self.statement, imported)
+
+    def _name(self, name: str, node: ast.AST, order: int, store: bool) -> None:
+        """Record a name, like `visit_Name` of libcst."""
+        if store and self.string_annotation is None:
+            self._record(name, node)
+            return
+        self.accesses.append(
+            Access(
+                name=name,
+                node=node,
+                scope=self.scope,
+                index=self.scope.count,
+                statement=self.statement,
+                # Names in a string annotation are all accessed where the
+                # string is.
+                order=order
+                if self.string_annotation is None
+                else self.string_annotation_order,
+                attribute=self.attributes[-1],
+                string_annotation=self.string_annotation,
+            )
+        )
+
+    def visit_Name(self, node: ast.Name) -> None:
+        self._name(
+            node.id,
+            node,
+            _order(node.lineno, node.col_offset),
+            isinstance(node.ctx, ast.Store),
+        )
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        self._visit_all([*node.targets, node.value])
+        self.scope.count += 1
+
+    def visit_AnnAssign(self, node: ast.AnnAssign) -> None:
+        self.visit(node.target)
+        self._visit_annotation(node.annotation)
+        self._visit_all([node.value])
+        self.scope.count += 1
+
+    def visit_AugAssign(self, node: ast.AugAssign) -> None:
+        self._visit_all([node.target, node.value])
+        self.scope.count += 1
+
+    def visit_NamedExpr(self, node: ast.NamedExpr) -> None:
+        self._visit_all([node.target, node.value])
+        self.scope.count += 1
+
+    def visit_For(self, node: Union[ast.For, ast.AsyncFor]) -> None:
+        self.visit(node.target)
+        self.scope.count += 1
+        self._visit_all([node.iter, *node.body, *node.orelse])
+
+    visit_AsyncFor = visit_For
+
+    def visit_With(self, node: Union[ast.With, ast.AsyncWith]) -> None:
+        for item in node.items:
+            self.visit(item.context_expr)
+            if item.optional_vars is not None:
+                self.visit(item.optional_vars)
+                # `cst.AsName`
+                self.scope.count += 1
+            # `cst.WithItem`
+            self.scope.count += 1
+        self._visit_all(node.body)
+
+    visit_AsyncWith = visit_With
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler) -> None:
+        self._visit_all([node.type])
+        if node.name is not None:
+            # The name is right before the `:` of the handler.
+            first = node.body[0]
+            order = _order(first.lineno, first.col_offset, before=True)
+            self._name(node.name, node, order, store=True)
+            # `cst.AsName`
+            self.scope.count += 1
+        self._visit_all(node.body)
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        if self.attributes[-1] is None:
+            self.attributes[-1] = node
+        self.visit(node.value)
+        if self.attributes[-1] is node:
+            self.attributes[-1] = None
+
+    def visit_Call(self, node: ast.Call) -> None:
+        self.attributes.append(None)
+        self.in_type_hint.append(False)
+        # Positional and keyword arguments, in source order.
+        args: list[ast.AST] = sorted(
+            [*node.args, *node.keywords], key=lambda a: (a.lineno, a.col_offset)
+        )
+        name = full_name(node)
+        qnames = self.scope.qualified_names(name) if name else set()
+        self.visit(node.func)
+        if "typing.NewType" in qnames or "typing.TypeVar" in qnames:
+            # The first argument is the name of the type, not an annotation.
+            self.in_type_hint[-1] = True
+            self._visit_all(args[1:])
+        elif "typing.cast" in qnames:
+            if args:
+                self.in_type_hint.append(True)
+                self.visit(args[0])
+                self.in_type_hint.pop()
+                self._visit_all(args[1:])
+        else:
+            self._visit_all(args)
+        self.attributes.pop()
+        self.in_type_hint.pop()
+
+    def visit_Subscript(self, node: ast.Subscript) -> None:
+        in_type_hint = False
+        if isinstance(node.value, ast.Name):
+            qnames = self.scope.qualified_names(node.value.id)
+            if any(n.startswith(("typing.", "typing_extensions.")) for n in qnames):
+                in_type_hint = True
+            if "typing.Literal" in qnames or "typing_extensions.Literal" in qnames:
+                self.ignored_subscripts.add(node)
+        self.in_type_hint.append(in_type_hint)
+        self._visit_all([node.value, node.slice])
+        self.in_type_hint.pop()
+        self.ignored_subscripts.discard(node)
+
+    def _visit_annotation(self, node: ast.expr) -> None:
+        self.in_annotation.append(True)
+        self.visit(node)
+        self.in_annotation.pop()
+
+    def visit_Constant(self, node: ast.Constant) -> None:
+        if isinstance(node.value, (str, bytes)):
+            self._visit_string_annotation(node)
+
+    def visit_JoinedStr(self, node: ast.JoinedStr) -> None:
+        # The text of an f-string is never an annotation.
+        for value in node.values:
+            if isinstance(value, ast.FormattedValue):
+                self._visit_all([value.value, value.format_spec])
+
+    def _visit_string_annotation(self, node: ast.Constant) -> None:
+        """Visit the code of a string, if it is an annotation."""
+        if (
+            not (self.in_type_hint[-1] or self.in_annotation[-1])
+            or self.ignored_subscripts
+            or not node.value
+        ):
+            return
+        outermost = self.string_annotation is None
+        if outermost:
+            self.string_annotation = node
+            self.string_annotation_order = _order(node.lineno, node.col_offset)
+        try:
+            module = ast.parse(node.value)
+        except (SyntaxError, ValueError):
+            pass
+        else:
+            self._visit_all(module.body)
+        if outermost:
+            self.string_annotation = None
+
+    def visit_Import(self, node: ast.Import) -> None:
+        self._visit_import(node, "")
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        self._visit_import(node, "." * node.level + (node.module or ""))
+
+    def _visit_import(
+        self, node: Union[ast.Import, ast.ImportFrom], module: str
+    ) -> None:
+        if node.names[0].name != "*":
+            imported = Import(module, tuple((a.name, a.asname) for a in node.names))
+            for alias in node.names:
+                if alias.asname is not None:
+                    self._record(alias.asname, node, imported)
+                    continue
+                # `import a.b` assigns `a.b` and `a`.
+                name = alias.name
+                while True:
+                    self._record(name, node, imported)
+                    idx = name.rfind(".")
+                    if idx == -1:
+                        break
+                    name = name[:idx]
+        self.scope.count += 1
+
+    def visit_Global(self, node: ast.Global) -> None:
+        if self.scope.parent is not None:
+            for name in node.names:
+                self.scope.overwrites[name] = self.scope.globals
+        self.scope.count += 1
+
+    def visit_Nonlocal(self, node: ast.Nonlocal) -> None:
+        if self.scope.parent is not None:
+            for name in node.names:
+                self.scope.overwrites[name] = self.scope.parent
+        self.scope.count += 1
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self._record(node.name, node)
+        self._visit_all([*node.decorator_list, *node.bases, *node.keywords])
+        outer = self.scope
+        self.scope = Scope(outer, node.name, is_class=True)
+        self._visit_all(node.body)
+        self.scope = outer
+        self.scope.count += 1
+
+    def visit_FunctionDef(self, node: _FunctionT) -> None:
+        self._record(node.name, node)
+        self._visit_all(node.decorator_list)
+        outer = self.scope
+        scope = Scope(outer, node.name, "<locals>")
+        self.scope = scope
+        self._visit_arguments(node.args)
+        if node.returns is not None:
+            self.scope = outer
+            self._visit_annotation(node.returns)
+            self.scope = scope
+        self._visit_all(node.body)
+        self.scope = outer
+        self.scope.count += 1
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node: ast.Lambda) -> None:
+        outer = self.scope
+        self.scope = Scope(outer, None, "<locals>")
+        self._visit_arguments(node.args)
+        self.visit(node.body)
+        self.scope = outer
+
+    def _visit_arguments(self, node: ast.arguments) -> None:
+        """Visit parameters like `cst.Parameters`, in source order."""
+        positional = [*node.posonlyargs, *node.args]
+        defaults: list[Optional[ast.expr]] = [None] * (
+            len(positional) - len(node.defaults)
+        )
+        params = [
+            *zip(positional, [*defaults, *node.defaults]),
+            (node.vararg, None),
+            *zip(node.kwonlyargs, node.kw_defaults),
+            (node.kwarg, None),
+        ]
+        for arg, default in params:
+            if arg is None:
+                continue
+            self._record(arg.arg, arg)
+            # Annotations and defaults are evaluated in the enclosing scope.
+            scope = self.scope
+            self.scope = scope.parent  # type: ignore[assignment]
+            if arg.annotation is not None:
+                self._visit_annotation(arg.annotation)
+            self._visit_all([default])
+            self.scope = scope
+        # `cst.Parameters`
+        self.scope.count += 1
+
+    def visit_GeneratorExp(self, node: _ComprehensionT) -> None:
+        self._visit_comprehension(node)
+
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp
+
+    def _visit_comprehension(self, node: _ComprehensionT) -> None:
+        first, *inner = node.generators
+        outer = self.scope
+        scope = Scope(outer, "<comprehension>")
+        self.scope = scope
+
+        start = len(self.accesses)
+        if isinstance(node, ast.DictComp):
+            self._visit_all([node.key, node.value])
+        else:
+            self.visit(node.elt)
+        # The element is evaluated after the `for`s, once its names are
+        # assigned.
+        elt_accesses = [a for a in self.accesses[start:] if a.scope is scope]
+
+        self.visit(first.target)
+        scope.count += 1
+        # The first iterable is evaluated in the enclosing scope.
+        self.scope = outer
+        self.visit(first.iter)
+        self.scope = scope
+        self._visit_all(first.ifs)
+        for comprehension in inner:
+            self._visit_all(
+                [comprehension.target, comprehension.iter, *comprehension.ifs]
+            )
+        # Each nested `cst.CompFor` is counted when left.
+        scope.count += len(inner)
+
+        for access in elt_accesses:
+            access.index = scope.count
+        self.scope = outer
+
+    def visit_MatchAs(self, node: ast.MatchAs) -> None:
+        self._visit_all([node.pattern])
+        if node.name is not None:
+            self._pattern_name(node.name, node)
+
+    def visit_MatchStar(self, node: ast.MatchStar) -> None:
+        if node.name is not None:
+            self._pattern_name(node.name, node)
+
+    def visit_MatchMapping(self, node: ast.MatchMapping) -> None:
+        for key, pattern in zip(node.keys, node.patterns):
+            self._visit_all([key, pattern])
+        if node.rest is not None:
+            # Only a `,` can be between the name and the closing `}`.
+            end = (node.end_lineno, node.end_col_offset)
+            order = _order(*end, before=True)  # type: ignore[arg-type]
+            self._name(node.rest, node, order, store=False)
+
+    def visit_MatchClass(self, node: ast.MatchClass) -> None:
+        self._visit_all([node.cls, *node.patterns])
+        for attr, pattern in zip(node.kwd_attrs, node.kwd_patterns):
+            # The attribute is right before the `=` of its pattern.
+            order = _order(pattern.lineno, pattern.col_offset, before=True)
+            self._name(attr, node, order, store=False)
+            self.visit(pattern)
+
+    def _pattern_name(
+        self, name: str, node: Union[ast.MatchAs, ast.MatchStar]
+    ) -> None:
+        # Captures are accesses for libcst, and end their pattern.
+        col_offset = node.end_col_offset - len(name.encode())  # type: ignore[operator]
+        order = _order(node.end_lineno, col_offset)  # type: ignore[arg-type]
+        self._name(name, node, order, store=False)
+
+
+def full_name(node: ast.AST) -> Optional[str]:
+    """Like `libcst.helpers.get_full_name_for_node`.
+
+    Unlike libcst, the attribute of a value without a name (e.g. `(a + b).x`)
+    has no name, rather than `"None.x"`.
+    """
+    if isinstance(node, ast.Name):
+        return node.id
+    elif isinstance(node, ast.Attribute):
+        name = full_name(node.value)
+        return None if name is None else f"{name}.{node.attr}"
+    elif isinstance(node, ast.Call):
+        return full_name(node.func)
+    elif isinstance(node, ast.Subscript):
+        return full_name(node.value)
+    return None
+
+
+def dotted_names(node: ast.AST) -> Iterator[tuple[str, ast.AST]]:
+    """Like `libcst.metadata.scope_provider._gen_dotted_names`."""
+    if isinstance(node, ast.Name):
+        yield node.id, node
+    elif isinstance(node, ast.Attribute):
+        value = node.value
+        if isinstance(value, ast.Call):
+            if isinstance(value.func, (ast.Attribute, ast.Name)):
+                yield from dotted_names(value.func)
+        elif isinstance(value, (ast.Attribute, ast.Name)):
+            names = dotted_names(value)
+            first = next(names, None)
+            if first is not None:
+                yield f"{first[0]}.{node.attr}", node
+                yield first
+                yield from names
@@ -0,0 +1,142 @@
+import functools
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+from tato.__about__ import __version__
+
+# Entries beyond this are evicted, least recently used first.
+DEFAULT_MAX_ENTRIES = 100_000
+
+# Wait this long (in seconds) for other processes holding the write lock.
+TIMEOUT = 30
+
+
+def cache_key(source: bytes, index_generation: str = "", path: str = "") -> str:
+    """Key of `source` when formatted with the index of `index_generation`.
+
+    With an index, the layout depends on the module name, so `path` (relative
+    to the repository root) is part of the key.
+    """
+    salt = _salt(index_generation)
+    if index_generation:
+        salt += f"{path}\0".encode()
+    return hashlib.sha256(salt + source).hexdigest()
+
+
+def default_cache_dir() -> Path:
+    if cache_dir := os.environ.get("TATO_CACHE_DIR"):
+        return Path(cache_dir)
+    xdg_cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(xdg_cache_home) / "tato"
+
+
+class FormatCache:
+    """Cache of file contents that are known to be formatted.
+
+    Entries are keyed by a hash of the file content, the tato and libcst
+    versions, and the generation of the index used to format the file (and,
+    with an index, the path of the file). A file whose key is in the cache
+    does not need to be parsed at all.
+
+    The cache is a SQLite database, so several processes can use it at once.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        index_generation: str = "",
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        repo_root: str = ".",
+    ) -> None:
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.index_generation = index_generation
+        self.repo_root = repo_root
+        self.max_entries = max_entries
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.cache_dir / "cache.sqlite3", timeout=TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS Formatted (
+                key TEXT PRIMARY KEY,
+                last_used REAL NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        self.conn.commit()
+
+    def key(self, source: bytes, filename: str) -> str:
+        return cache_key(
+            source, self.index_generation, os.path.relpath(filename, self.repo_root)
+        )
+
+    def unformatted(self, filenames: Sequence[str]) -> list[str]:
+        """Return the files that are not known to be formatted."""
+        keys = {}
+        for filename in filenames:
+            try:
+                keys[filename] = self.key(Path(filename).read_bytes(), filename)
+            except OSError:
+                # Let the formatter report the error.
+                keys[filename] = ""
+        hits = self._lookup(list(keys.values()))
+        return [f for f, k in keys.items() if k not in hits]
+
+    def add(self, keys: Iterable[str]) -> None:
+        """Record the `keys` (see `cache_key`) of formatted files."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO Formatted (key, last_used) VALUES (?, ?)",
+                [(k, now) for k in keys],
+            )
+
+    def evict(self) -> None:
+        """Drop the least recently used entries beyond `max_entries`."""
+        with self.conn:
+            self.conn.execute(
+                """
+                DELETE FROM Formatted WHERE key IN (
+                    SELECT key FROM Formatted
+                    ORDER BY last_used DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _lookup(self, keys: list[str]) -> set[str]:
+        """Return the `keys` in the cache, and mark them as recently used."""
+        hits: set[str] = set()
+        # Stay well below SQLite's limit on the number of variables in a query.
+        for i in range(0, len(keys), 500):
+            chunk = keys[i : i + 500]
+            res = self.conn.execute(
+                f"SELECT key FROM Formatted WHERE key IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            hits.update(row[0] for row in res.fetchall())
+        if hits:
+            now = time.time()
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE Formatted SET last_used = ? WHERE key = ?",
+                    [(now, k) for k in hits],
+                )
+        return hits
+
+
+@functools.lru_cache(maxsize=None)
+def _salt(index_generation: str) -> bytes:
+    # Imported here: the `tato daemon` client uses this module, and must not
+    # pay for importing libcst.
+    from libcst._version import __version__ as libcst_version
+
+    return f"{__version__}\0{libcst_version}\0{index_generation}\0".encode()
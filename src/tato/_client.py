@@ -0,0 +1,68 @@
+"""Client for `tato daemon`.
+
+Must not import libcst, so `tato format` can hand off to a running daemon
+without paying for importing it.
+"""
+
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+from tato.__about__ import __version__
+from tato._cache import default_cache_dir
+
+# Environment variables that change what `tato format` does. The daemon uses
+# the client's values for every request.
+FORWARDED_ENV = ("TATO_DEBUG_EXPLAIN", "TATO_CACHE_DIR", "XDG_CACHE_HOME")
+
+
+def socket_path() -> Path:
+    if path := os.environ.get("TATO_DAEMON_SOCKET"):
+        return Path(path)
+    return default_cache_dir() / "daemon.sock"
+
+
+def request(
+    message: dict[str, Any], path: Optional[Path] = None
+) -> Optional[dict[str, Any]]:
+    """Send one message to the daemon and return its response.
+
+    Returns None if no daemon is listening on the socket.
+    """
+    path = path or socket_path()
+    if not path.exists():
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(path))
+            sock.sendall(json.dumps(message).encode() + b"\n")
+            with sock.makefile("rb") as f:
+                line = f.readline()
+    except OSError:
+        # A socket left behind by a daemon that is gone.
+        return None
+    return json.loads(line) if line else None
+
+
+def format_with_daemon(argv: Sequence[str]) -> Optional[int]:
+    """Run `tato <argv>` in the daemon, if one is running.
+
+    Returns the exit code, or None if the command has to run locally.
+    """
+    response = request(
+        {
+            "command": "format",
+            "version": __version__,
+            "cwd": os.getcwd(),
+            "argv": list(argv),
+            "env": {k: os.environ[k] for k in FORWARDED_ENV if k in os.environ},
+        }
+    )
+    if response is None or "error" in response:
+        return None
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["exit_code"]
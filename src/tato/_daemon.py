@@ -0,0 +1,129 @@
+"""Long-running process that serves `tato format` requests.
+
+Clients send one JSON object per line over a Unix socket, and get one JSON
+object back:
+
+    {"command": "format", "version": ..., "cwd": ..., "argv": [...], "env": {...}}
+    -> {"exit_code": 0, "stdout": "...", "stderr": "..."}
+
+    {"command": "ping"} -> {"version": ...}
+    {"command": "stop"} -> {}
+
+Requests are served one at a time, so a request can change the working
+directory and environment while it runs.
+"""
+
+import contextlib
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+import traceback
+from pathlib import Path
+from typing import Any, Iterator, Mapping
+
+from libcst.helpers import paths
+
+from tato.__about__ import __version__
+from tato._client import FORWARDED_ENV, request
+
+# Parsed modules kept by the daemon, see `ExecutorConfig.parse_cache_size`.
+PARSE_CACHE_SIZE = 256
+
+
+class DaemonError(Exception):
+    pass
+
+
+def serve(path: Path) -> None:
+    """Serve requests on the socket at `path` until stopped."""
+    if path.exists():
+        if request({"command": "ping"}, path) is not None:
+            raise DaemonError(f"A daemon is already listening on {path}")
+        # Left behind by a daemon that is gone.
+        path.unlink()
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with _Server(str(path), _Handler) as server:
+        print(f"Listening on {path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            path.unlink(missing_ok=True)
+
+
+def stop(path: Path) -> bool:
+    """Stop the daemon listening on `path`. Returns False if there is none."""
+    return request({"command": "stop"}, path) is not None
+
+
+class _Server(socketserver.UnixStreamServer):
+    def handle_message(self, message: Mapping[str, Any]) -> dict[str, Any]:
+        command = message.get("command")
+        if command == "ping":
+            return {"version": __version__}
+        if command == "stop":
+            # `shutdown` waits for `serve_forever` to return, which waits for
+            # this request to finish.
+            threading.Thread(target=self.shutdown).start()
+            return {}
+        if command == "format":
+            if message.get("version") != __version__:
+                return {"error": f"The daemon runs tato version {__version__}"}
+            return _format(message)
+        return {"error": f"Unknown command: {command}"}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: _Server
+
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            return
+        response = self.server.handle_message(json.loads(line))
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+def _format(message: Mapping[str, Any]) -> dict[str, Any]:
+    # Imported late to keep the import cycle between the cli and daemon simple.
+    from tato.cli import parse_args, run_format
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            with paths.chdir(Path(message["cwd"])), _environ(message["env"]):
+                exit_code = run_format(
+                    parse_args(message["argv"]), parse_cache_size=PARSE_CACHE_SIZE
+                )
+        except SystemExit as ex:
+            exit_code = ex.code if isinstance(ex.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+    return {
+        "exit_code": exit_code,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+    }
+
+
+@contextlib.contextmanager
+def _environ(env: Mapping[str, str]) -> Iterator[None]:
+    """Use the client's values of `FORWARDED_ENV`."""
+    saved = {k: os.environ.get(k) for k in FORWARDED_ENV}
+    for k in FORWARDED_ENV:
+        os.environ.pop(k, None)
+    os.environ.update({k: v for k, v in env.items() if k in FORWARDED_ENV})
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
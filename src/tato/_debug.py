@@ -1,13 +1,16 @@
+import ast
 import functools
 import time
 from contextlib import contextmanager
-from typing import Callable
+from typing import Callable, Union
 
 import libcst as cst
 
 
-def debug_source_code(node: cst.CSTNode) -> str:
+def debug_source_code(node: Union[cst.CSTNode, ast.AST]) -> str:
     """Return source code. Useful for debugging."""
+    if isinstance(node, ast.AST):
+        return ast.unparse(node)
     tree = cst.parse_module("")
     tree = tree.with_changes(body=[node])
     return tree.code
@@ -0,0 +1,337 @@
+import dataclasses
+import enum
+import os
+import re
+import subprocess
+import sys
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional, Sequence
+
+import libcst as cst
+from libcst.codemod import CodemodContext, SkipFile, diff_code
+from libcst.helpers import calculate_module_and_package
+
+from tato import _ast_analysis, _memory, _pool, _trace
+from tato._cache import cache_key
+from tato.tato import ReorderFileCodemod, open_index
+
+# Recently parsed modules, by source. See `ExecutorConfig.parse_cache_size`.
+_parsed: "OrderedDict[bytes, cst.Module]" = OrderedDict()
+_parsed_lock = threading.Lock()
+
+
+class Backend(str, enum.Enum):
+    SERIAL = "serial"
+    PROCESS = "process"
+    THREAD = "thread"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class Status(enum.Enum):
+    SUCCESS = "success"
+    SKIP = "skip"
+    FAILURE = "failure"
+
+
+@dataclasses.dataclass(frozen=True)
+class ExecutorConfig:
+    with_index: Optional[str] = None
+    repo_root: str = "."
+    format_code: bool = True
+    formatter_args: Sequence[str] = ()
+    generated_code_marker: str = "@generated"
+    include_generated: bool = False
+    blacklist_patterns: Sequence[str] = ()
+    # Set to compute the cache key of every formatted file.
+    cache_generation: Optional[str] = None
+    # Report files that would change, instead of writing them.
+    check: bool = False
+    # Lines of context of a unified diff of each file that would change.
+    # Implies `check`.
+    diff: Optional[int] = None
+    # Parsed modules to keep for later files with the same source. Only worth
+    # it in long-running processes (see `tato daemon`).
+    parse_cache_size: int = 0
+    # Record the time of each phase, see `tato._trace`.
+    trace: bool = False
+    # Measure the peak memory of each file, see `tato._memory`.
+    profile_memory: bool = False
+    # Check with `ast` whether files are in order first, so only the files to
+    # reorder are parsed by libcst. See `tato._ast_analysis`.
+    ast_analysis: bool = True
+
+    @property
+    def dry_run(self) -> bool:
+        return self.check or self.diff is not None
+
+
+@dataclasses.dataclass(frozen=True)
+class FileResult:
+    filename: str
+    status: Status
+    changed: bool = False
+    warnings: Sequence[str] = ()
+    # Reason for a skip, or the traceback of a failure.
+    message: str = ""
+    # `cache_key` of the file's formatted content.
+    cache_key: str = ""
+    # See `ExecutorConfig.diff`.
+    diff: str = ""
+    # See `ExecutorConfig.trace`.
+    trace_events: Sequence[dict] = ()
+    # See `ExecutorConfig.profile_memory`.
+    memory: Optional[_memory.FileMemory] = None
+
+
+@dataclasses.dataclass
+class ExecutionSummary:
+    successes: int = 0
+    failures: int = 0
+    skips: int = 0
+    warnings: int = 0
+    # Files that changed, or would change in check mode.
+    changed: int = 0
+    cache_keys: list[str] = dataclasses.field(default_factory=list)
+    trace_events: list[dict] = dataclasses.field(default_factory=list)
+    file_memory: list[_memory.FileMemory] = dataclasses.field(default_factory=list)
+
+    @property
+    def total(self) -> int:
+        return self.successes + self.failures + self.skips
+
+
+def execute(
+    filenames: Sequence[str],
+    config: ExecutorConfig,
+    jobs: Optional[int] = None,
+    backend: Optional[Backend] = None,
+) -> ExecutionSummary:
+    """Reorder `filenames` in place, printing failures as libcst.tool does."""
+    # Duplicates could be written concurrently.
+    filenames = sorted({os.path.abspath(f) for f in filenames})
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(filenames)))
+    backend = backend or choose_backend(len(filenames), jobs)
+
+    summary = ExecutionSummary()
+    for result in _results(filenames, config, jobs, backend):
+        _print_result(result, config.dry_run)
+        if result.status is Status.SUCCESS:
+            summary.successes += 1
+        elif result.status is Status.SKIP:
+            summary.skips += 1
+        else:
+            summary.failures += 1
+        summary.warnings += len(result.warnings)
+        summary.changed += result.changed
+        if result.cache_key:
+            summary.cache_keys.append(result.cache_key)
+        summary.trace_events.extend(result.trace_events)
+        if result.memory:
+            summary.file_memory.append(result.memory)
+    return summary
+
+
+def choose_backend(num_files: int, jobs: int) -> Backend:
+    if _pool.is_serial(num_files, jobs):
+        return Backend.SERIAL
+    # Threads only run in parallel on free-threaded builds.
+    if not getattr(sys, "_is_gil_enabled", lambda: True)():
+        return Backend.THREAD
+    return Backend.PROCESS
+
+
+def format_file(filename: str, config: ExecutorConfig) -> FileResult:
+    """Reorder a single file, and write it back if it changed."""
+    if config.profile_memory:
+        _memory.reset_file_peak()
+    if config.trace:
+        with _trace.record() as events:
+            with _trace.span("format_file", filename=filename):
+                result = _format_file(filename, config)
+        result = dataclasses.replace(result, trace_events=tuple(events))
+    else:
+        result = _format_file(filename, config)
+    if config.profile_memory:
+        result = dataclasses.replace(result, memory=_memory.file_memory(filename))
+    return result
+
+
+def _format_file(filename: str, config: ExecutorConfig) -> FileResult:
+    for pattern in config.blacklist_patterns:
+        if re.fullmatch(pattern, filename):
+            return FileResult(
+                filename, Status.SKIP, message=f"Blacklisted by pattern {pattern}."
+            )
+
+    context = CodemodContext()
+    try:
+        with _trace.span("read"):
+            oldcode = Path(filename).read_bytes()
+        if (
+            not config.include_generated
+            and config.generated_code_marker.encode("utf-8") in oldcode
+        ):
+            return FileResult(filename, Status.SKIP, message="Generated file.")
+
+        # No metadata needs a `FullRepoManager`. The module name is all the
+        # index needs.
+        mod_pkg = calculate_module_and_package(config.repo_root, filename)
+        context = CodemodContext(
+            filename=filename,
+            full_module_name=mod_pkg.name,
+            full_package_name=mod_pkg.package,
+        )
+        # Skip libcst, code generation and the formatter for files already in
+        # order.
+        newcode = oldcode
+        if not _in_order(oldcode, config, mod_pkg.name):
+            transform = ReorderFileCodemod(context, with_index=config.with_index)
+            with _trace.span("parse"):
+                module = _parse(oldcode, config.parse_cache_size)
+            with _trace.span("transform"):
+                newmodule = transform.transform_module(module)
+            if transform.reordered:
+                with _trace.span("codegen"):
+                    newcode = newmodule.bytes
+        if config.format_code and newcode != oldcode:
+            with _trace.span("formatter"):
+                newcode = subprocess.check_output(
+                    config.formatter_args, input=newcode
+                )
+
+        changed = newcode != oldcode
+        diff = ""
+        if changed and config.diff is not None:
+            diff = diff_code(
+                oldcode.decode(newmodule.encoding),
+                newcode.decode(newmodule.encoding),
+                config.diff,
+                filename=filename,
+            )
+        elif changed and not config.dry_run:
+            with _trace.span("write"):
+                Path(filename).write_bytes(newcode)
+    except SkipFile as ex:
+        return FileResult(
+            filename,
+            Status.SKIP,
+            warnings=tuple(context.warnings),
+            message=str(ex),
+        )
+    except Exception as ex:
+        message = traceback.format_exc()
+        if isinstance(ex, subprocess.CalledProcessError) and ex.output:
+            message = f"{ex.output.decode('utf-8')}\n{message}"
+        return FileResult(
+            filename,
+            Status.FAILURE,
+            warnings=tuple(context.warnings),
+            message=message,
+        )
+
+    return FileResult(
+        filename,
+        Status.SUCCESS,
+        changed=changed,
+        warnings=tuple(context.warnings),
+        cache_key=(
+            cache_key(
+                newcode,
+                config.cache_generation,
+                os.path.relpath(filename, config.repo_root),
+            )
+            if config.cache_generation is not None and not (changed and config.dry_run)
+            else ""
+        ),
+        diff=diff,
+    )
+
+
+def _in_order(source: bytes, config: ExecutorConfig, module_name: str) -> bool:
+    """Whether `tato._ast_analysis` finds `source` in order."""
+    if not config.ast_analysis or os.environ.get("TATO_DEBUG_EXPLAIN") == "1":
+        return False
+    with _trace.span("ast_analysis"):
+        try:
+            return _ast_analysis.in_order(
+                source,
+                open_index(config.with_index),
+                module_name if config.with_index else None,
+            )
+        except (SyntaxError, ValueError, RecursionError):
+            # Left to libcst, which reports the error (or parses the file).
+            return False
+
+
+def _format_files(
+    filenames: Sequence[str], config: ExecutorConfig
+) -> list[FileResult]:
+    return [format_file(f, config) for f in filenames]
+
+
+def _results(
+    filenames: Sequence[str], config: ExecutorConfig, jobs: int, backend: Backend
+) -> Iterator[FileResult]:
+    if backend is Backend.SERIAL:
+        for filename in filenames:
+            yield format_file(filename, config)
+        return
+
+    pool: Executor
+    if backend is Backend.THREAD:
+        pool = ThreadPoolExecutor(max_workers=jobs)
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs, initializer=_warm_parser)
+    with pool:
+        yield from _pool.map_chunks(pool, _format_files, filenames, jobs, config)
+
+
+def _parse(source: bytes, cache_size: int) -> cst.Module:
+    if not cache_size:
+        return cst.parse_module(source)
+    # Modules are immutable, and metadata is computed on a copy, so a module can
+    # be reused as is.
+    with _parsed_lock:
+        module = _parsed.pop(source, None)
+    if module is None:
+        module = cst.parse_module(source)
+    with _parsed_lock:
+        _parsed[source] = module
+        while len(_parsed) > cache_size:
+            _parsed.popitem(last=False)
+    return module
+
+
+def _warm_parser() -> None:
+    cst.parse_module("")
+
+
+def _print_result(result: FileResult, dry_run: bool) -> None:
+    if result.diff:
+        print(result.diff)
+    if dry_run and result.changed:
+        print(f"Would reorder {result.filename}", file=sys.stderr)
+    if result.status is Status.SUCCESS and not result.warnings:
+        return
+    print(f"Codemodding {result.filename}", file=sys.stderr)
+    for warning in result.warnings:
+        print(f"WARNING: {warning}", file=sys.stderr)
+    if result.status is Status.SKIP:
+        print(
+            f"Skipped codemodding {result.filename}: {result.message}\n",
+            file=sys.stderr,
+        )
+    elif result.status is Status.FAILURE:
+        print(result.message, file=sys.stderr)
+        print(f"Failed to codemod {result.filename}\n", file=sys.stderr)
+    else:
+        print(
+            f"Successfully codemodded {result.filename} with warnings\n",
+            file=sys.stderr,
+        )
@@ -1,28 +1,31 @@
 import heapq
 from collections import defaultdict
-from typing import Mapping, TypedDict, cast
-
-import libcst as cst
-from libcst.metadata import (
-    Assignment,
-    ClassScope,
-    CodeRange,
-    FullyQualifiedNameProvider,
-    GlobalScope,
-    ParentNodeProvider,
-    PositionProvider,
-    ProviderT,
-    QualifiedName,
-    Scope,
-    ScopeProvider,
+from typing import (
+    Callable,
+    Generic,
+    Iterable,
+    Iterator,
+    Mapping,
+    Optional,
+    Sequence,
+    TypedDict,
+    TypeVar,
+    cast,
 )
 
-from tato._debug import debug_source_code
-from tato._node import OrderedNode, TopLevelNode
-from tato._node_type import NodeType, node_type
+import libcst as cst
+from libcst.metadata import CodeRange, ProviderT
+
+from tato import _trace
+from tato._metadata import GlobalDependencyProvider
+from tato._node import OrderedNode, Rank, rank_nodes
+from tato._node_type import NodeType, Statement, TopLevelNode, node_type
+from tato._scope import GlobalAccess, GlobalAssignment
+from tato._section import Section, categorize_sections
 from tato.index.index import Index
 
 Graph = dict[OrderedNode, set[OrderedNode]]
+T = TypeVar("T")
 
 # Expected to be larger than any possible line number.
 LARGE_NUM = 10_000_000
@@ -33,13 +36,20 @@ class Graphs(TypedDict):
     called_by: Graph
 
 
-def topological_sort(graph: Graph) -> list[OrderedNode]:
+def topological_sort(
+    graph: Graph, ranks: Mapping[OrderedNode, Rank]
+) -> list[OrderedNode]:
     """
     Sorts a graph of definitions into a topological order.
 
+    Ties are broken by `ranks` (see `rank_nodes`), lowest first.
+
     Example:
-    >>> topological_sort({'a': {'b'}, 'b': {'c'}, 'c': set(), 'd': set()})
-    ['d', 'c', 'b', 'a']
+    >>> topological_sort(
+    ...     {'a': {'b'}, 'b': {'c'}, 'c': set(), 'd': set()},
+    ...     {'d': 0, 'c': 1, 'b': 2, 'a': 3},
+    ... )
+    ['d', 'a', 'b', 'c']
     """
 
     topo_sorted = []
@@ -54,15 +64,16 @@ def topological_sort(graph: Graph) -> list[OrderedNode]:
 
     # Using a heap (sorted list) ensures each section is ordered and each time
     # we see something out of order, we can start a new section.
-    heap = [node for node, count in innodes.items() if count == 0]
+    # Ranks are unique, so nodes are never compared.
+    heap = [(ranks[node], node) for node, count in innodes.items() if count == 0]
     heapq.heapify(heap)
     while heap:
-        node = heapq.heappop(heap)
+        _, node = heapq.heappop(heap)
         topo_sorted.append(node)
         for dst in graph[node]:
             innodes[dst] -= 1
             if innodes[dst] == 0:
-                heapq.heappush(heap, dst)
+                heapq.heappush(heap, (ranks[dst], dst))
     return topo_sorted
 
 
@@ -70,9 +81,21 @@ def create_graphs(
     module: cst.Module,
     metadata: Mapping[ProviderT, Mapping[cst.CSTNode, object]],
     index: Index,
+    module_name: Optional[str] = None,
+    positions: Optional[Mapping[cst.CSTNode, CodeRange]] = None,
 ) -> Graphs:
     """Create a graph of definitions (assignments)
 
+    `metadata` must contain `GlobalDependencyProvider`.
+
+    `module_name` is the fully qualified name of `module`, used to look up
+    references from other files in `index`. Without it, there are none.
+
+    `positions` (from `PositionProvider`) make the first accesses of the
+    nodes lines and columns, which are easier to read when explaining the
+    order. Without them, accesses are numbered in source order, which sorts
+    the same.
+
     :: returns:
         A tuple of two graphs:
         1. The `called_by` graph is used to topologically sort most nodes in
@@ -99,55 +122,72 @@ def create_graphs(
 
 
     """
-    scopes = cast(Mapping[cst.CSTNode, Scope], metadata[ScopeProvider]).values()
-    parents = cast(Mapping[cst.CSTNode, cst.CSTNode], metadata[ParentNodeProvider])
-    positions = cast(Mapping[cst.CSTNode, CodeRange], metadata[PositionProvider])
-    fqns = cast(
-        Mapping[cst.CSTNode, set[QualifiedName]], metadata[FullyQualifiedNameProvider]
+    assignments = cast(
+        Mapping[cst.CSTNode, list[GlobalAssignment]],
+        metadata[GlobalDependencyProvider],
+    )[module]
+
+    # All counts are fetched from the index at once.
+    node_fqns = _top_level_fqns(module, module_name) if module_name else {}
+    with _trace.span("count_references"):
+        num_references = index.count_references_many(node_fqns.values())
+
+    position = None
+    if positions is not None:
+        position = lambda access: (  # noqa: E731
+            positions[access.node].start.line,  # type: ignore[index]
+            positions[access.node].start.column,  # type: ignore[index]
+        )
+    return build_graphs(
+        module.body,
+        assignments,
+        {node: num_references[fqn] for node, fqn in node_fqns.items()},
+        position,
     )
 
-    modulebodyset: set[TopLevelNode] = set(module.body)
-    globalscope = next((s.globals for s in scopes if s is not None))
 
-    def find_top_level_node(node: cst.CSTNode) -> TopLevelNode:
-        """Find the `cst.Module.body` that contains the given node."""
-        while node not in modulebodyset:
-            node = parents[node]
-        return cast(TopLevelNode, node)
+def build_graphs(
+    statements: Sequence[Statement],
+    assignments: Iterable[GlobalAssignment],
+    num_references: Mapping[Statement, int],
+    position: Optional[Callable[[GlobalAccess], tuple[int, int]]] = None,
+) -> Graphs:
+    """The graphs of `create_graphs`, from the top-level `statements` of a
+    module and the `assignments` of its global scope, whatever parsed it.
 
-    names: dict[TopLevelNode, set[str]] = defaultdict(set)
-    calls: dict[TopLevelNode, list[TopLevelNode]] = {}
-    called_by: dict[TopLevelNode, list[TopLevelNode]] = {}
-    has_cycle: dict[TopLevelNode, bool] = defaultdict(lambda: False)
-    first_access: dict[TopLevelNode, tuple[int, int]] = defaultdict(
+    `num_references` are the references of statements from other files.
+    `position` gives the position of an access. Without it, accesses are
+    ordered by `GlobalAccess.order`.
+    """
+    names: dict[Statement, set[str]] = defaultdict(set)
+    calls: dict[Statement, list[Statement]] = {}
+    called_by: dict[Statement, list[Statement]] = {}
+    # The edges of `calls`, in the order they are added.
+    edges: list[tuple[Statement, Statement]] = []
+    first_access: dict[Statement, tuple[int, int]] = defaultdict(
         lambda: (LARGE_NUM, LARGE_NUM)
     )
-    for node in module.body:
+    for node in statements:
         calls[node] = []
         called_by[node] = []
 
-    globalscope = next((s.globals for s in scopes if s is not None), None)
-    if globalscope is None:
-        raise Exception("No global scope found")
-
-    for assignment in globalscope.assignments:
-        if not isinstance(assignment, Assignment):
-            continue
-
-        top_level_assignment = find_top_level_node(assignment.node)
+    for assignment in assignments:
+        top_level_assignment = assignment.statement
         names[top_level_assignment].add(assignment.name)
 
         # Nodes that are not accessed in this file are assumed to be
         # public exports and used by other files. Assumed to be important,
         # so they sort to the top of the file.
-        if len(assignment.references) == 0:
+        if len(assignment.accesses) == 0:
             first_access[top_level_assignment] = (0, 0)
 
-        for access in assignment.references:
-            top_level_access = find_top_level_node(access.node)
+        # In source order, so the edges (and the order of nodes that can't be
+        # told apart) are the same from run to run.
+        for access in sorted(assignment.accesses, key=lambda a: a.order):
+            top_level_access = access.statement
 
             # Skip self-edges.
-            if top_level_assignment == top_level_access:
+            if top_level_assignment is top_level_access:
                 continue
 
             # Ignore usages of imports
@@ -156,7 +196,7 @@ def create_graphs(
 
             # Accessess in globalscope/classscope happen at import time.
             # These values MUST be topological sorted to maintain correctness.
-            if isinstance(access.scope, (GlobalScope, ClassScope)):
+            if access.at_import_time:
                 called_by[top_level_assignment].append(top_level_access)
 
             # This is.. super confusing. A decorator must be defined before
@@ -166,49 +206,40 @@ def create_graphs(
             if (
                 node_type(top_level_assignment) == NodeType.FUNCTION
                 and node_type(top_level_access) == NodeType.FUNCTION
-                and access.scope == globalscope
+                and access.in_global_scope
             ):
-                calls[top_level_assignment].append(top_level_access)
+                src, dst = top_level_assignment, top_level_access
             else:
-                calls[top_level_access].append(top_level_assignment)
-
-            # Only the call graph should have cycles. A cycle in the called_by
-            # graph would be invalid.
-            if _mark_cycles(calls, has_cycle):
-                # Removing this node ensures we only mark new cycles in future.
-                calls[top_level_access].pop()
+                src, dst = top_level_access, top_level_assignment
+            calls[src].append(dst)
+            edges.append((src, dst))
 
             # Track first access of the assignment.
-            coderange = positions[access.node]
             first_access[top_level_assignment] = min(
                 first_access[top_level_assignment],
-                (coderange.start.line, coderange.start.column),
+                position(access) if position is not None else (access.order, 0),
             )
 
-    # Remove all nodes with cycles from `calls`.
-    # When marking, we only removed one edge of the cycle. Here, we remove all
-    # participants in the cycle. Cycles can't be ordered well, so default to
-    # relying on original order.
+    # Only the call graph should have cycles. A cycle in the called_by graph
+    # would be invalid.
+    # Remove all nodes with cycles from `calls`. Cycles can't be ordered well,
+    # so default to relying on original order.
+    has_cycle = _mark_cycles(calls, edges)
     for k, vs in calls.items():
-        calls[k] = [v for v in vs if not has_cycle[v]]
+        calls[k] = [v for v in vs if v not in has_cycle]
 
-    prev_line_nums = {node: i for i, node in enumerate(module.body)}
+    prev_line_nums = {node: i for i, node in enumerate(statements)}
     ordered_nodes = [
         OrderedNode(
             node=node,
             names=list(names[node]),
             node_type=node_type(node, prev_line_nums[node]),
-            num_references=(
-                0
-                if not index
-                else sum(index.count_references(fqn.name) for fqn in fqns[node])
-            ),
+            num_references=num_references.get(node, 0),
             first_access=first_access[node],
-            has_cycle=has_cycle[node],
+            has_cycle=node in has_cycle,
             prev_body_index=prev_line_nums[node],
-            _debug_source_code=debug_source_code(node),
         )
-        for node in modulebodyset
+        for node in set(statements)
     ]
     lookup = {n.node: n for n in ordered_nodes}
     return {
@@ -219,33 +250,193 @@ def create_graphs(
     }
 
 
+def sort_graphs(
+    graphs: Graphs, index: Index
+) -> tuple[list[OrderedNode], list[Section]]:
+    """Order the nodes of `graphs` into imports and sections of the rest."""
+    with _trace.span("topological_sort"):
+        ranks = rank_nodes(graphs["calls"])
+        topo_sorted_called_by = topological_sort(graphs["called_by"], ranks)
+        topo_sorted_calls = topological_sort(graphs["calls"], ranks)
+    with _trace.span("categorize_sections"):
+        return categorize_sections(topo_sorted_called_by, index, topo_sorted_calls)
+
+
+def _top_level_fqns(module: cst.Module, module_name: str) -> dict[TopLevelNode, str]:
+    """Fully qualified names of the statements in `module.body`.
+
+    Only classes and functions are named by their statement (other statements
+    contain the nodes that are assigned to). That's what
+    `FullyQualifiedNameProvider` finds too, without resolving every name in
+    the module.
+    """
+    return {
+        node: f"{module_name}.{node.name.value}"
+        for node in module.body
+        if isinstance(node, (cst.ClassDef, cst.FunctionDef))
+    }
+
+
 def _mark_cycles(
-    graph: dict[TopLevelNode, list[TopLevelNode]], has_cycle: dict[TopLevelNode, bool]
-) -> bool:
-    """Returns true is the graph has cycles.
+    graph: Mapping[T, Sequence[T]], edges: Iterable[tuple[T, T]]
+) -> set[T]:
+    """Return the nodes marked while adding the `edges` of `graph` in order.
+
+    Each time an edge closes a cycle, every node on the depth-first search
+    path that finds the cycle is marked, nodes on a path leading into the
+    cycle included. The edge is then left out, so later edges only mark new
+    cycles.
+
+    Only edges between nodes of a cycle of the whole graph (see
+    `_find_cycles`) can close a cycle. Whether they do is kept up to date by
+    `_TopologicalOrder`, so nothing is searched for the other edges, or if
+    the graph has no cycle at all. Marking still searches the whole graph,
+    once per edge that closes a cycle.
+    """
+    in_cycle = _find_cycles(graph)
+    if not in_cycle:
+        return set()
+
+    marked: set[T] = set()
+    partial: dict[T, list[T]] = {node: [] for node in graph}
+    order = _TopologicalOrder([node for node in graph if node in in_cycle])
+    for src, dst in edges:
+        partial[src].append(dst)
+        if src in in_cycle and dst in in_cycle and not order.add_edge(src, dst):
+            marked |= _path_to_cycle(partial)
+            partial[src].pop()
+    return marked
+
+
+class _TopologicalOrder(Generic[T]):
+    """A topological order of an acyclic graph that edges are added to.
+
+    Kept up to date with the algorithm of Pearce and Kelly: adding an edge
+    against the order only searches the nodes between its ends in the order,
+    and moves them around.
+    """
 
-    Sets has_cycle[node]=True for all nodes in the cycle.
+    def __init__(self, nodes: Iterable[T]) -> None:
+        self.position = {node: i for i, node in enumerate(nodes)}
+        self.successors: dict[T, list[T]] = {node: [] for node in self.position}
+        self.predecessors: dict[T, list[T]] = {node: [] for node in self.position}
+
+    def add_edge(self, src: T, dst: T) -> bool:
+        """Add an edge, unless it closes a cycle. Return whether it was added."""
+        position = self.position
+        lower, upper = position[dst], position[src]
+        if lower < upper or src == dst:
+            # Only nodes before `src` can reach it.
+            forward = _search(self.successors, dst, src, lambda n: position[n] < upper)
+            if forward is None:
+                return False
+            backward = _search(
+                self.predecessors, src, None, lambda n: position[n] > lower
+            )
+            moved = sorted(backward, key=position.__getitem__)
+            moved += sorted(forward, key=position.__getitem__)
+            for node, i in zip(moved, sorted(position[n] for n in moved)):
+                position[node] = i
+        self.successors[src].append(dst)
+        self.predecessors[dst].append(src)
+        return True
+
+
+def _search(
+    graph: Mapping[T, Iterable[T]],
+    start: T,
+    target: Optional[T],
+    keep: Callable[[T], bool],
+) -> Optional[set[T]]:
+    """The nodes reachable from `start` through nodes that `keep` accepts.
+
+    Returns None as soon as `target` is reached.
     """
+    if start == target:
+        return None
+    seen = {start}
+    todo = [start]
+    while todo:
+        for node in graph[todo.pop()]:
+            if node == target:
+                return None
+            if node not in seen and keep(node):
+                seen.add(node)
+                todo.append(node)
+    return seen
+
+
+def _path_to_cycle(graph: Mapping[T, Iterable[T]]) -> set[T]:
+    """The nodes on the path of a depth-first search that finds a cycle.
+
+    The search starts from each node in the order of the graph, and follows
+    edges in order. Returns an empty set if there is no cycle.
+    """
+    done: set[T] = set()
+    for root in graph:
+        if root in done:
+            continue
+        path = [root]
+        on_path = {root}
+        work = [iter(graph[root])]
+        while work:
+            for dst in work[-1]:
+                if dst in on_path:
+                    return on_path
+                if dst not in done:
+                    path.append(dst)
+                    on_path.add(dst)
+                    work.append(iter(graph[dst]))
+                    break
+            else:
+                work.pop()
+                node = path.pop()
+                on_path.discard(node)
+                done.add(node)
+    return set()
 
-    visited = set()
-    stack = set()
 
-    def dfs(node: TopLevelNode):
-        if node in visited:
-            return False
-        if node in stack:
-            return True
-        stack.add(node)
-        for dst in graph[node]:
-            if dfs(dst):
-                return True
-        stack.remove(node)
-        visited.add(node)
-        return False
-
-    for node in graph:
-        if dfs(node):
-            for n in stack:
-                has_cycle[n] = True
-            return True
-    return False
+def _find_cycles(graph: Mapping[T, Iterable[T]]) -> set[T]:
+    """Return the nodes that are part of a cycle in the graph.
+
+    Uses an iterative version of Tarjan's strongly connected components
+    algorithm, so it runs in O(V+E) and deep graphs can't hit the recursion
+    limit. Self-edges don't count as cycles.
+    """
+    in_cycle: set[T] = set()
+    index: dict[T, int] = {}
+    lowlink: dict[T, int] = {}
+    stack: list[T] = []
+    on_stack: set[T] = set()
+
+    def visit(node: T) -> Iterator[T]:
+        index[node] = lowlink[node] = len(index)
+        stack.append(node)
+        on_stack.add(node)
+        return iter(graph[node])
+
+    for root in graph:
+        if root in index:
+            continue
+        work = [(root, visit(root))]
+        while work:
+            node, dsts = work[-1]
+            for dst in dsts:
+                if dst not in index:
+                    work.append((dst, visit(dst)))
+                    break
+                if dst in on_stack:
+                    lowlink[node] = min(lowlink[node], index[dst])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while not component or component[-1] is not node:
+                        component.append(stack.pop())
+                        on_stack.discard(component[-1])
+                    if len(component) > 1:
+                        in_cycle.update(component)
+    return in_cycle
@@ -0,0 +1,208 @@
+"""Peak memory of the phases of `tato format` and `tato index`.
+
+Python allocations are traced with tracemalloc. The resident set size (RSS) is
+sampled by a thread, so memory allocated outside of Python (SQLite, the libcst
+parser) counts too. Worker processes report the peak of each file they
+process.
+
+Like `tato._trace.span`, `phase` does nothing unless a `MemoryProfiler` is
+running.
+"""
+
+import dataclasses
+import mmap
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from types import TracebackType
+from typing import Iterator, Optional
+
+# Seconds between RSS samples.
+SAMPLE_INTERVAL = 0.01
+
+# Files listed in the report.
+TOP_FILES = 10
+
+_active: Optional["MemoryProfiler"] = None
+
+# Memory traced when the current file started, per thread.
+_file_start = threading.local()
+
+
+@dataclasses.dataclass(frozen=True)
+class PhaseMemory:
+    name: str
+    # Peak of the memory allocated by Python during the phase, in bytes.
+    peak_traced: int
+    # Peak RSS of this process during the phase, in bytes.
+    peak_rss: int
+
+
+@dataclasses.dataclass(frozen=True)
+class FileMemory:
+    """Peak memory used to process one file, reported by a worker."""
+
+    filename: str
+    # Peak of the memory allocated by Python, above what was allocated before
+    # the file.
+    peak_traced: int
+    # RSS of the worker once it processed the file.
+    rss: int
+
+
+class MemoryProfiler:
+    """Record peak memory per phase, while in use as a context manager.
+
+    Usage:
+        with MemoryProfiler() as profiler:
+            with phase("discovery"):
+                ...
+        print(profiler.format())
+    """
+
+    def __init__(self) -> None:
+        self.phases: list[PhaseMemory] = []
+        self.files: list[FileMemory] = []
+        self._peak_rss = 0
+        self._peak_traced = 0
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self) -> "MemoryProfiler":
+        global _active
+        tracemalloc.start()
+        self._sampler.start()
+        _active = self
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        global _active
+        _active = None
+        self._stopped.set()
+        self._sampler.join()
+        tracemalloc.stop()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        tracemalloc.reset_peak()
+        self._peak_traced = 0
+        self._peak_rss = current_rss()
+        try:
+            yield
+        finally:
+            self.phases.append(
+                PhaseMemory(
+                    name=name,
+                    peak_traced=max(
+                        self._peak_traced, tracemalloc.get_traced_memory()[1]
+                    ),
+                    peak_rss=max(self._peak_rss, current_rss()),
+                )
+            )
+
+    def add_file(self, file: FileMemory) -> None:
+        self.files.append(file)
+
+    def format(self) -> str:
+        lines = [f"{'Phase':<24}{'Peak traced':>14}{'Peak RSS':>14}"]
+        lines.extend(
+            f"{p.name:<24}{_mib(p.peak_traced):>14}{_mib(p.peak_rss):>14}"
+            for p in self.phases
+        )
+        lines.append(f"Peak RSS of worker processes: {_mib(children_peak_rss())}")
+        if self.files:
+            lines.extend(["", "Files with the highest peak:"])
+            worst = sorted(self.files, key=lambda f: f.peak_traced, reverse=True)
+            lines.extend(
+                f"{_mib(f.peak_traced):>12}  (RSS {_mib(f.rss)})  {f.filename}"
+                for f in worst[:TOP_FILES]
+            )
+        return "\n".join(lines)
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(SAMPLE_INTERVAL):
+            self._peak_rss = max(self._peak_rss, current_rss())
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Record the peak memory of the block, if a `MemoryProfiler` is running."""
+    if _active is None:
+        yield
+        return
+    with _active.phase(name):
+        yield
+
+
+def is_profiling() -> bool:
+    return _active is not None
+
+
+def add_file(file: FileMemory) -> None:
+    """Record the peak of a file, if a `MemoryProfiler` is running."""
+    if _active is not None:
+        _active.add_file(file)
+
+
+def reset_file_peak() -> None:
+    """Start measuring the peak memory of a file, see `file_memory`."""
+    if not tracemalloc.is_tracing():
+        # A worker that was not forked from the profiled process.
+        tracemalloc.start()
+    if _active is not None:
+        # Files processed in the profiled process must not lose the peak of
+        # the current phase.
+        _active._peak_traced = max(
+            _active._peak_traced, tracemalloc.get_traced_memory()[1]
+        )
+    tracemalloc.reset_peak()
+    _file_start.traced = tracemalloc.get_traced_memory()[0]
+
+
+def file_memory(filename: str) -> FileMemory:
+    """Peak memory since `reset_file_peak`.
+
+    Workers that are threads share the peak with the files processed
+    concurrently.
+    """
+    return FileMemory(
+        filename=filename,
+        peak_traced=tracemalloc.get_traced_memory()[1] - _file_start.traced,
+        rss=current_rss(),
+    )
+
+
+def current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except OSError:
+        # Not Linux. The peak of the whole process is the closest we have.
+        return _maxrss(children=False)
+
+
+def children_peak_rss() -> int:
+    return _maxrss(children=True)
+
+
+def _maxrss(children: bool) -> int:
+    # Imported here, so `tato` can be imported where there is no `resource`
+    # module (Windows). The RSS is unknown there.
+    try:
+        import resource
+    except ImportError:
+        return 0
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    maxrss = resource.getrusage(who).ru_maxrss
+    # Bytes on macOS, KiB elsewhere.
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def _mib(n: int) -> str:
+    return f"{n / 2**20:.1f} MiB"
@@ -0,0 +1,415 @@
+from typing import Iterable, Iterator, Optional, Union
+
+import libcst as cst
+from libcst.helpers import get_full_name_for_node
+from libcst.metadata import BaseMetadataProvider
+
+from tato._node_type import TopLevelNode
+from tato._scope import Access, GlobalAssignment, Import, Scope, global_assignments
+
+
+class GlobalDependencyProvider(BaseMetadataProvider[list[GlobalAssignment]]):
+    """Maps the module to the assignments of its global scope and their accesses.
+
+    Gives the answers of `ScopeProvider` about the global scope, which is all
+    that ordering the statements of a module needs, in a single traversal.
+    Nested scopes are only tracked as far as they decide which assignment an
+    access refers to: the shadowing and the `global`/`nonlocal` rules are
+    those of `ScopeProvider`, and so is the handling of string annotations.
+
+    Known difference: a walrus (`:=`) in a decorator, a default argument, an
+    annotation or the element of a comprehension is counted in source order,
+    rather than in the order `ScopeProvider` visits these nodes.
+    """
+
+    def _gen_impl(self, module: cst.Module) -> None:
+        visitor = _DependencyVisitor()
+        for statement in module.body:
+            visitor.statement = statement
+            statement.visit(visitor)
+        self.set_metadata(module, visitor.global_assignments())
+
+
+# The nodes `ScopeProvider` records as the node of an assignment. Node classes
+# are final, so checking their type is enough, and faster than `isinstance`.
+_ASSIGNMENT_LIKE_TYPES = frozenset(
+    (
+        cst.AnnAssign,
+        cst.AsName,
+        cst.Assign,
+        cst.AugAssign,
+        cst.ClassDef,
+        cst.CompFor,
+        cst.FunctionDef,
+        cst.Global,
+        cst.Import,
+        cst.ImportFrom,
+        cst.NamedExpr,
+        cst.Nonlocal,
+        cst.Parameters,
+        cst.WithItem,
+    )
+)
+
+_ComprehensionT = Union[cst.GeneratorExp, cst.ListComp, cst.SetComp, cst.DictComp]
+
+
+class _DependencyVisitor(cst.CSTVisitor):
+    """Records assignments and accesses like `libcst.metadata.ScopeProvider`.
+
+    Nodes are visited in source order. Expression contexts (what
+    `ExpressionContextProvider` provides) are tracked along the way.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.scope = Scope()
+        self.statement: TopLevelNode
+        # Whether names are assigned to, rather than accessed.
+        self.store = False
+        self.order = 0
+        self.accesses: list[Access[cst.CSTNode]] = []
+        self.attributes: list[Optional[cst.Attribute]] = [None]
+        self.in_annotation = [False]
+        self.in_type_hint = [False]
+        self.ignored_subscripts: set[cst.Subscript] = set()
+        self.string_annotation: Optional[cst.BaseString] = None
+        self.string_annotation_order = 0
+
+    def global_assignments(self) -> list[GlobalAssignment]:
+        return global_assignments(self.scope.globals, self.accesses, _dotted_names)
+
+    def on_visit(self, node: cst.CSTNode) -> bool:
+        self.order += 1
+        return super().on_visit(node)
+
+    def on_leave(self, original_node: cst.CSTNode) -> None:
+        if type(original_node) in _ASSIGNMENT_LIKE_TYPES:
+            self.scope.count += 1
+        super().on_leave(original_node)
+
+    def _visit_store(self, store: bool, nodes: Iterable[cst.CSTNode]) -> None:
+        previous = self.store
+        self.store = store
+        for node in nodes:
+            node.visit(self)
+        self.store = previous
+
+    def _record(
+        self, name: str, node: cst.CSTNode, imported: Optional[Import] = None
+    ) -> None:
+        self.scope.record(name, node, self.statement, imported)
+
+    def visit_Name(self, node: cst.Name) -> Optional[bool]:
+        if self.store and self.string_annotation is None:
+            self._record(node.value, node)
+        else:
+            self.accesses.append(
+                Access(
+                    name=node.value,
+                    node=node,
+                    scope=self.scope,
+                    index=self.scope.count,
+                    statement=self.statement,
+                    # Names in a string annotation are all accessed where
+                    # the string is.
+                    order=self.order
+                    if self.string_annotation is None
+                    else self.string_annotation_order,
+                    attribute=self.attributes[-1],
+                    string_annotation=self.string_annotation,
+                )
+            )
+        return False
+
+    def visit_Assign(self, node: cst.Assign) -> Optional[bool]:
+        self._visit_store(True, node.targets)
+        node.value.visit(self)
+        return False
+
+    def visit_AnnAssign(self, node: cst.AnnAssign) -> Optional[bool]:
+        self._visit_store(True, [node.target])
+        node.annotation.visit(self)
+        if node.value is not None:
+            node.value.visit(self)
+        return False
+
+    def visit_AugAssign(self, node: cst.AugAssign) -> Optional[bool]:
+        self._visit_store(True, [node.target])
+        node.value.visit(self)
+        return False
+
+    def visit_NamedExpr(self, node: cst.NamedExpr) -> Optional[bool]:
+        self._visit_store(True, [node.target])
+        node.value.visit(self)
+        return False
+
+    def visit_AsName(self, node: cst.AsName) -> Optional[bool]:
+        self._visit_store(True, [node.name])
+        return False
+
+    def visit_For(self, node: cst.For) -> Optional[bool]:
+        self._visit_store(True, [node.target])
+        self.scope.count += 1
+        node.iter.visit(self)
+        node.body.visit(self)
+        if node.orelse is not None:
+            node.orelse.visit(self)
+        return False
+
+    def visit_CompFor(self, node: cst.CompFor) -> Optional[bool]:
+        # Nested `for` of a comprehension, see `_visit_comprehension`.
+        self._visit_store(True, [node.target])
+        node.iter.visit(self)
+        for condition in node.ifs:
+            condition.visit(self)
+        if node.inner_for_in is not None:
+            node.inner_for_in.visit(self)
+        return False
+
+    def visit_Attribute(self, node: cst.Attribute) -> Optional[bool]:
+        if self.attributes[-1] is None:
+            self.attributes[-1] = node
+        self._visit_store(False, [node.value])
+        if self.attributes[-1] is node:
+            self.attributes[-1] = None
+        return False
+
+    def visit_Call(self, node: cst.Call) -> Optional[bool]:
+        self.attributes.append(None)
+        self.in_type_hint.append(False)
+        full_name = get_full_name_for_node(node)
+        qnames = self.scope.qualified_names(full_name) if full_name else set()
+        if "typing.NewType" in qnames or "typing.TypeVar" in qnames:
+            # The first argument is the name of the type, not an annotation.
+            node.func.visit(self)
+            self.in_type_hint[-1] = True
+            for arg in node.args[1:]:
+                arg.visit(self)
+            return False
+        if "typing.cast" in qnames:
+            node.func.visit(self)
+            if node.args:
+                self.in_type_hint.append(True)
+                node.args[0].visit(self)
+                self.in_type_hint.pop()
+                for arg in node.args[1:]:
+                    arg.visit(self)
+            return False
+        return True
+
+    def leave_Call(self, original_node: cst.Call) -> None:
+        self.attributes.pop()
+        self.in_type_hint.pop()
+
+    def visit_Arg(self, node: cst.Arg) -> Optional[bool]:
+        # Keywords are not accesses.
+        node.value.visit(self)
+        return False
+
+    def visit_Subscript(self, node: cst.Subscript) -> Optional[bool]:
+        in_type_hint = False
+        if isinstance(node.value, cst.Name):
+            qnames = self.scope.qualified_names(node.value.value)
+            if any(n.startswith(("typing.", "typing_extensions.")) for n in qnames):
+                in_type_hint = True
+            if "typing.Literal" in qnames or "typing_extensions.Literal" in qnames:
+                self.ignored_subscripts.add(node)
+        self.in_type_hint.append(in_type_hint)
+        self._visit_store(False, [node.value, *node.slice])
+        return False
+
+    def leave_Subscript(self, original_node: cst.Subscript) -> None:
+        self.in_type_hint.pop()
+        self.ignored_subscripts.discard(original_node)
+
+    def visit_Annotation(self, node: cst.Annotation) -> Optional[bool]:
+        self.in_annotation.append(True)
+        return True
+
+    def leave_Annotation(self, original_node: cst.Annotation) -> None:
+        self.in_annotation.pop()
+
+    def visit_SimpleString(self, node: cst.SimpleString) -> Optional[bool]:
+        self._visit_string_annotation(node)
+        return False
+
+    def visit_ConcatenatedString(self, node: cst.ConcatenatedString) -> Optional[bool]:
+        return not self._visit_string_annotation(node)
+
+    def _visit_string_annotation(
+        self, node: Union[cst.SimpleString, cst.ConcatenatedString]
+    ) -> bool:
+        """Visit the code of a string annotation. Returns whether it is one."""
+        if (
+            not (self.in_type_hint[-1] or self.in_annotation[-1])
+            or self.ignored_subscripts
+        ):
+            return False
+        value = node.evaluated_value
+        if not value:
+            return False
+        outermost = self.string_annotation is None
+        if outermost:
+            self.string_annotation = node
+            self.string_annotation_order = self.order
+        try:
+            cst.parse_module(value).visit(self)
+        except cst.ParserSyntaxError:
+            pass
+        if outermost:
+            self.string_annotation = None
+        return True
+
+    def visit_Import(self, node: cst.Import) -> Optional[bool]:
+        self._visit_import(node)
+        return False
+
+    def visit_ImportFrom(self, node: cst.ImportFrom) -> Optional[bool]:
+        self._visit_import(node)
+        return False
+
+    def _visit_import(self, node: Union[cst.Import, cst.ImportFrom]) -> None:
+        if isinstance(node.names, cst.ImportStar):
+            return
+        module = ""
+        if isinstance(node, cst.ImportFrom):
+            if node.module is not None:
+                module = get_full_name_for_node(node.module) or ""
+            module = "." * len(node.relative) + module
+        imported = Import(
+            module,
+            tuple(
+                (get_full_name_for_node(alias.name) or "", alias.evaluated_alias)
+                for alias in node.names
+            ),
+        )
+        for alias in node.names:
+            name = alias.name if alias.asname is None else alias.asname.name
+            # `import a.b` assigns `a.b` and `a`.
+            for value, _ in _gen_dotted_names(name):
+                self._record(value, node, imported)
+
+    def visit_Global(self, node: cst.Global) -> Optional[bool]:
+        if self.scope.parent is not None:
+            for item in node.names:
+                self.scope.overwrites[item.name.value] = self.scope.globals
+        return False
+
+    def visit_Nonlocal(self, node: cst.Nonlocal) -> Optional[bool]:
+        if self.scope.parent is not None:
+            for item in node.names:
+                self.scope.overwrites[item.name.value] = self.scope.parent
+        return False
+
+    def visit_ClassDef(self, node: cst.ClassDef) -> Optional[bool]:
+        self._record(node.name.value, node)
+        for child in [*node.decorators, *node.bases, *node.keywords]:
+            child.visit(self)
+        outer = self.scope
+        self.scope = Scope(outer, node.name.value, is_class=True)
+        for statement in node.body.body:
+            statement.visit(self)
+        self.scope = outer
+        return False
+
+    def visit_FunctionDef(self, node: cst.FunctionDef) -> Optional[bool]:
+        self._record(node.name.value, node)
+        for decorator in node.decorators:
+            decorator.visit(self)
+        outer = self.scope
+        scope = Scope(outer, node.name.value, "<locals>")
+        self.scope = scope
+        node.params.visit(self)
+        if node.returns is not None:
+            self.scope = outer
+            node.returns.visit(self)
+            self.scope = scope
+        node.body.visit(self)
+        self.scope = outer
+        return False
+
+    def visit_Lambda(self, node: cst.Lambda) -> Optional[bool]:
+        outer = self.scope
+        self.scope = Scope(outer, None, "<locals>")
+        node.params.visit(self)
+        node.body.visit(self)
+        self.scope = outer
+        return False
+
+    def visit_Param(self, node: cst.Param) -> Optional[bool]:
+        self._record(node.name.value, node)
+        # Annotations and defaults are evaluated in the enclosing scope.
+        scope = self.scope
+        self.scope = scope.parent  # type: ignore[assignment]
+        for child in (node.annotation, node.default):
+            if child is not None:
+                child.visit(self)
+        self.scope = scope
+        return False
+
+    def visit_GeneratorExp(self, node: cst.GeneratorExp) -> Optional[bool]:
+        return self._visit_comprehension(node)
+
+    def visit_ListComp(self, node: cst.ListComp) -> Optional[bool]:
+        return self._visit_comprehension(node)
+
+    def visit_SetComp(self, node: cst.SetComp) -> Optional[bool]:
+        return self._visit_comprehension(node)
+
+    def visit_DictComp(self, node: cst.DictComp) -> Optional[bool]:
+        return self._visit_comprehension(node)
+
+    def _visit_comprehension(self, node: _ComprehensionT) -> bool:
+        for_in = node.for_in
+        outer = self.scope
+        scope = Scope(outer, "<comprehension>")
+        self.scope = scope
+
+        start = len(self.accesses)
+        if isinstance(node, cst.DictComp):
+            node.key.visit(self)
+            node.value.visit(self)
+        else:
+            node.elt.visit(self)
+        # The element is evaluated after the `for`s, once its names are
+        # assigned.
+        elt_accesses = [a for a in self.accesses[start:] if a.scope is scope]
+
+        self._visit_store(True, [for_in.target])
+        scope.count += 1
+        # The first iterable is evaluated in the enclosing scope.
+        self.scope = outer
+        for_in.iter.visit(self)
+        self.scope = scope
+        for condition in for_in.ifs:
+            condition.visit(self)
+        if for_in.inner_for_in is not None:
+            for_in.inner_for_in.visit(self)
+
+        for access in elt_accesses:
+            access.index = scope.count
+        self.scope = outer
+        return False
+
+
+def _dotted_names(node: cst.CSTNode) -> Iterator[tuple[str, cst.CSTNode]]:
+    return _gen_dotted_names(cst.ensure_type(node, cst.Attribute))
+
+
+def _gen_dotted_names(node: cst.CSTNode) -> Iterator[tuple[str, cst.CSTNode]]:
+    """Like `libcst.metadata.scope_provider._gen_dotted_names`."""
+    if isinstance(node, cst.Name):
+        yield node.value, node
+    elif isinstance(node, cst.Attribute):
+        value = node.value
+        if isinstance(value, cst.Call):
+            if isinstance(value.func, (cst.Attribute, cst.Name)):
+                yield from _gen_dotted_names(value.func)
+        elif isinstance(value, (cst.Attribute, cst.Name)):
+            names = _gen_dotted_names(value)
+            first = next(names, None)
+            if first is not None:
+                yield f"{first[0]}.{node.attr.value}", node
+                yield first
+                yield from names
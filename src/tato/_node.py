@@ -1,14 +1,21 @@
+from collections import defaultdict
 from dataclasses import dataclass
+from functools import cached_property
+from typing import Iterable, Union
 
-from tato._node_type import NodeType, TopLevelNode
+from tato._debug import debug_source_code
+from tato._node_type import NodeType, Statement
 from tato._skipcompare import SKIP, SkipCompare
 
+# Sort key computed by `rank_nodes`.
+Rank = tuple[int, Union[int, SkipCompare]]
+
 
 @dataclass(frozen=True)
 class OrderedNode:
     """Information needed to order TopLevelNodes."""
 
-    node: TopLevelNode
+    node: Statement
     # A node typically has 1 name, but it could have multiple (e.g. `if True: A = 1 else: B = 1`)
     names: list[str]
     node_type: NodeType
@@ -25,10 +32,17 @@ class OrderedNode:
     has_cycle: bool
     # Tie break should be the order of the node in the original file.
     prev_body_index: int
-    _debug_source_code: str
+
+    @cached_property
+    def _debug_source_code(self) -> str:
+        # Rendering code is expensive, so only do it when debugging.
+        return debug_source_code(self.node)
 
     def __hash__(self) -> int:
-        return hash(self.node)
+        # Nodes hash by identity, which would make the iteration order of sets
+        # (and the order of nodes that `__lt__` can't tell apart) change from
+        # run to run.
+        return hash(self.prev_body_index)
 
     def __eq__(self, other: "OrderedNode") -> bool:
         return self.node == other.node
@@ -36,6 +50,15 @@ class OrderedNode:
     def __lt__(self, other: "OrderedNode") -> bool:
         return self._as_tuple() < other._as_tuple()
 
+    def _total_order(self) -> tuple[tuple[int, int], int]:
+        """Order of nodes of the same type and number of references.
+
+        Only total if either all or none of the nodes have a cycle.
+        """
+        if self.node_type == NodeType.IMPORT or self.has_cycle:
+            return ((0, 0), self.prev_body_index)
+        return (self.first_access, self.prev_body_index)
+
     def _as_tuple(self) -> SkipCompare:
         if self.node_type == NodeType.IMPORT:
             # Try and keep imports sorted by their previous location.
@@ -49,3 +72,36 @@ class OrderedNode:
                     self.prev_body_index,
                 )
             )
+
+
+def rank_nodes(nodes: Iterable[OrderedNode]) -> dict[OrderedNode, Rank]:
+    """Compute sort keys that order nodes like `OrderedNode.__lt__`.
+
+    Nodes are numbered in (node_type, num_references, first_access,
+    prev_body_index) order, so most comparisons are between integers.
+
+    `__lt__` ignores `first_access` when either node has a cycle, which is not
+    transitive when nodes of the same type and number of references mix
+    nodes with and without cycles. Those nodes share a number and keep
+    comparing with `SkipCompare`, so layouts don't change.
+    """
+    groups: defaultdict[tuple[NodeType, int], list[OrderedNode]] = defaultdict(list)
+    for node in nodes:
+        if node.node_type == NodeType.IMPORT:
+            groups[(node.node_type, 0)].append(node)
+        else:
+            groups[(node.node_type, -1 * node.num_references)].append(node)
+
+    ranks: dict[OrderedNode, Rank] = {}
+    rank = 0
+    for _, group in sorted(groups.items(), key=lambda item: item[0]):
+        has_cycle = [n.has_cycle for n in group if n.node_type != NodeType.IMPORT]
+        if any(has_cycle) and not all(has_cycle):
+            for node in group:
+                ranks[node] = (rank, SkipCompare(node._as_tuple()[2:]))
+            rank += 1
+            continue
+        for node in sorted(group, key=lambda n: n._total_order()):
+            ranks[node] = (rank, 0)
+            rank += 1
+    return ranks
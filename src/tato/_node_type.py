@@ -1,3 +1,4 @@
+import ast
 import enum
 from typing import Optional, Union
 
@@ -6,6 +7,9 @@ import libcst.matchers as m
 
 # Type of a node found in a module's body.
 TopLevelNode = Union[cst.SimpleStatementLine, cst.BaseCompoundStatement]
+# A `TopLevelNode`, or the first statement of a line parsed by `ast` (see
+# `tato._ast_analysis`).
+Statement = Union[TopLevelNode, ast.stmt]
 
 
 class NodeType(enum.IntEnum):
@@ -20,7 +24,9 @@ class NodeType(enum.IntEnum):
         return self.name
 
 
-def node_type(node: TopLevelNode, old_module_index: Optional[int] = None) -> NodeType:
+def node_type(node: Statement, old_module_index: Optional[int] = None) -> NodeType:
+    if isinstance(node, ast.stmt):
+        return _ast_node_type(node, old_module_index)
     if isinstance(node, cst.SimpleStatementLine):
         if isinstance(node.body[0], (cst.Assign, cst.AnnAssign, cst.AugAssign)):
             return NodeType.CONSTANT
@@ -41,3 +47,24 @@ def node_type(node: TopLevelNode, old_module_index: Optional[int] = None) -> Nod
             return NodeType.IMPORT
         else:
             return NodeType.UNKNOWN
+
+
+def _ast_node_type(node: ast.stmt, old_module_index: Optional[int]) -> NodeType:
+    if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+        return NodeType.CONSTANT
+    elif isinstance(node, (ast.Import, ast.ImportFrom)):
+        return NodeType.IMPORT
+    elif old_module_index == 0 and isinstance(node, ast.Expr):
+        return NodeType.MODULE_DOCSTRING
+    elif isinstance(node, ast.ClassDef):
+        return NodeType.CLASS
+    elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return NodeType.FUNCTION
+    elif (
+        isinstance(node, ast.If)
+        and isinstance(node.test, ast.Name)
+        and node.test.id == "TYPE_CHECKING"
+    ):
+        return NodeType.IMPORT
+    else:
+        return NodeType.UNKNOWN
@@ -0,0 +1,65 @@
+"""Run a function over chunks of files in a pool, yielding results as they come.
+
+Shared by `tato format` (`tato._executor`) and `tato index`
+(`tato.index._executor`).
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import Any, Callable, Iterator, Sequence, TypeVar
+
+# Below this many files, a pool costs more to start than it saves.
+SERIAL_THRESHOLD = 16
+
+# Aim for this many chunks per worker, so workers finishing early can pick up
+# more work.
+CHUNKS_PER_JOB = 4
+
+# Larger chunks delay results (and errors) without making workers faster.
+MAX_CHUNKSIZE = 32
+
+# Chunks submitted, but not yet collected, per worker. Bounds the memory used by
+# results waiting in the parent.
+MAX_PENDING_PER_JOB = 2
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+
+def is_serial(num_files: int, jobs: int) -> bool:
+    return jobs == 1 or num_files < SERIAL_THRESHOLD
+
+
+def chunksize(num_files: int, jobs: int) -> int:
+    return max(1, min(MAX_CHUNKSIZE, num_files // (jobs * CHUNKS_PER_JOB)))
+
+
+def map_chunks(
+    pool: Executor,
+    fn: Callable[..., list[_R]],
+    items: Sequence[_T],
+    jobs: int,
+    *args: Any,
+) -> Iterator[_R]:
+    """Yield the results of `fn(chunk, *args)` for chunks of `items`.
+
+    Chunks are yielded in the order they complete. Chunks not yet started are
+    cancelled when the caller stops iterating. The caller shuts `pool` down.
+    """
+    size = chunksize(len(items), jobs)
+    chunks = (items[i : i + size] for i in range(0, len(items), size))
+    pending: set[Future[list[_R]]] = set()
+    try:
+        while True:
+            while len(pending) < jobs * MAX_PENDING_PER_JOB:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.add(pool.submit(fn, chunk, *args))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,78 @@
+"""Summary of the time spent by a `tato format` run.
+
+Built from the events recorded by `tato._trace`.
+"""
+
+import dataclasses
+import json
+import math
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Sequence
+
+PERCENTILES = (50, 95, 99)
+
+
+@dataclasses.dataclass(frozen=True)
+class RunReport:
+    files: int
+    wall_time: float
+    files_per_second: float
+    # Seconds to format a file, by percentile.
+    latency: dict[str, float]
+    # The slowest files, and their time in seconds.
+    slowest: list[tuple[str, float]]
+    # Seconds spent in each phase, across all files. Phases can contain other
+    # phases (e.g. "transform" contains "create_graphs").
+    phases: dict[str, float]
+
+
+def build_report(
+    events: Sequence[dict[str, Any]], wall_time: float, top: int = 10
+) -> RunReport:
+    durations = []
+    phases: dict[str, float] = defaultdict(float)
+    for event in events:
+        seconds = event["dur"] / 1e6
+        if event["name"] == "format_file":
+            durations.append((event["args"]["filename"], seconds))
+        else:
+            phases[event["name"]] += seconds
+
+    ordered = sorted(d for _, d in durations)
+    return RunReport(
+        files=len(durations),
+        wall_time=wall_time,
+        files_per_second=len(durations) / wall_time if wall_time else 0.0,
+        latency={f"p{p}": _percentile(ordered, p) for p in PERCENTILES},
+        slowest=sorted(durations, key=lambda d: d[1], reverse=True)[:top],
+        phases=dict(sorted(phases.items(), key=lambda p: p[1], reverse=True)),
+    )
+
+
+def format_report(report: RunReport) -> str:
+    lines = [
+        f"Formatted {report.files} files in {report.wall_time:.2f}s "
+        f"({report.files_per_second:.1f} files/s)",
+        "Latency: "
+        + ", ".join(f"{k} {v * 1e3:.1f}ms" for k, v in report.latency.items()),
+        "",
+        f"{'Phase':<24}{'Total':>14}",
+    ]
+    lines.extend(f"{k:<24}{v * 1e3:>12.1f}ms" for k, v in report.phases.items())
+    lines.extend(["", "Slowest files:"])
+    lines.extend(f"{d * 1e3:>10.1f}ms  {f}" for f, d in report.slowest)
+    return "\n".join(lines)
+
+
+def write_report(report: RunReport, path: Path) -> None:
+    with open(path, "w") as f:
+        json.dump(dataclasses.asdict(report), f, indent=2)
+
+
+def _percentile(ordered: Sequence[float], percentile: int) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not ordered:
+        return 0.0
+    rank = math.ceil(percentile / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
@@ -0,0 +1,286 @@
+"""Assignments of the global scope and the accesses that refer to them.
+
+The rules are those of `libcst.metadata.ScopeProvider`, but only what the
+global scope needs is kept. Visitors of libcst and `ast` trees record
+assignments and accesses, then `global_assignments` resolves the accesses.
+"""
+
+import builtins
+import dataclasses
+from collections import defaultdict
+from typing import Callable, Generic, Iterable, Iterator, Optional, TypeVar
+
+from tato._node_type import Statement
+
+# A node of the tree the visitor records assignments and accesses in.
+N = TypeVar("N")
+
+
+@dataclasses.dataclass(frozen=True)
+class GlobalAccess:
+    # The top-level statement that contains the access.
+    statement: Statement
+    # The accessed node: a name, the attribute of a dotted import (e.g.
+    # `os.path`), or the string of a string annotation.
+    node: object
+    # Accesses in the global scope or in a class body happen at import time.
+    # Others happen when a function is called.
+    at_import_time: bool
+    # The access is in the global scope itself (e.g. a decorator).
+    in_global_scope: bool
+    # Accesses are numbered in the order of the source code.
+    order: int
+
+
+@dataclasses.dataclass(frozen=True)
+class GlobalAssignment:
+    name: str
+    # The top-level statement that assigns the name.
+    statement: Statement
+    accesses: frozenset[GlobalAccess]
+
+
+@dataclasses.dataclass(frozen=True)
+class Import:
+    """The names an import statement imports, to find qualified names."""
+
+    # e.g. `..a` for `from ..a import b`. Empty for `import a`.
+    module: str
+    # Each imported name and its alias, e.g. `("a.b", None)` for `import a.b`.
+    names: tuple[tuple[str, Optional[str]], ...]
+
+    def qualified_names(self, full_name: str) -> set[str]:
+        """Like `libcst.metadata.ImportAssignment.get_qualified_names_for`."""
+        results = set()
+        for name, alias in self.names:
+            parts = name.split(".")
+            for i in range(len(parts), 0, -1):
+                real_name = as_name = ".".join(parts[:i])
+                if self.module.endswith("."):
+                    real_name = f"{self.module}{real_name}"
+                elif self.module:
+                    real_name = f"{self.module}.{real_name}"
+                if alias is not None:
+                    as_name = alias
+                if full_name.startswith(as_name):
+                    remaining = full_name.split(as_name, 1)[1]
+                    if remaining and not remaining.startswith("."):
+                        continue
+                    remaining = remaining.lstrip(".")
+                    results.add(f"{real_name}.{remaining}" if remaining else real_name)
+                    break
+        return results
+
+
+class Scope:
+    """The parts of `libcst.metadata.Scope` needed to resolve names."""
+
+    def __init__(
+        self,
+        parent: Optional["Scope"] = None,
+        *names: Optional[str],
+        is_class: bool = False,
+    ) -> None:
+        self.parent = parent
+        self.globals: Scope = parent.globals if parent else self
+        self.is_class = is_class
+        self.assignments: dict[str, list[Assignment]] = {}
+        # Names declared `global` or `nonlocal`, and the scope they refer to.
+        self.overwrites: dict[str, Scope] = {}
+        # Number of assignment-like nodes visited so far in this scope.
+        self.count = 0
+        # Prefix of the qualified names of the scope's assignments, e.g.
+        # `f.<locals>`.
+        self.name_prefix = ""
+        if parent is not None:
+            self.name_prefix = ".".join(n for n in (parent.name_prefix, *names) if n)
+
+    def record(
+        self,
+        name: str,
+        node: object,
+        statement: Statement,
+        imported: Optional[Import] = None,
+    ) -> None:
+        target = self
+        if name in self.overwrites:
+            target = self.overwrites[name]
+            while target.is_class:
+                target = target.parent  # type: ignore[assignment]
+        target.assignments.setdefault(name, []).append(
+            Assignment(name, target, target.count, node, statement, imported)
+        )
+
+    def __contains__(self, name: str) -> bool:
+        if name in self.overwrites:
+            return name in self.overwrites[name]
+        if name in self.assignments:
+            return True
+        if self.parent is None:
+            return hasattr(builtins, name)
+        return self.parent._contains_from_child(name)
+
+    def __getitem__(self, name: str) -> list["Assignment"]:
+        """Assignments of `name` visible in the scope. Builtins have none."""
+        if name in self.overwrites:
+            return self.overwrites[name]._getitem_from_child(name)
+        if name in self.assignments:
+            return self.assignments[name]
+        if self.parent is None:
+            return []
+        return self.parent._getitem_from_child(name)
+
+    def _contains_from_child(self, name: str) -> bool:
+        # Names of a class body are not visible in its nested scopes.
+        if self.is_class:
+            return self.parent._contains_from_child(name)  # type: ignore[union-attr]
+        return name in self
+
+    def _getitem_from_child(self, name: str) -> list["Assignment"]:
+        if self.is_class:
+            return self.parent._getitem_from_child(name)  # type: ignore[union-attr]
+        return self[name]
+
+    def qualified_names(self, full_name: str) -> set[str]:
+        """Qualified names of a dotted name (e.g. `t.cast` is `typing.cast`)."""
+        names = set()
+        for assignment in self.lookup(full_name):
+            names |= assignment.qualified_names(full_name)
+        return names
+
+    def lookup(self, full_name: str, node: object = None) -> list["Assignment"]:
+        """Assignments of the longest prefix of a dotted name that is visible.
+
+        Like `libcst.metadata.Scope.get_qualified_names_for`, only the
+        assignment of `node` is returned if `node` is one of them.
+        """
+        prefix: Optional[str] = full_name
+        while prefix:
+            if prefix in self:
+                break
+            idx = prefix.rfind(".")
+            prefix = None if idx == -1 else prefix[:idx]
+        else:
+            return []
+        assignments = self[prefix]
+        if node is not None:
+            for assignment in assignments:
+                if assignment.node is node:
+                    return [assignment]
+        return assignments
+
+
+@dataclasses.dataclass(eq=False)
+class Assignment:
+    name: str
+    scope: Scope
+    # `Scope.count` when assigned. Accesses with a lower count in the same
+    # scope happened before, so they refer to a shadowed assignment.
+    index: int
+    # The name, function, class, parameter or import statement that assigns.
+    node: object
+    statement: Statement
+    imported: Optional[Import]
+    accesses: set["Access"] = dataclasses.field(default_factory=set)
+
+    def qualified_names(self, full_name: str) -> set[str]:
+        """Qualified names of `full_name`, a dotted name starting with `name`."""
+        if self.imported is not None:
+            return self.imported.qualified_names(full_name)
+        prefix = self.scope.name_prefix
+        return {f"{prefix}.{full_name}" if prefix else full_name}
+
+    def record_accesses(self, accesses: set["Access"]) -> None:
+        later = {
+            a for a in accesses if a.scope is not self.scope or self.index < a.index
+        }
+        if self.scope.parent is None:
+            # Earlier global accesses refer to builtins.
+            self.accesses |= later
+            return
+        earlier = accesses - later
+        if earlier:
+            for shadowed in self.scope.parent[self.name]:
+                shadowed.record_accesses(earlier)
+
+
+@dataclasses.dataclass(eq=False)
+class Access(Generic[N]):
+    name: str
+    node: N
+    scope: Scope
+    index: int
+    statement: Statement
+    order: int
+    # The outermost attribute of the name (e.g. `a.b.c` for `a`).
+    attribute: Optional[N]
+    string_annotation: Optional[N]
+
+    def resolve(self, dotted_names: Callable[[N], Iterator[tuple[str, N]]]) -> str:
+        """The accessed name, like `libcst.metadata.ScopeVisitor.infer_accesses`.
+
+        `dotted_names` gives the names of an attribute that could be imported,
+        longest first, and their node (e.g. `a.b` and `a` for `a.b`). `node`
+        becomes the node of the name.
+        """
+        name = self.name
+        if self.attribute is not None:
+            for attr_name, node in dotted_names(self.attribute):
+                if attr_name in self.scope:
+                    self.node = node
+                    name = attr_name
+                    break
+        if self.string_annotation is not None:
+            self.node = self.string_annotation
+        return name
+
+    def referents(self, name: str) -> list[Assignment]:
+        """The assignments `name` may refer to, like `libcst.metadata.Access`.
+
+        Assignments after the access in its own scope are left out. If only
+        those remain, the name refers to the enclosing scope (e.g. `x = x`).
+        """
+        assignments = self.scope[name]
+        previous = [
+            a for a in assignments if a.scope is not self.scope or a.index < self.index
+        ]
+        if not previous and assignments and self.scope.parent is not None:
+            return self.scope.parent[name]
+        return previous
+
+
+def global_assignments(
+    global_scope: Scope,
+    accesses: Iterable[Access[N]],
+    dotted_names: Callable[[N], Iterator[tuple[str, N]]],
+) -> list[GlobalAssignment]:
+    """Resolve `accesses`, like `libcst.metadata.ScopeVisitor.infer_accesses`.
+
+    `dotted_names` is passed to `Access.resolve`.
+    """
+    groups: defaultdict[tuple[Scope, str], set[Access]] = defaultdict(set)
+    for access in accesses:
+        groups[(access.scope, access.resolve(dotted_names))].add(access)
+
+    for (scope, name), group in groups.items():
+        for assignment in scope[name]:
+            assignment.record_accesses(group)
+
+    return [
+        GlobalAssignment(
+            name=assignment.name,
+            statement=assignment.statement,
+            accesses=frozenset(
+                GlobalAccess(
+                    statement=a.statement,
+                    node=a.node,
+                    at_import_time=a.scope is global_scope or a.scope.is_class,
+                    in_global_scope=a.scope is global_scope,
+                    order=a.order,
+                )
+                for a in assignment.accesses
+            ),
+        )
+        for assignments in global_scope.assignments.values()
+        for assignment in assignments
+    ]
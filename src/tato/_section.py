@@ -72,10 +72,11 @@ class SectionsBuilder:
 
     def sort_functions_sections(self) -> None:
         """Sort functions by call hierarchy order."""
+        positions = {n: i for i, n in enumerate(self.topo_sorted_calls)}
         for section in self.sections:
             if section._functions:
                 section._functions = sorted(
-                    section._functions, key=lambda n: self.topo_sorted_calls.index(n)
+                    section._functions, key=positions.__getitem__
                 )
 
 
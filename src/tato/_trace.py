@@ -0,0 +1,63 @@
+"""Timings of the phases of `tato format`, as Chrome trace events.
+
+Spans are only recorded inside `record()`, so `span` costs next to nothing
+otherwise. Open the written file in chrome://tracing or https://ui.perfetto.dev.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional, Sequence
+
+# Events recorded by the current thread, or None if it isn't recording.
+_local = threading.local()
+
+
+@contextmanager
+def record() -> Iterator[list[dict[str, Any]]]:
+    """Record the spans of this thread into the yielded list."""
+    events: list[dict[str, Any]] = []
+    previous = getattr(_local, "events", None)
+    _local.events = events
+    try:
+        yield events
+    finally:
+        _local.events = previous
+
+
+def enabled() -> bool:
+    return getattr(_local, "events", None) is not None
+
+
+@contextmanager
+def span(name: str, **args: Any) -> Iterator[None]:
+    """Record the time spent in the block as a complete event named `name`."""
+    events: Optional[list[dict[str, Any]]] = getattr(_local, "events", None)
+    if events is None:
+        yield
+        return
+    # The monotonic clock is shared by all processes, so events of workers
+    # line up with each other.
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        events.append(
+            {
+                "name": name,
+                "ph": "X",
+                "ts": start / 1000,
+                "dur": (time.perf_counter_ns() - start) / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_native_id(),
+                "args": args,
+            }
+        )
+
+
+def write(path: Path, events: Sequence[dict[str, Any]]) -> None:
+    with open(path, "w") as f:
+        json.dump({"traceEvents": list(events), "displayTimeUnit": "ms"}, f)
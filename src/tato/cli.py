@@ -1,48 +1,295 @@
 import argparse
+import os
 import sys
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator, Optional, Sequence
 
-import libcst.tool
-from libcst._version import __version__ as libcst_version
-from libcst.helpers import paths
-
+from tato import _memory
 from tato.__about__ import __version__
-from tato.index.index import Index
+from tato._client import format_with_daemon, socket_path
+
+# libcst is slow to import. Commands import it (through tato modules) when they
+# run, so `tato format` can hand off to `tato daemon` quickly.
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+
+    if args.command == "index":
+        from libcst.helpers import paths
+
+        from tato.index.index import Index
+
+        # chdir so the fully_qualified_name of the module matches Python's
+        p = Path(args.path)
+        with paths.chdir(p.parent), _profile_memory(args.profile_memory):
+            index_path = Path(p.name).joinpath("tato-index.sqlite3")
+            if args.incremental:
+                Index(index_path).update(args.jobs)
+            else:
+                # A running `tato daemon` may keep the old WAL files open.
+                for suffix in ("", "-wal", "-shm"):
+                    Path(f"{index_path}{suffix}").unlink(missing_ok=True)
+                Index(index_path).create(args.jobs)
+        sys.exit(0)
+    elif args.command == "format":
+        if not args.no_daemon:
+            exit_code = format_with_daemon(argv)
+            if exit_code is not None:
+                sys.exit(exit_code)
+        sys.exit(run_format(args))
+    elif args.command == "daemon":
+        from tato._daemon import DaemonError, serve, stop
+
+        path = Path(args.socket) if args.socket else socket_path()
+        if args.stop:
+            if not stop(path):
+                print(f"No daemon is listening on {path}", file=sys.stderr)
+                sys.exit(1)
+            sys.exit(0)
+        try:
+            serve(path)
+        except DaemonError as ex:
+            print(ex, file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
 
 
-def main() -> None:
+def parse_args(argv: Sequence[str]) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Tato CLI tool")
-    parser.add_argument(
-        "--version",
-        action="version",
-        version=f"tato version {__version__} (libcst version {libcst_version})",
-    )
+    parser.add_argument("--version", action=_VersionAction)
 
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     # Index subcommand
     index_parser = subparsers.add_parser("index", help="Create an index")
     index_parser.add_argument("path", help="Package to index")
+    index_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only re-index new, changed or deleted files of an existing index",
+    )
+    index_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes. Defaults to the number of cores",
+    )
+    index_parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Print the peak memory of each phase and the files using the most",
+    )
 
     # Codemod subcommand
     format_parser = subparsers.add_parser("format", help="Run format command")
     format_parser.add_argument("paths", nargs="+", help="Paths to process")
     format_parser.add_argument("--with-index", help="Path to index file")
+    format_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of workers. Defaults to the number of cores",
+    )
+    format_parser.add_argument(
+        "--backend",
+        choices=["serial", "process", "thread"],
+        default=None,
+        help="How to run workers. Defaults to serial for a few files, else process",
+    )
+    format_parser.add_argument(
+        "--no-format",
+        action="store_true",
+        help="Don't format changed files with the formatter configured for libcst",
+    )
+    format_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Format every file, even if it is known to be formatted",
+    )
+    format_parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Don't write files. Exit with 1 if any file would be reordered",
+    )
+    format_parser.add_argument(
+        "--diff",
+        action="store_true",
+        help="Don't write files, print a diff of each file that would be reordered",
+    )
+    format_parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="Write the time of each phase of each file to FILE, as Chrome trace JSON",
+    )
+    format_parser.add_argument(
+        "--report",
+        action="store_true",
+        help="Print files/s, per-file latency, time per phase and the slowest files",
+    )
+    format_parser.add_argument(
+        "--report-json",
+        metavar="FILE",
+        help="Write the report of --report to FILE, as JSON",
+    )
+    format_parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Print the peak memory of each phase and the files using the most",
+    )
+    format_parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Format in this process, even if `tato daemon` is running",
+    )
 
-    args = parser.parse_args()
+    # Daemon subcommand
+    daemon_parser = subparsers.add_parser(
+        "daemon", help="Serve format commands, so they start faster"
+    )
+    daemon_parser.add_argument(
+        "--socket",
+        help="Path of the Unix socket. Defaults to daemon.sock in the cache directory",
+    )
+    daemon_parser.add_argument(
+        "--stop", action="store_true", help="Stop the running daemon"
+    )
 
-    if args.command == "index":
-        # chdir so the fully_qualified_name of the module matches Python's
-        p = Path(args.path)
-        with paths.chdir(p.parent):
-            index_path = Path(p.name).joinpath("tato-index.sqlite3")
-            index_path.unlink(missing_ok=True)
-            Index(index_path).create()
-        sys.exit(0)
-    elif args.command == "format":
-        # The help text from libcst spits out 'usage: tato codemod' and exposes the
-        # underlying libcst configuration. We can reuse that for now.
-        libcst_args = ["codemod", "-x", "tato.tato.ReorderFileCodemod"]
-        if args.with_index:
-            libcst_args.extend(["--with-index", args.with_index])
-        sys.exit(libcst.tool.main("tato", libcst_args + args.paths))
+    return parser.parse_args(argv)
+
+
+def run_format(args: argparse.Namespace, parse_cache_size: int = 0) -> int:
+    """Run `tato format`. Returns the exit code.
+
+    `parse_cache_size` parsed modules are kept for later runs in this process.
+    """
+    with _profile_memory(args.profile_memory):
+        return _run_format(args, parse_cache_size)
+
+
+def _run_format(args: argparse.Namespace, parse_cache_size: int) -> int:
+    from libcst.codemod import gather_files
+    from libcst.tool import _find_and_load_config
+
+    from tato._cache import FormatCache
+    from tato._executor import Backend, ExecutorConfig, execute
+    from tato.index.index import shared_index
+
+    config = _find_and_load_config("tato")
+    formatter_args = config["formatter"]
+    if os.path.basename(formatter_args[0]) in ("black", "black.exe"):
+        target_version = f"py{sys.version_info.major}{sys.version_info.minor}"
+        formatter_args = [
+            formatter_args[0],
+            "--target-version",
+            target_version,
+            *formatter_args[1:],
+        ]
+
+    with _memory.phase("discovery"):
+        files = gather_files(args.paths)
+        cache = None
+        # Explanations are comments in the output, which the cache knows nothing
+        # about.
+        if not args.no_cache and os.environ.get("TATO_DEBUG_EXPLAIN") != "1":
+            generation = ""
+            if args.with_index:
+                generation = shared_index(Path(args.with_index)).generation
+            cache = FormatCache(
+                index_generation=generation,
+                repo_root=os.path.abspath(config["repo_root"]),
+            )
+            unformatted = cache.unformatted(files)
+            if skipped := len(files) - len(unformatted):
+                print(f"Skipped {skipped} cached files.", file=sys.stderr)
+            files = unformatted
+
+    executor_config = ExecutorConfig(
+        with_index=args.with_index,
+        repo_root=os.path.abspath(config["repo_root"]),
+        format_code=not args.no_format,
+        formatter_args=formatter_args,
+        generated_code_marker=config["generated_code_marker"],
+        blacklist_patterns=config["blacklist_patterns"],
+        cache_generation=cache.index_generation if cache else None,
+        check=args.check,
+        diff=5 if args.diff else None,
+        parse_cache_size=parse_cache_size,
+        trace=args.trace is not None or args.report or args.report_json is not None,
+        profile_memory=_memory.is_profiling(),
+    )
+    backend = Backend(args.backend) if args.backend else None
+    start = time.perf_counter()
+    try:
+        with _memory.phase("format"):
+            result = execute(files, executor_config, args.jobs, backend)
+    except KeyboardInterrupt:
+        print("Interrupted!", file=sys.stderr)
+        return 2
+    wall_time = time.perf_counter() - start
+    for file in result.file_memory:
+        _memory.add_file(file)
+    if args.trace:
+        from tato import _trace
+
+        _trace.write(Path(args.trace), result.trace_events)
+    if cache:
+        with _memory.phase("cache"):
+            cache.add(result.cache_keys)
+            cache.evict()
+            cache.close()
+
+    print(f"Finished codemodding {result.total} files!", file=sys.stderr)
+    print(f" - Transformed {result.successes} files successfully.", file=sys.stderr)
+    print(f" - Skipped {result.skips} files.", file=sys.stderr)
+    print(f" - Failed to codemod {result.failures} files.", file=sys.stderr)
+    print(f" - {result.warnings} warnings were generated.", file=sys.stderr)
+    if executor_config.dry_run:
+        print(f" - {result.changed} files would be reordered.", file=sys.stderr)
+    if args.report or args.report_json:
+        from tato._report import build_report, format_report, write_report
+
+        report = build_report(result.trace_events, wall_time)
+        if args.report:
+            print(f"\n{format_report(report)}", file=sys.stderr)
+        if args.report_json:
+            write_report(report, Path(args.report_json))
+    if executor_config.dry_run and result.changed > 0:
+        return 1
+    return 1 if result.failures > 0 else 0
+
+
+@contextmanager
+def _profile_memory(enabled: bool) -> Iterator[None]:
+    """Print the peak memory of the phases of the block, if `enabled`."""
+    if not enabled:
+        yield
+        return
+    with _memory.MemoryProfiler() as profiler:
+        yield
+    print(f"\n{profiler.format()}", file=sys.stderr)
+
+
+class _VersionAction(argparse.Action):
+    """Like `action="version"`, but only imports libcst when asked."""
+
+    def __init__(self, option_strings: Sequence[str], dest: str, **kwargs) -> None:
+        super().__init__(
+            option_strings,
+            dest=argparse.SUPPRESS,
+            default=argparse.SUPPRESS,
+            nargs=0,
+            help="show program's version number and exit",
+        )
+
+    def __call__(self, parser, namespace, values, option_string=None) -> None:
+        from libcst._version import __version__ as libcst_version
+
+        parser.exit(
+            message=f"tato version {__version__} (libcst version {libcst_version})\n"
+        )
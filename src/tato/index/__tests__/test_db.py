@@ -3,7 +3,6 @@ from tempfile import NamedTemporaryFile
 
 from tato.index._db import DB
 from tato.index._types import Definition, DefRef, File, Reference
-from tato.lib.uuid import uuid7str
 
 
 def test_db():
@@ -13,27 +12,31 @@ def test_db():
 
         # Prepare objects for bulk insert
         file1 = File(
-            id=uuid7str(),
+            id=1,
             path="/path/to/file1.py",
             module="module1",
             package="package1",
+            hash="",
+            mtime_ns=0,
         )
         file2 = File(
-            id=uuid7str(),
+            id=2,
             path="/path/to/file2.py",
             module="module2",
             package="package2",
+            hash="",
+            mtime_ns=0,
         )
 
         def1 = Definition(
-            id=uuid7str(),
+            id=1,
             file_id=file1.id,
             fully_qualified_name="module1.func1",
             start_line=1,
             start_col=1,
         )
         def2 = Definition(
-            id=uuid7str(),
+            id=2,
             file_id=file2.id,
             fully_qualified_name="module2.func1",
             start_line=1,
@@ -41,22 +44,22 @@ def test_db():
         )
 
         ref1 = Reference(
-            id=uuid7str(),
+            id=1,
             file_id=file1.id,
             fully_qualified_name="module2.func1",
             start_line=5,
             start_col=1,
         )
         ref2 = Reference(
-            id=uuid7str(),
+            id=2,
             file_id=file2.id,
             fully_qualified_name="module1.func1",
             start_line=10,
             start_col=1,
         )
 
-        defref1 = DefRef(id=uuid7str(), definition_id=def1.id, reference_id=ref2.id)
-        defref2 = DefRef(id=uuid7str(), definition_id=def2.id, reference_id=ref1.id)
+        defref1 = DefRef(definition_id=def1.id, reference_id=ref2.id)
+        defref2 = DefRef(definition_id=def2.id, reference_id=ref1.id)
 
         # Perform bulk insert
         db_manager.bulk_insert([file1, file2, def1, def2, ref1, ref2, defref1, defref2])
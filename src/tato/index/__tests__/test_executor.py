@@ -0,0 +1,76 @@
+import queue
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+from tato.index._collector import collect_files
+from tato.index._executor import CollectConfig, collect_file, execute
+from tato.index._types import Definition, Reference
+
+
+def _package(tmp_path: Path, modules: int) -> Path:
+    package = tmp_path.joinpath("pkg")
+    package.mkdir()
+    package.joinpath("__init__.py").touch()
+    package.joinpath("mod0.py").write_text("x = 1\n")
+    for i in range(1, modules):
+        package.joinpath(f"mod{i}.py").write_text(
+            f"from pkg.mod{i - 1} import x\n\ny{i} = x\n"
+        )
+    package.joinpath("invalid.py").write_text("def (")
+    return package
+
+
+@pytest.mark.parametrize("ast_analysis", [True, False])
+def test_execute(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str], ast_analysis: bool
+) -> None:
+    package = _package(tmp_path, 20)
+    files = collect_files(tmp_path, package)
+    config = CollectConfig(
+        root_path=str(tmp_path), package="pkg", ast_analysis=ast_analysis
+    )
+    rows: queue.Queue = queue.Queue()
+
+    summary = execute(files, config, rows, jobs=2)
+
+    assert (summary.successes, summary.failures) == (21, 1)
+    collected = [row for _ in range(rows.qsize()) for row in rows.get()]
+    assert len(collected) == summary.rows
+    references = [r for r in collected if isinstance(r, Reference)]
+    assert sum(r.fully_qualified_name == "pkg.mod0.x" for r in references) == 2
+    err = capsys.readouterr().err
+    assert "Failed to index pkg/invalid.py" in err
+    assert err.endswith(f"Indexed 22/22 files ({summary.rows} rows, 1 failed)\n")
+
+
+def test_collect_file(tmp_path: Path) -> None:
+    package = _package(tmp_path, 2)
+    [f] = [f for f in collect_files(tmp_path, package) if f.path == "pkg/mod1.py"]
+    config = CollectConfig(root_path=str(tmp_path), package="pkg")
+
+    result = collect_file(f, config)
+    libcst_result = collect_file(f, CollectConfig(str(tmp_path), "pkg", False))
+
+    assert not result.error
+    assert sorted(map(repr, result.rows)) == sorted(map(repr, libcst_result.rows))
+    definitions = [r for r in result.rows if isinstance(r, Definition)]
+    assert [d.fully_qualified_name for d in definitions] == [
+        "pkg.mod1.x",
+        "pkg.mod1.y1",
+    ]
+
+
+def test_profile_memory(tmp_path: Path) -> None:
+    package = _package(tmp_path, 1)
+    [f] = [f for f in collect_files(tmp_path, package) if f.path == "pkg/mod0.py"]
+    config = CollectConfig(root_path=str(tmp_path), package="pkg", profile_memory=True)
+
+    result = collect_file(f, config)
+    # Started to measure the file, as a worker would.
+    tracemalloc.stop()
+
+    assert result.memory is not None
+    assert result.memory.filename == "pkg/mod0.py"
+    assert result.memory.peak_traced > 0
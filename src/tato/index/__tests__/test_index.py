@@ -1,6 +1,14 @@
+import os
+import shutil
+import sqlite3
+from collections import Counter
 from pathlib import Path
 
-from tato.index.index import Index
+import pytest
+
+from tato.index._db import DB
+from tato.index._types import Definition, PartialDefDef, Reference, ReferenceCount
+from tato.index.index import Index, NoopIndex, shared_index
 
 PARENT = Path(__file__).parent
 
@@ -22,3 +30,235 @@ def test_index():
     assert index.count_references("test1.b.one") == 1
     assert index.count_references("test1.b.two") == 1
     assert index.count_references("test1.c.three") == 0
+
+
+def test_index_update(tmp_path: Path):
+    package = tmp_path.joinpath("test1")
+    shutil.copytree(
+        PARENT.joinpath("data/index/test1"),
+        package,
+        ignore=shutil.ignore_patterns("tato-index.sqlite3*"),
+    )
+    dbpath = package.joinpath("tato-index.sqlite3")
+
+    index = Index(dbpath)
+    index.update()  # Falls back to a full build
+    assert index.count_references("test1.a.one") == 2
+
+    # Nothing changed
+    index.update()
+    assert index.count_references("test1.a.one") == 2
+    assert index.count_references("test1.b.two") == 1
+
+    # Only the mtime changed
+    a = package.joinpath("a.py")
+    os.utime(a, ns=(a.stat().st_atime_ns, a.stat().st_mtime_ns + 1_000_000))
+    index.update()
+    assert index.count_references("test1.a.one") == 2
+
+    # A referenced definition changed; references from other files are re-linked
+    a.write_text("# The one and only\none = 1\n")
+    index.update()
+    assert index.count_references("test1.a.one") == 2
+    assert index.count_references("test1.b.one") == 1
+
+    # A referencing file changed
+    package.joinpath("c.py").write_text("from test1.b import one\n\nthree = one\n")
+    index.update()
+    assert index.count_references("test1.b.two") == 0
+    assert index.count_references("test1.b.one") == 1
+
+    # A referencing file was deleted
+    package.joinpath("c.py").unlink()
+    index.update()
+    assert index.count_references("test1.a.one") == 1
+    assert index.count_references("test1.b.one") == 0
+
+    # A new definition is linked to existing references in unchanged files
+    package.joinpath("c.py").write_text("from test1.d import four\n\nfive = four\n")
+    index.update()
+    assert index.count_references("test1.d.four") == 0
+    package.joinpath("d.py").write_text("four = 4\n")
+    index.update()
+    assert index.count_references("test1.d.four") == 1
+
+
+def test_count_references_many():
+    package = PARENT.joinpath("data/index/test1")
+    dbpath = package.joinpath("tato-index.sqlite3")
+    if dbpath.exists():
+        dbpath.unlink()
+
+    index = Index(dbpath)
+    fqnames = ["test1.a.one", "test1.b.one", "test1.b.two", "test1.c.three", "nope"]
+    assert index.count_references_many(fqnames) == dict.fromkeys(fqnames, 0)
+
+    index.create()
+
+    assert index.count_references_many(fqnames) == {
+        "test1.a.one": 2,
+        "test1.b.one": 1,
+        "test1.b.two": 1,
+        "test1.c.three": 0,
+        "nope": 0,
+    }
+    assert index.count_references_many([]) == {}
+
+
+def test_outdated_index(tmp_path: Path):
+    package = tmp_path.joinpath("test1")
+    shutil.copytree(
+        PARENT.joinpath("data/index/test1"),
+        package,
+        ignore=shutil.ignore_patterns("tato-index.sqlite3*"),
+    )
+    dbpath = package.joinpath("tato-index.sqlite3")
+    Index(dbpath).create()
+    db = DB(dbpath)
+    db.cursor.execute("PRAGMA user_version = 0")
+    db.close()
+
+    index = Index(dbpath)
+    with pytest.raises(ValueError, match="another version of tato"):
+        index.count_references("test1.a.one")
+
+    index.update()  # Rebuilds the index
+    assert index.count_references("test1.a.one") == 2
+
+
+def test_index_parallel(tmp_path: Path):
+    package = tmp_path.joinpath("pkg")
+    package.mkdir()
+    package.joinpath("__init__.py").touch()
+    package.joinpath("mod0.py").write_text("x = 1\n")
+    for i in range(1, 12):
+        package.joinpath(f"mod{i}.py").write_text(
+            f"from pkg.mod{i - 1} import x\n\ny{i} = x\n"
+        )
+    dbpath = package.joinpath("tato-index.sqlite3")
+
+    index = Index(dbpath)
+    index.create(jobs=2)
+
+    assert index.count_references("pkg.mod0.x") == 11
+    assert index.count_references("pkg.mod10.x") == 1
+
+
+# Names whose positions `ast` doesn't have, imports and scopes.
+PKG_MODULES = {
+    "__init__.py": "from pkg.a import One as Uno\n",
+    "a.py": (
+        "import os.path\n"
+        "from . import b\n"
+        "from .b import two, three as drei\n"
+        "try:\n"
+        "    from pkg.b import two\n"
+        "except ImportError:  # été\n"
+        "    two = None\n"
+        "\n"
+        "async  def  f(x: 'One', *args, k=b.three, **kw) -> 'drei':\n"
+        "    global One\n"
+        "    try:\n"
+        "        return [two for _ in (os.path.join, drei)]\n"
+        "    except (ValueError,\n"
+        "            TypeError)  as  e:\n"
+        "        return é, e\n"
+        "\n"
+        "@f\n"
+        "class  One(b.Base, metaclass=type):\n"
+        "    one = 1\n"
+        "    def g(self): return one, One\n"
+        "\n"
+        "def h(p):\n"
+        "    match p:\n"
+        "        case One(one=x, two=[*y]) | {'k': x, **y} as y: return x, y\n"
+        "\n"
+        "é = x = One.one\n"
+    ),
+    "b.py": "class Base: pass\n\ntwo = three = Base()\n",
+}
+
+
+def test_ast_analysis(tmp_path: Path):
+    package = tmp_path.joinpath("pkg")
+    package.mkdir()
+    for name, source in PKG_MODULES.items():
+        package.joinpath(name).write_text(source, encoding="utf-8")
+
+    rows = []
+    for ast_analysis in (True, False):
+        dbpath = package.joinpath(f"index-{ast_analysis}.sqlite3")
+        Index(dbpath, ast_analysis=ast_analysis).create(jobs=1)
+        db = DB(dbpath)
+        rows.append(
+            {
+                cls: Counter(
+                    tuple(v for k, v in vars(row).items() if k != "id")
+                    for row in db.select(cls)
+                )
+                for cls in (Definition, Reference, PartialDefDef, ReferenceCount)
+            }
+        )
+        db.close()
+
+    assert rows[0] == rows[1]
+    assert sum(rows[0][Reference].values()) > 20
+
+
+@pytest.mark.parametrize("ast_analysis", [True, False])
+def test_failed_definition(tmp_path: Path, ast_analysis: bool):
+    package = tmp_path.joinpath("pkg")
+    package.mkdir()
+    # The relative import can't be resolved from the module `pkg`.
+    package.joinpath("__init__.py").write_text(
+        "from . import a\nfrom pkg.a import one\n\n\ndef f(x):\n    return one + x\n"
+    )
+    package.joinpath("a.py").write_text("one = 1\n")
+    dbpath = package.joinpath("tato-index.sqlite3")
+
+    index = Index(dbpath, ast_analysis=ast_analysis)
+    index.create(jobs=1)
+
+    # The other definitions and references of the file are collected.
+    assert index.count_references("pkg.a.one") == 1
+    assert index.count_references("pkg.f") == 0
+    fqnames = {r.fully_qualified_name for r in index.db.select(Reference)}
+    assert fqnames == {"pkg.a.one", "pkg.f"}
+    assert {d.fully_qualified_name for d in index.db.select(Definition)} == {
+        "pkg.one",
+        "pkg.f",
+        "pkg.a.one",
+    }
+
+
+def test_shared_index(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    assert isinstance(shared_index(tmp_path / "missing.sqlite3"), NoopIndex)
+    assert not tmp_path.joinpath("missing.sqlite3").exists()
+
+    package = tmp_path.joinpath("test1")
+    shutil.copytree(
+        PARENT.joinpath("data/index/test1"),
+        package,
+        ignore=shutil.ignore_patterns("tato-index.sqlite3*"),
+    )
+    dbpath = package.joinpath("tato-index.sqlite3")
+    Index(dbpath).create()
+
+    index = shared_index(dbpath)
+    assert shared_index(dbpath) is index
+    assert index.count_references("test1.a.one") == 2
+    with pytest.raises(sqlite3.OperationalError):
+        index.db.cursor.execute("DELETE FROM ReferenceCount")
+
+    # A re-created index is opened again.
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{dbpath}{suffix}").unlink(missing_ok=True)
+    Index(dbpath).create()
+    recreated = shared_index(dbpath)
+    assert recreated is not index
+    assert recreated.count_references("test1.a.one") == 2
+    index = recreated
+
+    # A forked process opens its own connection.
+    monkeypatch.setattr(os, "getpid", lambda: -1)
+    assert shared_index(dbpath) is not index
@@ -0,0 +1,340 @@
+"""Collect the rows of a file with `ast`, like `IndexCollector` with libcst.
+
+`IndexCollector` looks up the `FullyQualifiedNameProvider` names of every
+name and attribute, which resolves the scopes of the whole module with
+libcst. Here the scopes are resolved by the visitor of `tato._ast_analysis`,
+which follows the same rules, so both collectors find the same rows. `ast`
+has no node for some names (e.g. the name of a function), whose positions are
+found in the source.
+"""
+
+import ast
+import bisect
+import io
+import re
+import sys
+import tokenize
+from collections import defaultdict
+from typing import Iterator, Optional, Union
+
+from tato._ast_analysis import DependencyVisitor, dotted_names, full_name
+from tato._scope import Assignment, Scope
+from tato.index._definition import is_global_name
+from tato.index._ids import row_ids
+from tato.index._types import Definition, File, PartialDefDef, Reference
+
+# Whitespace between two tokens of a line.
+_SPACE = r"(?:[ \t\f]|\\(?:\r\n|\r|\n))"
+# Whitespace between two tokens in brackets, comments included.
+_GAP = r"(?:\s|\\(?:\r\n|\r|\n)|#[^\r\n]*)"
+_DEF_KEYWORDS = re.compile(rf"(?:async{_SPACE}+)?(?:def|class){_SPACE}+")
+_EXCEPT_AS = re.compile(rf"(?:{_GAP}|\))*as{_SPACE}+")
+_MAPPING_REST = re.compile(rf"(?:{_GAP}|,)*\*\*{_GAP}*")
+_CLASS_KEYWORD = re.compile(rf"(?:{_GAP}|[(),])*")
+_NEWLINE = re.compile(r"\r\n|\r|\n")
+
+# A fully qualified name, and whether it is imported. libcst keeps both, so a
+# name that is both imported and assigned is referenced twice.
+_QualifiedName = tuple[str, bool]
+
+
+def collect_rows(source: bytes, f: File, package: str) -> list:
+    """The definitions, partial defdefs and references of a file.
+
+    `package` is the name of the indexed package. Raises `SyntaxError` if `ast`
+    can't parse `source`, and `ImportError` for names relative to a module
+    beyond the top-level package, as `IndexCollector` fails on them.
+    """
+    module = ast.parse(source)
+    visitor = _IndexVisitor()
+    for statement in module.body:
+        visitor.statement = statement
+        visitor.visit(statement)
+
+    collector = _Collector(_Source(source), f, f"{package}.")
+    definitions, partial_defdefs = collector.definitions(visitor.scope)
+    references = collector.references(visitor)
+    ids = row_ids(f.id)
+    return [
+        *(Definition(id=next(ids), **d) for d in definitions),
+        *partial_defdefs,
+        *(Reference(id=next(ids), **r) for r in references),
+    ]
+
+
+class _IndexVisitor(DependencyVisitor):
+    """Also records the names `IndexCollector` looks up, and their scope.
+
+    These are the names and attributes that libcst visits (e.g. not those in
+    a string annotation), and the names of functions, classes, parameters and
+    exceptions, which are not `ast` nodes.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.names: list[tuple[Union[ast.Name, ast.Attribute], Scope]] = []
+        # (name, node that positions it, scope)
+        self.other_names: list[tuple[str, ast.AST, Scope]] = []
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if self.string_annotation is None:
+            self.names.append((node, self.scope))
+        super().visit_Name(node)
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        if self.string_annotation is None:
+            self.names.append((node, self.scope))
+        super().visit_Attribute(node)
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler) -> None:
+        if node.name is not None:
+            self.other_names.append((node.name, node, self.scope))
+        super().visit_ExceptHandler(node)
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self.other_names.append((node.name, node, self.scope))
+        super().visit_ClassDef(node)
+
+    def visit_FunctionDef(
+        self, node: Union[ast.FunctionDef, ast.AsyncFunctionDef]
+    ) -> None:
+        self.other_names.append((node.name, node, self.scope))
+        super().visit_FunctionDef(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _visit_arguments(self, node: ast.arguments) -> None:
+        for arg in [
+            *node.posonlyargs,
+            *node.args,
+            node.vararg,
+            *node.kwonlyargs,
+            node.kwarg,
+        ]:
+            if arg is not None:
+                self.other_names.append((arg.arg, arg, self.scope))
+        super()._visit_arguments(node)
+
+
+class _Collector:
+    def __init__(self, source: "_Source", f: File, package_prefix: str) -> None:
+        self.source = source
+        self.file = f
+        self.package_prefix = package_prefix
+
+    def definitions(self, scope: Scope) -> tuple[list[dict], set[PartialDefDef]]:
+        """Like `IndexCollector.visit_Module`: the assignments of the module."""
+        definitions: list[dict] = []
+        partial_defdefs: set[PartialDefDef] = set()
+        for assignments in scope.assignments.values():
+            for assignment in assignments:
+                node = assignment.node
+                if isinstance(node, ast.ImportFrom):
+                    # Every imported name, for each name the statement assigns.
+                    try:
+                        module = _absolute_module(self.file.module, node)
+                    except ValueError:
+                        # Left out, like `IndexCollector` does.
+                        continue
+                    position = self._start(node)
+                    for alias in node.names:
+                        fqname = f"{self.file.module}.{alias.name}"
+                        definitions.append(self._row(fqname, *position))
+                        partial_defdefs.add(
+                            PartialDefDef(
+                                from_qual_name=f"{module}.{alias.name}",
+                                to_qual_name=fqname,
+                            )
+                        )
+                elif isinstance(node, (ast.Name, ast.ExceptHandler, *_DEFINITIONS)):
+                    fqname = f"{self.file.module}.{assignment.name}"
+                    # libcst positions functions and classes by their keyword.
+                    position = (
+                        self._start(node)
+                        if isinstance(node, _DEFINITIONS)
+                        else self._position(assignment.name, node)
+                    )
+                    definitions.append(self._row(fqname, *position))
+        return definitions, partial_defdefs
+
+    def references(self, visitor: _IndexVisitor) -> list[dict]:
+        """Like `IndexCollector._visit_name_attr_alike`, for every name."""
+        references: list[dict] = []
+        # Fully qualified names of the nodes that are accessed.
+        accessed: dict[ast.AST, set[_QualifiedName]] = defaultdict(set)
+        for access in visitor.accesses:
+            if access.string_annotation is not None:
+                continue
+            fqnames = {
+                fqname
+                for assignment in access.referents(access.resolve(dotted_names))
+                for fqname in self._fully_qualified(assignment, assignment.name)
+            }
+            if isinstance(access.node, (ast.Name, ast.Attribute)):
+                accessed[access.node] |= fqnames
+            else:
+                # A capture of a `match` pattern.
+                position = self._position(access.name, access.node)
+                references.extend(self._references(fqnames, *position))
+
+        for node, scope in visitor.names:
+            if node in accessed:
+                fqnames = accessed[node]
+            else:
+                fqnames = self._lookup(full_name(node), node, scope)
+            references.extend(self._references(fqnames, *self._start(node)))
+
+        for name, node, scope in visitor.other_names:
+            # Only exception names are assigned by the node libcst has for them.
+            fqnames = self._lookup(
+                name, node if isinstance(node, ast.ExceptHandler) else None, scope
+            )
+            references.extend(self._references(fqnames, *self._position(name, node)))
+        return references
+
+    def _lookup(
+        self, name: Optional[str], node: Optional[ast.AST], scope: Scope
+    ) -> set[_QualifiedName]:
+        """Fully qualified names of a name that is not accessed."""
+        if name is None:
+            return set()
+        return {
+            fqname
+            for assignment in scope.lookup(name, node)
+            for fqname in self._fully_qualified(assignment, name)
+        }
+
+    def _fully_qualified(
+        self, assignment: Assignment, name: str
+    ) -> Iterator[_QualifiedName]:
+        """Like `FullyQualifiedNameVisitor._fully_qualify`."""
+        imported = assignment.imported is not None
+        for qname in assignment.qualified_names(name):
+            if not imported or qname.startswith("."):
+                qname = _fully_qualify_local(
+                    self.file.module, self.file.package, qname
+                )
+            yield qname, imported
+
+    def _references(
+        self, fqnames: set[_QualifiedName], line: int, column: int
+    ) -> list[dict]:
+        return [
+            self._row(fqname, line, column)
+            for fqname, _ in fqnames
+            if is_global_name(fqname, self.package_prefix)
+        ]
+
+    def _row(self, fqname: str, line: int, column: int) -> dict:
+        return {
+            "file_id": self.file.id,
+            "fully_qualified_name": fqname,
+            "start_line": line,
+            "start_col": column,
+        }
+
+    def _start(self, node: Union[ast.expr, ast.stmt, ast.arg]) -> tuple[int, int]:
+        return node.lineno, self.source.column(node.lineno, node.col_offset)
+
+    def _position(self, name: str, node: ast.AST) -> tuple[int, int]:
+        """The line and column of `name`, which `node` assigns or accesses."""
+        source = self.source
+        if isinstance(node, (ast.Name, ast.arg)):
+            return self._start(node)
+        if isinstance(node, _DEFINITIONS):
+            return source.match(_DEF_KEYWORDS, node.lineno, node.col_offset)
+        if isinstance(node, ast.ExceptHandler):
+            start = node.type or node
+            return source.match(_EXCEPT_AS, start.end_lineno, start.end_col_offset)
+        # `ast` has no `match` patterns before Python 3.10.
+        if sys.version_info >= (3, 10) and isinstance(node, ast.pattern):
+            return self._pattern_position(name, node)
+        raise TypeError(f"No position for {name} in {type(node).__name__}")
+
+    def _pattern_position(self, name: str, node: ast.AST) -> tuple[int, int]:
+        """The line and column of `name`, captured by the pattern `node`."""
+        source = self.source
+        if isinstance(node, (ast.MatchAs, ast.MatchStar)):
+            # The name ends the pattern.
+            col_offset = node.end_col_offset - len(name.encode())
+            return node.end_lineno, source.column(node.end_lineno, col_offset)
+        if isinstance(node, ast.MatchMapping):
+            if node.patterns:
+                last = node.patterns[-1]
+                return source.match(
+                    _MAPPING_REST, last.end_lineno, last.end_col_offset
+                )
+            # After the `{`.
+            return source.match(_MAPPING_REST, node.lineno, node.col_offset + 1)
+        if isinstance(node, ast.MatchClass):
+            i = node.kwd_attrs.index(name)
+            previous = [node.cls, *node.patterns, *node.kwd_patterns][
+                len(node.patterns) + i
+            ]
+            return source.match(
+                _CLASS_KEYWORD, previous.end_lineno, previous.end_col_offset
+            )
+        raise TypeError(f"No position for {name} in {type(node).__name__}")
+
+
+_DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+class _Source:
+    """Positions in a source, in characters like libcst rather than bytes."""
+
+    def __init__(self, source: bytes) -> None:
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(source).readline)
+        self.text = source.decode(encoding)
+        self.line_starts = [0, *(m.end() for m in _NEWLINE.finditer(self.text))]
+
+    def column(self, lineno: int, col_offset: int) -> int:
+        """The column of an `ast` position, whose offset is in UTF-8 bytes."""
+        line = self.text[self.line_starts[lineno - 1] : self.line_starts[lineno]]
+        if line.isascii():
+            return col_offset
+        return len(line.encode()[:col_offset].decode())
+
+    def match(
+        self, pattern: "re.Pattern[str]", lineno: int, col_offset: int
+    ) -> tuple[int, int]:
+        """The line and column where `pattern`, matched at a position, ends."""
+        start = self.line_starts[lineno - 1] + self.column(lineno, col_offset)
+        match = pattern.match(self.text, start)
+        if match is None:
+            raise ValueError(f"No {pattern.pattern!r} at {lineno}:{col_offset}")
+        end = match.end()
+        line = bisect.bisect_right(self.line_starts, end)
+        return line, end - self.line_starts[line - 1]
+
+
+def _absolute_module(current_module: str, node: ast.ImportFrom) -> str:
+    """Like `libcst.helpers.get_absolute_module_for_import_or_raise`.
+
+    Relative imports are resolved from the module, not from its package, so
+    `from . import a` fails in an `__init__.py`, as it does with libcst.
+    """
+    if node.level == 0:
+        return node.module  # type: ignore[return-value]
+    modules = current_module.split(".")
+    if len(modules) < node.level:
+        raise ValueError(f"Unable to compute absolute module for {ast.unparse(node)}")
+    base_module = ".".join(modules[: -node.level])
+    if node.module is not None:
+        base_module = f"{base_module}.{node.module}" if base_module else node.module
+    if not base_module:
+        raise ValueError(f"Unable to compute absolute module for {ast.unparse(node)}")
+    return base_module
+
+
+def _fully_qualify_local(module_name: str, package_name: str, name: str) -> str:
+    """Like `FullyQualifiedNameVisitor._fully_qualify_local`."""
+    abs_name = name.lstrip(".")
+    num_dots = len(name) - len(abs_name)
+    if num_dots > 0:
+        name = abs_name
+        bits = package_name.rsplit(".", num_dots - 1)
+        if len(bits) < num_dots:
+            raise ImportError("attempted relative import beyond top-level package")
+        module_name = bits[0]
+    return f"{module_name}.{name}"
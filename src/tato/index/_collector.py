@@ -1,21 +1,78 @@
+import dataclasses
+import hashlib
 from pathlib import Path
+from typing import Iterator, Mapping
 
 from libcst.helpers import calculate_module_and_package
-from libcst.metadata import FullRepoManager
 
+from tato.index._ids import file_ids
 from tato.index._types import File
-from tato.lib.uuid import uuid7str
 
 
-def collect_files(manager: FullRepoManager, package: Path) -> list[File]:
-    files = []
+@dataclasses.dataclass(frozen=True)
+class FileChanges:
+    """Difference between the files on disk and the files in the index."""
+
+    # New or modified files. Modified files get a new `File.id`.
+    added: list[File]
+    # Files that are no longer on disk, or whose content changed.
+    removed: list[File]
+    # Files whose mtime changed, but whose content did not.
+    touched: list[File]
+
+
+def collect_files(root_path: Path, package: Path) -> list[File]:
+    ids = file_ids()
+    return [_new_file(root_path, path, ids) for path in package.rglob("*.py")]
+
+
+def diff_files(
+    root_path: Path, package: Path, indexed: Mapping[str, File]
+) -> FileChanges:
+    """Compare files on disk with the `indexed` files (keyed by `File.path`).
+
+    The mtime is checked first, so unchanged files are never read. Files with a
+    new mtime are hashed to decide if their content really changed.
+    """
+    added: list[File] = []
+    removed: list[File] = []
+    touched: list[File] = []
+    seen: set[str] = set()
+    ids = file_ids(max((f.id for f in indexed.values()), default=0) + 1)
     for path in package.rglob("*.py"):
-        mod_pkg = calculate_module_and_package(manager.root_path, str(path))
-        f = File(
-            id=uuid7str(),
-            path=path.relative_to(manager.root_path).as_posix(),
-            module=mod_pkg.name,
-            package=mod_pkg.package,
-        )
-        files.append(f)
-    return files
+        relpath = path.relative_to(root_path).as_posix()
+        seen.add(relpath)
+        old = indexed.get(relpath)
+        if old is None:
+            added.append(_new_file(root_path, path, ids))
+            continue
+        mtime_ns = path.stat().st_mtime_ns
+        if old.mtime_ns == mtime_ns:
+            continue
+        content_hash = _hash(path)
+        if old.hash == content_hash:
+            touched.append(dataclasses.replace(old, mtime_ns=mtime_ns))
+        else:
+            removed.append(old)
+            added.append(_new_file(root_path, path, ids, content_hash))
+
+    removed.extend(f for p, f in indexed.items() if p not in seen)
+    return FileChanges(added=added, removed=removed, touched=touched)
+
+
+def _new_file(
+    root_path: Path, path: Path, ids: Iterator[int], content_hash: str = ""
+) -> File:
+    mod_pkg = calculate_module_and_package(root_path, str(path))
+    return File(
+        id=next(ids),
+        path=path.relative_to(root_path).as_posix(),
+        module=mod_pkg.name,
+        package=mod_pkg.package,
+        hash=content_hash or _hash(path),
+        mtime_ns=path.stat().st_mtime_ns,
+    )
+
+
+def _hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
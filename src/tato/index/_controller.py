@@ -1,6 +1,21 @@
+from collections import defaultdict
+from typing import Iterator, Optional, Sequence, TypeVar
+
 from tato.index._db import DB
-from tato.index._types import DefDef, Definition, File
-from tato.lib.uuid import uuid7str
+from tato.index._types import (
+    DefDef,
+    Definition,
+    DefRef,
+    File,
+    PartialDefDef,
+    Reference,
+    ReferenceCount,
+)
+
+T = TypeVar("T")
+
+# Stay well below SQLite's limit on the number of variables in a query.
+CHUNK_SIZE = 500
 
 
 def get_file(db: DB, filename: str) -> File:
@@ -8,21 +23,154 @@ def get_file(db: DB, filename: str) -> File:
     return File(**res.fetchone())
 
 
-def find_defdef(db: DB) -> list[DefDef]:
+def get_all_files(db: DB) -> list[File]:
+    return db.select(File)
+
+
+def find_defdef(db: DB, file_ids: Optional[Sequence[int]] = None) -> list[DefDef]:
+    """Resolve PartialDefDefs into DefDefs.
+
+    If `file_ids` is given, only links where either definition lives in one of
+    those files are returned.
+    """
     sql = """
     SELECT d1.id as from_definition_id, d2.id as to_definition_id
     FROM PartialDefDef pdd
     JOIN Definition d1 ON d1.fully_qualified_name = pdd.from_qual_name
     JOIN Definition d2 ON d2.fully_qualified_name = pdd.to_qual_name
     """
-    res = db.cursor.execute(sql)
-    return [DefDef(id=uuid7str(), **row) for row in res.fetchall()]
+    if file_ids is None:
+        res = db.cursor.execute(sql)
+        return [DefDef(**row) for row in res.fetchall()]
+
+    pairs: set[tuple[int, int]] = set()
+    for chunk in chunked(file_ids):
+        placeholders = ", ".join("?" * len(chunk))
+        res = db.cursor.execute(
+            f"{sql} WHERE d1.file_id IN ({placeholders}) OR d2.file_id IN ({placeholders})",
+            (*chunk, *chunk),
+        )
+        pairs.update((row[0], row[1]) for row in res.fetchall())
+    return [DefDef(from_definition_id=f, to_definition_id=t) for f, t in pairs]
+
+
+def link_references(db: DB, file_ids: Optional[Sequence[int]] = None) -> None:
+    """Link references to the definitions with the same fully qualified name.
+
+    If `file_ids` is given, only links where either the definition or the
+    reference lives in one of those files are added.
+    """
+    sql = """
+    INSERT OR IGNORE INTO DefRef (definition_id, reference_id)
+    SELECT d.id, r.id
+    FROM Reference r
+    JOIN Definition d ON d.fully_qualified_name = r.fully_qualified_name
+    """
+    if file_ids is None:
+        db.cursor.execute(sql)
+    else:
+        for chunk in chunked(file_ids):
+            placeholders = ", ".join("?" * len(chunk))
+            db.cursor.execute(
+                f"{sql} WHERE d.file_id IN ({placeholders}) OR r.file_id IN ({placeholders})",
+                (*chunk, *chunk),
+            )
+    db.conn.commit()
+
+
+def delete_files(db: DB, files: Sequence[File]) -> None:
+    """Delete files and every row that was collected from them."""
+    file_ids = [f.id for f in files]
+    definitions: list[Definition] = []
+    reference_ids: list[int] = []
+    for chunk in chunked(file_ids):
+        definitions.extend(db.select(Definition, [("file_id", "IN", chunk)]))
+        reference_ids.extend(
+            r.id for r in db.select(Reference, [("file_id", "IN", chunk)])
+        )
+    definition_ids = [d.id for d in definitions]
+    # PartialDefDefs point `to` the importing file's definitions.
+    fqnames = list({d.fully_qualified_name for d in definitions})
+
+    delete_specs: list[tuple[type, list[tuple[str, str, object]]]] = []
+    for chunk in chunked(reference_ids):
+        delete_specs.append((DefRef, [("reference_id", "IN", chunk)]))
+    for chunk in chunked(definition_ids):
+        delete_specs.append((DefRef, [("definition_id", "IN", chunk)]))
+        delete_specs.append((DefDef, [("from_definition_id", "IN", chunk)]))
+        delete_specs.append((DefDef, [("to_definition_id", "IN", chunk)]))
+    for chunk in chunked(fqnames):
+        delete_specs.append((PartialDefDef, [("to_qual_name", "IN", chunk)]))
+    for chunk in chunked(file_ids):
+        delete_specs.append((Reference, [("file_id", "IN", chunk)]))
+        delete_specs.append((Definition, [("file_id", "IN", chunk)]))
+        delete_specs.append((File, [("id", "IN", chunk)]))
+    if delete_specs:
+        db.bulk_delete(delete_specs)
+
+
+def touch_files(db: DB, files: Sequence[File]) -> None:
+    """Record a new mtime for files whose content did not change."""
+    db.cursor.executemany(
+        "UPDATE File SET mtime_ns = ? WHERE id = ?",
+        [(f.mtime_ns, f.id) for f in files],
+    )
+    db.conn.commit()
+
+
+def count_all_references(db: DB) -> list[ReferenceCount]:
+    """Count the external references of every fully qualified name.
+
+    A definition's references include the references to every definition that
+    (transitively) re-exports it. References in the file of the original
+    definition don't count. See `Index.count_references`.
+    """
+    # Definition -> definitions that import it.
+    reexports: defaultdict[int, list[int]] = defaultdict(list)
+    for from_id, to_id in db.cursor.execute(
+        "SELECT from_definition_id, to_definition_id FROM DefDef"
+    ):
+        reexports[from_id].append(to_id)
+
+    # Definition -> (reference, file of the reference)
+    references: defaultdict[int, list[tuple[int, int]]] = defaultdict(list)
+    for definition_id, reference_id, file_id in db.cursor.execute(
+        """
+        SELECT dr.definition_id, r.id, r.file_id
+        FROM DefRef dr
+        JOIN Reference r ON r.id = dr.reference_id
+        """
+    ):
+        references[definition_id].append((reference_id, file_id))
+
+    external: defaultdict[str, set[int]] = defaultdict(set)
+    for definition_id, fqname, file_id in db.cursor.execute(
+        "SELECT id, fully_qualified_name, file_id FROM Definition"
+    ).fetchall():
+        counted = external[fqname]
+        # Walk the re-export chain. Guard against import cycles.
+        seen = {definition_id}
+        stack = [definition_id]
+        while stack:
+            current = stack.pop()
+            for reference_id, reference_file_id in references.get(current, ()):
+                if reference_file_id != file_id:
+                    counted.add(reference_id)
+            for reexport in reexports.get(current, ()):
+                if reexport not in seen:
+                    seen.add(reexport)
+                    stack.append(reexport)
+
+    return [
+        ReferenceCount(fully_qualified_name=fqname, external_count=len(ids))
+        for fqname, ids in external.items()
+    ]
 
 
 def get_definitions(db: DB, fqname: str) -> list[Definition]:
     sql = """
     SELECT *
-    FROM Definition 
+    FROM Definition
     WHERE fully_qualified_name = ?
     """
     res = db.cursor.execute(sql, (fqname,))
@@ -36,3 +184,8 @@ def get_all_definitions(db: DB) -> list[Definition]:
     """
     res = db.cursor.execute(sql)
     return [Definition(**row) for row in res.fetchall()]
+
+
+def chunked(items: Sequence[T]) -> Iterator[Sequence[T]]:
+    for i in range(0, len(items), CHUNK_SIZE):
+        yield items[i : i + CHUNK_SIZE]
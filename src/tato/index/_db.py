@@ -3,13 +3,39 @@ import sqlite3
 from pathlib import Path
 from typing import Any, List, Optional, Sequence, Tuple, Union
 
-from tato.index._types import DefDef, Definition, DefRef, File, PartialDefDef, Reference
+from tato.index._types import (
+    DefDef,
+    Definition,
+    DefRef,
+    File,
+    PartialDefDef,
+    Reference,
+    ReferenceCount,
+)
+
+# Must match the `user_version` set in db-schema.sql.
+SCHEMA_VERSION = 4
+
+# Read-only connections map up to this many bytes of the index into memory.
+MMAP_SIZE = 256 * 1024 * 1024
+
+# Prepared statements kept per connection.
+CACHED_STATEMENTS = 256
 
 
 class DB:
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, read_only: bool = False):
         self.path = Path(path)
-        self.conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+        if read_only:
+            self.conn = sqlite3.connect(
+                f"{self.path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                cached_statements=CACHED_STATEMENTS,
+            )
+            self.conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        else:
+            self.conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
         self.conn.row_factory = sqlite3.Row
         self.cursor = self.conn.cursor()
 
@@ -19,16 +45,28 @@ class DB:
         self.cursor.execute("PRAGMA journal_mode=WAL;")
         self.conn.commit()
 
+    def schema_version(self) -> int:
+        return self.cursor.execute("PRAGMA user_version").fetchone()[0]
+
     def bulk_insert(
         self,
         objects: Sequence[
-            Union[File, Definition, Reference, DefRef, DefDef, PartialDefDef]
+            Union[
+                File,
+                Definition,
+                Reference,
+                DefRef,
+                DefDef,
+                PartialDefDef,
+                ReferenceCount,
+            ]
         ],
+        batch_size: int = 5000,
+        verbose: bool = True,
     ) -> None:
         # Disable foreign key constraints
         self.cursor.execute("PRAGMA foreign_keys = OFF")
 
-        batch_size = 5000
         total_inserted = 0
 
         try:
@@ -50,21 +88,23 @@ class DB:
                     if not group:
                         continue
 
-                    data = [dataclasses.asdict(obj) for obj in group]
-                    columns = ", ".join(data[0].keys())
-                    placeholders = ", ".join("?" * len(data[0]))
+                    fields = [f.name for f in dataclasses.fields(group[0])]
+                    columns = ", ".join(fields)
+                    placeholders = ", ".join("?" * len(fields))
                     query = (
                         f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
                     )
 
                     self.cursor.executemany(
-                        query, [tuple(item.values()) for item in data]
+                        query,
+                        [tuple(getattr(obj, f) for f in fields) for obj in group],
                     )
 
                 # Commit each batch
                 self.conn.commit()
                 total_inserted += len(batch)
-                print(f"Inserted {total_inserted} objects")
+                if verbose:
+                    print(f"Inserted {total_inserted} objects")
 
         except Exception as e:
             self.conn.rollback()
@@ -85,11 +125,9 @@ class DB:
             for cls, conditions in delete_specs:
                 table_name = cls.__name__
                 if conditions:
-                    where_clause = " AND ".join(
-                        [f"{cond[0]} {cond[1]} ?" for cond in conditions]
-                    )
+                    where_clause, params = _where(conditions)
                     query = f"DELETE FROM {table_name} WHERE {where_clause}"
-                    self.cursor.execute(query, tuple(cond[2] for cond in conditions))
+                    self.cursor.execute(query, params)
                 else:
                     # If no conditions are provided, delete all records from the table
                     query = f"DELETE FROM {table_name}"
@@ -111,13 +149,9 @@ class DB:
         table_name = cls.__name__
         query = f"SELECT * FROM {table_name}"
         if conditions:
-            where_clause = " AND ".join(
-                [f"{cond[0]} {cond[1]} ?" for cond in conditions]
-            )
+            where_clause, params = _where(conditions)
             query += f" WHERE {where_clause}"
-
-        if conditions:
-            self.cursor.execute(query, tuple(cond[2] for cond in conditions))
+            self.cursor.execute(query, params)
         else:
             self.cursor.execute(query)
 
@@ -129,3 +163,17 @@ class DB:
 
     def close(self):
         self.conn.close()
+
+
+def _where(conditions: List[Tuple[str, str, Any]]) -> Tuple[str, Tuple[Any, ...]]:
+    """Build a WHERE clause. The `IN` operator expects a sequence of values."""
+    clauses = []
+    params: List[Any] = []
+    for column, op, value in conditions:
+        if op.upper() == "IN":
+            clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            clauses.append(f"{column} {op} ?")
+            params.append(value)
+    return " AND ".join(clauses), tuple(params)
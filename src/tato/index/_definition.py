@@ -1,9 +1,6 @@
-import os
-from typing import Mapping
-
 import libcst as cst
-from libcst.codemod import ContextAwareTransformer
 from libcst.helpers import (
+    ModuleNameAndPackage,
     get_absolute_module_for_import_or_raise,
     get_full_name_for_node_or_raise,
 )
@@ -12,37 +9,75 @@ from libcst.metadata import (
     CodeRange,
     FullyQualifiedNameProvider,
     GlobalScope,
+    MetadataWrapper,
     PositionProvider,
     ScopeProvider,
 )
 
-from tato.index._db import DB
-from tato.index._types import Definition, DefRef, File, PartialDefDef, Reference
-from tato.lib.uuid import uuid7str
+from tato.index._ids import row_ids
+from tato.index._types import Definition, File, PartialDefDef, Reference
+
+
+def collect_rows(source: bytes, f: File, package: str) -> list:
+    """The definitions, partial defdefs and references of a file.
+
+    `package` is the name of the indexed package.
+    """
+    # The name of the module is all `FullyQualifiedNameProvider` needs, so no
+    # `FullRepoManager` is built.
+    wrapper = MetadataWrapper(
+        cst.parse_module(source),
+        unsafe_skip_copy=True,
+        cache={FullyQualifiedNameProvider: ModuleNameAndPackage(f.module, f.package)},
+    )
+    collector = IndexCollector(f, package)
+    wrapper.visit(collector)
+    return collector.rows
+
+
+def is_global_name(fqname: str, package_prefix: str) -> bool:
+    """Whether `fqname` may be defined in the global scope of a module.
+
+    Only those can be linked to a definition. Names local to a function, a
+    lambda or a comprehension (e.g. `pkg.f.<locals>.x`) are not stored.
+    """
+    return fqname.startswith(package_prefix) and "<" not in fqname
+
+
+class IndexCollector(cst.CSTVisitor):
+    """Collect definitions and references of a file in a single pass.
 
+    Definitions are the assignments in the global scope. References are all
+    names/attributes whose fully qualified name is inside the indexed
+    `package` and not local (see `is_global_name`). References are linked to
+    their definitions afterwards, once every file has been collected (see
+    `link_references`).
+    """
 
-class DefinitionCollector(ContextAwareTransformer):
     METADATA_DEPENDENCIES = (
         ScopeProvider,
         PositionProvider,
         FullyQualifiedNameProvider,
     )
 
-    def __init__(self, *args, files: Mapping[str, File], **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self.files = files
+    def __init__(self, f: File, package: str) -> None:
+        super().__init__()
+        self.file = f
+        self.package_prefix = f"{package}."
+        self.definitions: list[Definition] = []
+        self.partial_defdefs: set[PartialDefDef] = set()
+        self.references: list[Reference] = []
+        self.ids = row_ids(f.id)
 
-    def visit_Module(self, node: cst.Module) -> bool:
-        db = DB(self.context.scratch["index_path"])
-        assert self.context.filename is not None
-        assert self.context.metadata_manager is not None
-        filepath = os.path.relpath(
-            self.context.filename, self.context.metadata_manager.root_path
-        )
-        f = self.files[filepath]
+    @property
+    def rows(self) -> list:
+        return [*self.definitions, *self.partial_defdefs, *self.references]
 
-        definitions: list[Definition] = []
-        partial_defdefs: set[PartialDefDef] = set()
+    def visit_Module(self, node: cst.Module) -> bool:
+        f = self.file
+        ids = self.ids
+        definitions = self.definitions
+        partial_defdefs = self.partial_defdefs
 
         global_scope = self.get_metadata(ScopeProvider, node)
         global_scope = cst.ensure_type(global_scope, GlobalScope)
@@ -57,7 +92,7 @@ class DefinitionCollector(ContextAwareTransformer):
             if fqns:
                 [fqn] = fqns
                 d = Definition(
-                    id=uuid7str(),
+                    id=next(ids),
                     file_id=f.id,
                     fully_qualified_name=fqn.name,
                     start_line=position.start.line,
@@ -68,16 +103,24 @@ class DefinitionCollector(ContextAwareTransformer):
                 if isinstance(assignment.node.names, cst.ImportStar):
                     # Skip import star references for now.
                     continue
+                try:
+                    module = get_absolute_module_for_import_or_raise(
+                        f.module, assignment.node
+                    )
+                except Exception:
+                    # e.g. `from . import a` in an `__init__.py`. Only this
+                    # import is left out, the rest of the file is collected.
+                    continue
                 for name in assignment.node.names:
                     d = Definition(
-                        id=uuid7str(),
+                        id=next(ids),
                         file_id=f.id,
                         fully_qualified_name=f"{f.module}.{get_full_name_for_node_or_raise(name.name)}",
                         start_line=position.start.line,
                         start_col=position.start.column,
                     )
                     pd = PartialDefDef(
-                        from_qual_name=f"{get_absolute_module_for_import_or_raise(f.module, assignment.node)}.{get_full_name_for_node_or_raise(name.name)}",
+                        from_qual_name=f"{module}.{get_full_name_for_node_or_raise(name.name)}",
                         to_qual_name=d.fully_qualified_name,
                     )
                     definitions.append(d)
@@ -85,88 +128,29 @@ class DefinitionCollector(ContextAwareTransformer):
             elif isinstance(assignment.node, cst.Import):
                 # TODO:
                 pass
-
-        db.bulk_insert(definitions)
-        db.bulk_insert(list((partial_defdefs)))
-
-        # I'm not sure why we need to reset these values. It's as if the same
-        # instance is being used for multiple files...
-        self.definitions = []
-        self.defrefs = []
-
-        return False
-
-
-class ReferenceCollector(ContextAwareTransformer):
-    METADATA_DEPENDENCIES = (
-        ScopeProvider,
-        PositionProvider,
-        FullyQualifiedNameProvider,
-    )
-
-    def __init__(
-        self,
-        *args,
-        files: Mapping[str, File],
-        definitions: Mapping[str, list[Definition]],
-        **kwargs,
-    ) -> None:
-        super().__init__(*args, **kwargs)
-        self.references: list[Reference] = []
-        self.defrefs: list[DefRef] = []
-        self.files = files
-        self.definitions = definitions
+        return True
 
     def visit_Attribute(self, node: cst.Attribute) -> bool:
-        return self._visit_name_attr_alike(node)
+        self._visit_name_attr_alike(node)
+        return True
 
     def visit_Name(self, node: cst.Name) -> bool:
-        return self._visit_name_attr_alike(node)
+        self._visit_name_attr_alike(node)
+        return True
 
-    def _visit_name_attr_alike(self, node: cst.CSTNode) -> bool:
-        assert self.context.filename is not None
-        assert self.context.metadata_manager is not None
-        filepath = os.path.relpath(
-            self.context.filename, self.context.metadata_manager.root_path
-        )
-        f = self.files[filepath]
-
-        found = False
+    def _visit_name_attr_alike(self, node: cst.CSTNode) -> None:
         fqnames = self.get_metadata(FullyQualifiedNameProvider, node, set())
-
         for fqname in fqnames:
-            if defs := self.definitions.get(fqname.name):
-                found = True
-                position = cst.ensure_type(
-                    self.get_metadata(PositionProvider, node), CodeRange
-                )
-                r = Reference(
-                    id=uuid7str(),
-                    file_id=f.id,
-                    fully_qualified_name=fqname.name,
-                    start_line=position.start.line,
-                    start_col=position.start.column,
-                )
-                self.references.append(r)
-                for d in defs:
-                    dr = DefRef(
-                        id=uuid7str(),
-                        definition_id=d.id,
-                        reference_id=r.id,
-                    )
-                    self.defrefs.append(dr)
-
-        # Optimization tos top recursing on children if we've found the reference.
-        return not found
-
-    def leave_Module(
-        self, original_node: cst.Module, updated_node: cst.Module
-    ) -> cst.Module:
-        db = DB(self.context.scratch["index_path"])
-        db.bulk_insert(self.references)
-        db.bulk_insert(self.defrefs)
-        # I'm not sure why we need to reset these values. It's as if the same
-        # instance is being used for multiple files...
-        self.references = []
-        self.defrefs = []
-        return updated_node
+            if not is_global_name(fqname.name, self.package_prefix):
+                continue
+            position = cst.ensure_type(
+                self.get_metadata(PositionProvider, node), CodeRange
+            )
+            r = Reference(
+                id=next(self.ids),
+                file_id=self.file.id,
+                fully_qualified_name=fqname.name,
+                start_line=position.start.line,
+                start_col=position.start.column,
+            )
+            self.references.append(r)
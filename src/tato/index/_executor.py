@@ -0,0 +1,132 @@
+"""Collect the rows of the files to index, in worker processes.
+
+Collectors only read files. Unlike `parallel_exec_transform_with_prettyprint`,
+no code is generated or diffed and nothing is printed per file. Rows stream
+back to the parent as each chunk of files is collected.
+"""
+
+import dataclasses
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator, Optional, Sequence
+
+from tato import _memory, _pool
+from tato.index import _definition
+from tato.index._types import File
+
+# Seconds between two progress reports.
+PROGRESS_INTERVAL = 1.0
+
+
+@dataclasses.dataclass(frozen=True)
+class CollectConfig:
+    # Directory that contains the indexed package.
+    root_path: str
+    # Name of the indexed package. Only references into it are collected.
+    package: str
+    # Collect with `ast` rather than libcst, see `tato.index._ast_definition`.
+    ast_analysis: bool = True
+    # Measure the peak memory of each file, see `tato._memory`.
+    profile_memory: bool = False
+
+
+@dataclasses.dataclass(frozen=True)
+class FileResult:
+    path: str
+    # Definitions, partial defdefs and references. Empty on failure.
+    rows: Sequence = ()
+    # The traceback of a failure.
+    error: str = ""
+    # See `CollectConfig.profile_memory`.
+    memory: Optional[_memory.FileMemory] = None
+
+
+@dataclasses.dataclass
+class CollectSummary:
+    successes: int = 0
+    failures: int = 0
+    rows: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.successes + self.failures
+
+
+def execute(
+    files: Sequence[File],
+    config: CollectConfig,
+    rows: Any,
+    jobs: Optional[int] = None,
+) -> CollectSummary:
+    """Put the rows of each of `files` on `rows`, the queue of an `IndexWriter`.
+
+    Failures are printed as they come, progress every `PROGRESS_INTERVAL`.
+    """
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(files)))
+    summary = CollectSummary()
+    reported = time.monotonic()
+    for result in _results(files, config, jobs):
+        if result.error:
+            print(f"{result.error}\nFailed to index {result.path}\n", file=sys.stderr)
+            summary.failures += 1
+        else:
+            summary.successes += 1
+        if result.rows:
+            rows.put(result.rows)
+            summary.rows += len(result.rows)
+        if result.memory is not None:
+            rows.put(result.memory)
+        if time.monotonic() - reported >= PROGRESS_INTERVAL:
+            _print_progress(summary, len(files))
+            reported = time.monotonic()
+    _print_progress(summary, len(files))
+    return summary
+
+
+def collect_file(f: File, config: CollectConfig) -> FileResult:
+    """Collect the rows of a single file."""
+    if config.profile_memory:
+        _memory.reset_file_peak()
+    try:
+        source = Path(config.root_path, f.path).read_bytes()
+        if config.ast_analysis:
+            # `tato._ast_analysis` imports `tato.index.index`, which imports
+            # this module.
+            from tato.index._ast_definition import collect_rows
+        else:
+            collect_rows = _definition.collect_rows
+        result = FileResult(f.path, rows=collect_rows(source, f, config.package))
+    except Exception:
+        result = FileResult(f.path, error=traceback.format_exc())
+    if config.profile_memory:
+        result = dataclasses.replace(result, memory=_memory.file_memory(f.path))
+    return result
+
+
+def _collect_files(files: Sequence[File], config: CollectConfig) -> list[FileResult]:
+    return [collect_file(f, config) for f in files]
+
+
+def _results(
+    files: Sequence[File], config: CollectConfig, jobs: int
+) -> Iterator[FileResult]:
+    if _pool.is_serial(len(files), jobs):
+        for f in files:
+            yield collect_file(f, config)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from _pool.map_chunks(pool, _collect_files, files, jobs, config)
+
+
+def _print_progress(summary: CollectSummary, num_files: int) -> None:
+    failed = f", {summary.failures} failed" if summary.failures else ""
+    print(
+        f"Indexed {summary.total}/{num_files} files "
+        f"({summary.rows} rows{failed})",
+        file=sys.stderr,
+    )
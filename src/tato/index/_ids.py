@@ -0,0 +1,17 @@
+import itertools
+from typing import Iterator
+
+# Rows collected from a file get ids from the file's own range. Workers can
+# allocate ids without coordinating with each other or with the database, and
+# the ids are deterministic for a given file id.
+ROWS_PER_FILE_BITS = 24
+
+
+def row_ids(file_id: int) -> Iterator[int]:
+    """Yield the ids for rows (definitions, references) collected from a file."""
+    start = file_id << ROWS_PER_FILE_BITS
+    return iter(range(start, start + (1 << ROWS_PER_FILE_BITS)))
+
+
+def file_ids(start: int = 1) -> Iterator[int]:
+    return itertools.count(start)
@@ -3,8 +3,8 @@ import dataclasses
 
 @dataclasses.dataclass(frozen=True)
 class Definition:
-    id: str
-    file_id: str
+    id: int
+    file_id: int
     fully_qualified_name: str
     start_line: int
     start_col: int
@@ -12,8 +12,8 @@ class Definition:
 
 @dataclasses.dataclass(frozen=True)
 class Reference:
-    id: str
-    file_id: str
+    id: int
+    file_id: int
     fully_qualified_name: str
     start_line: int
     start_col: int
@@ -21,29 +21,38 @@ class Reference:
 
 @dataclasses.dataclass(frozen=True)
 class DefRef:
-    id: str
-    definition_id: str
-    reference_id: str
+    definition_id: int
+    reference_id: int
 
 
 @dataclasses.dataclass(frozen=True)
 class File:
-    id: str
+    id: int
     path: str
     module: str
     package: str
+    # Content hash and modification time, used to detect changes when
+    # updating an existing index.
+    hash: str
+    mtime_ns: int
 
     # Prefer using filecache to create this object.
 
 
 @dataclasses.dataclass(frozen=True)
 class DefDef:
-    id: str
-    from_definition_id: str
-    to_definition_id: str
+    from_definition_id: int
+    to_definition_id: int
 
 
 @dataclasses.dataclass(frozen=True)
 class PartialDefDef:
     from_qual_name: str
     to_qual_name: str
+
+
+@dataclasses.dataclass(frozen=True)
+class ReferenceCount:
+    fully_qualified_name: str
+    # Number of external references, see `Index.count_references`.
+    external_count: int
@@ -0,0 +1,84 @@
+import queue
+import threading
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Optional, Sequence
+
+from tato import _memory
+from tato.index._db import DB
+
+# Rows are committed once this many are pending.
+BATCH_SIZE = 50_000
+# Maximum number of per-file row lists waiting to be written. Collection
+# blocks when the writer falls behind.
+MAX_PENDING = 64
+
+
+class IndexWriter:
+    """Single writer for the rows collected by worker processes.
+
+    The parent process `put`s a list of rows per file on `queue` (and, when
+    profiling memory, a `FileMemory` per file) as workers return them. A
+    thread is the only connection writing to the index, so rows are written
+    while files are still collected, in large transactions.
+
+    Usage:
+        with IndexWriter(index_path) as writer:
+            ...  # Put rows on `writer.queue`.
+    """
+
+    def __init__(
+        self,
+        index_path: Path,
+        batch_size: int = BATCH_SIZE,
+        max_pending: int = MAX_PENDING,
+    ) -> None:
+        self.index_path = index_path
+        self.batch_size = batch_size
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_pending)
+        self.total = 0
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "IndexWriter":
+        self._thread.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        self.queue.put(None)
+        self._thread.join()
+        if self._error is not None and exc is None:
+            raise self._error
+        print(f"Inserted {self.total} objects")
+
+    def _run(self) -> None:
+        db = DB(self.index_path)
+        db.cursor.execute("PRAGMA synchronous = NORMAL")
+        pending: list = []
+        while (rows := self.queue.get()) is not None:
+            if isinstance(rows, _memory.FileMemory):
+                _memory.add_file(rows)
+                continue
+            if self._error is not None:
+                # Keep draining, so collection never blocks on a full queue.
+                continue
+            pending.extend(rows)
+            if len(pending) >= self.batch_size:
+                pending = self._write(db, pending)
+        self._write(db, pending)
+        db.close()
+
+    def _write(self, db: DB, rows: Sequence) -> list:
+        """Write `rows` in a single transaction. Returns the new pending list."""
+        if self._error is None and rows:
+            try:
+                db.bulk_insert(rows, batch_size=len(rows), verbose=False)
+                self.total += len(rows)
+            except Exception as e:
+                self._error = e
+        return []
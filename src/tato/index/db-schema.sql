@@ -1,14 +1,16 @@
 -- Existing tables (unchanged)
 CREATE TABLE File (
-    id TEXT PRIMARY KEY,
+    id INTEGER PRIMARY KEY,
     path TEXT NOT NULL,
     module TEXT NOT NULL,
-    package TEXT NOT NULL
+    package TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL
 );
 
 CREATE TABLE Definition (
-    id TEXT PRIMARY KEY,
-    file_id TEXT NOT NULL,
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
     fully_qualified_name TEXT NOT NULL,
     start_line INTEGER NOT NULL,
     start_col INTEGER NOT NULL,
@@ -16,8 +18,8 @@ CREATE TABLE Definition (
 );
 
 CREATE TABLE Reference (
-    id TEXT PRIMARY KEY,
-    file_id TEXT NOT NULL,
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL,
     fully_qualified_name TEXT NOT NULL,
     start_line INTEGER NOT NULL,
     start_col INTEGER NOT NULL,
@@ -25,21 +27,21 @@ CREATE TABLE Reference (
 );
 
 CREATE TABLE DefRef (
-    id TEXT PRIMARY KEY,
-    definition_id TEXT NOT NULL,
-    reference_id TEXT NOT NULL,
+    definition_id INTEGER NOT NULL,
+    reference_id INTEGER NOT NULL,
+    PRIMARY KEY (definition_id, reference_id),
     FOREIGN KEY (definition_id) REFERENCES Definition(id),
     FOREIGN KEY (reference_id) REFERENCES Reference(id)
-);
+) WITHOUT ROWID;
 
 -- New table for linking definitions
 CREATE TABLE DefDef (
-    id TEXT PRIMARY KEY,
-    from_definition_id TEXT NOT NULL,
-    to_definition_id TEXT NOT NULL,
+    from_definition_id INTEGER NOT NULL,
+    to_definition_id INTEGER NOT NULL,
+    PRIMARY KEY (from_definition_id, to_definition_id),
     FOREIGN KEY (from_definition_id) REFERENCES Definition(id),
     FOREIGN KEY (to_definition_id) REFERENCES Definition(id)
-);
+) WITHOUT ROWID;
 
 CREATE TABLE PartialDefDef (
     from_qual_name TEXT NOT NULL,
@@ -47,6 +49,18 @@ CREATE TABLE PartialDefDef (
     PRIMARY KEY (from_qual_name, to_qual_name)
 );
 
+-- External reference counts, materialized after all other tables are built.
+CREATE TABLE ReferenceCount (
+    fully_qualified_name TEXT PRIMARY KEY,
+    external_count INTEGER NOT NULL
+) WITHOUT ROWID;
+
+-- Key/value metadata about the index, e.g. its `generation`.
+CREATE TABLE Meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+
 
 -- Indexes for better query performance
 CREATE INDEX idx_file_path ON File(path);
@@ -54,7 +68,8 @@ CREATE INDEX idx_definition_file_id ON Definition(file_id);
 CREATE INDEX idx_definition_fqn ON Definition(fully_qualified_name);
 CREATE INDEX idx_reference_file_id ON Reference(file_id);
 CREATE INDEX idx_reference_fqn ON Reference(fully_qualified_name);
-CREATE INDEX idx_defref_definition_id ON DefRef(definition_id);
 CREATE INDEX idx_defref_reference_id ON DefRef(reference_id);
-CREATE INDEX idx_defdef_from ON DefDef(from_definition_id);
-CREATE INDEX idx_defdef_to ON DefDef(to_definition_id);
\ No newline at end of file
+CREATE INDEX idx_defdef_to ON DefDef(to_definition_id);
+
+-- Bump `SCHEMA_VERSION` in _db.py when changing this file.
+PRAGMA user_version = 4;
@@ -1,24 +1,56 @@
+import os
+import threading
+import uuid
 from pathlib import Path
-from typing import MutableMapping
-
-from libcst.codemod import CodemodContext, parallel_exec_transform_with_prettyprint
-from libcst.metadata import FullRepoManager
+from typing import Iterable, Optional
 
+from tato import _memory
 from tato._debug import measure_time
-from tato.index._collector import collect_files
-from tato.index._controller import find_defdef, get_all_definitions
-from tato.index._db import DB
-from tato.index._definition import DefinitionCollector, ReferenceCollector
-from tato.index._types import Definition
+from tato.index._collector import collect_files, diff_files
+from tato.index._controller import (
+    chunked,
+    count_all_references,
+    delete_files,
+    find_defdef,
+    get_all_files,
+    link_references,
+    touch_files,
+)
+from tato.index._db import DB, SCHEMA_VERSION
+from tato.index._executor import CollectConfig, execute
+from tato.index._types import File, ReferenceCount
+from tato.index._writer import IndexWriter
+
+# Indexes opened by `shared_index`, per thread.
+_shared = threading.local()
+_inherited: list[dict] = []
 
 
 class Index:
     index_path: Path
 
-    def __init__(self, index_path: Path):
+    def __init__(
+        self, index_path: Path, read_only: bool = False, ast_analysis: bool = True
+    ):
         self.index_path = index_path
-        self.db = DB(index_path)
+        # Collect definitions and references with `ast` rather than libcst.
+        # Both find the same rows, see `tato.index._ast_definition`.
+        self.ast_analysis = ast_analysis
+        self.db = DB(index_path, read_only)
         self._has_index = self.db.path.exists() and self.db.path.stat().st_size > 0
+        self._is_outdated = (
+            self._has_index and self.db.schema_version() != SCHEMA_VERSION
+        )
+
+    @property
+    def generation(self) -> str:
+        """Changes every time the content of the index changes."""
+        if not self._has_index or self._is_outdated:
+            return ""
+        row = self.db.cursor.execute(
+            "SELECT value FROM Meta WHERE key = 'generation'"
+        ).fetchone()
+        return row[0] if row else ""
 
     def count_references(self, fully_qualified_name: str) -> int:
         """Counts all external references for a fully_qualified_name.
@@ -29,82 +61,179 @@ class Index:
             Imports do NOT count as references.
             References in the same file as the original definition do NOT count as external references.
         """
+        return self.count_references_many([fully_qualified_name])[fully_qualified_name]
+
+    def count_references_many(
+        self, fully_qualified_names: Iterable[str]
+    ) -> dict[str, int]:
+        """Counts all external references for many fully_qualified_names.
+
+        Same as `count_references`, but looks up a whole module's names in a
+        single query (per chunk of names). Counts are computed when the index
+        is built, see `count_all_references`.
+        """
+        counts = dict.fromkeys(fully_qualified_names, 0)
         if not self._has_index:
-            return 0
-        res = self.db.cursor.execute(
-            """
-            WITH RECURSIVE all_definitions(id, original_file_id) AS (
-                -- Start with the original definition
-                SELECT id, file_id FROM Definition WHERE Definition.fully_qualified_name = ?
-                
-                UNION ALL
-                
-                -- Recursively add all definitions that import this definition
-                SELECT dd.to_definition_id, ad.original_file_id
-                FROM DefDef dd
-                JOIN all_definitions ad ON dd.from_definition_id = ad.id
+            return counts
+        if self._is_outdated:
+            raise ValueError(
+                f"{self.index_path} was created by another version of tato. "
+                "Re-create it with `tato index`."
             )
-            SELECT COUNT(DISTINCT r.id) as reference_count
-            FROM all_definitions ad
-            JOIN DefRef dr ON dr.definition_id = ad.id
-            JOIN Reference r ON r.id = dr.reference_id
-            WHERE r.file_id != ad.original_file_id;
-            """,
-            (fully_qualified_name,),
-        )
-        return res.fetchone()[0]
+        for chunk in chunked(list(counts)):
+            # Pad to a power of two, so few distinct statements hit the cache.
+            size = 1 << (len(chunk) - 1).bit_length()
+            padded = [*chunk, *[chunk[-1]] * (size - len(chunk))]
+            res = self.db.cursor.execute(
+                f"""
+                SELECT fully_qualified_name, external_count
+                FROM ReferenceCount
+                WHERE fully_qualified_name IN ({", ".join("?" * size)})
+                """,
+                padded,
+            )
+            counts.update(res.fetchall())
+        return counts
 
-    def create(self) -> None:
+    def create(self, jobs: Optional[int] = None) -> None:
         with measure_time("Creating index..."):
             self.db.init_schema()
 
         package = self.index_path.parent
-        manager = FullRepoManager(
-            str(package.parent),
-            paths=[str(p) for p in package.rglob("*.py")],
-            providers=(
-                set(DefinitionCollector.get_inherited_dependencies())
-                | set(ReferenceCollector.get_inherited_dependencies())
-            ),
-        )
-        context = CodemodContext(metadata_manager=manager)
-        context.scratch["index_path"] = self.index_path
-
-        files = collect_files(manager, package)
-        self.db.bulk_insert(files)
+        with _memory.phase("discovery"):
+            files = collect_files(package.parent, package)
+        with _memory.phase("insert files"):
+            self.db.bulk_insert(files)
+        self._index_files(files, incremental=False, jobs=jobs)
+        self._count_references()
+
+    def update(self, jobs: Optional[int] = None) -> None:
+        """Update the index, only re-indexing new, changed or deleted files.
+
+        Rows collected from changed or deleted files are dropped, then those
+        files are collected again. Links between the re-collected definitions
+        and the rest of the index are re-resolved.
+        """
+        if not self._has_index or self._is_outdated:
+            self.db.close()
+            self.index_path.unlink(missing_ok=True)
+            self.db = DB(self.index_path)
+            self._is_outdated = False
+            self.create(jobs)
+            return
 
-        filemap = {f.path: f for f in files}
+        package = self.index_path.parent
+        with _memory.phase("discovery"):
+            indexed = {f.path: f for f in get_all_files(self.db)}
+            changes = diff_files(package.parent, package, indexed)
+            touch_files(self.db, changes.touched)
+        if not changes.added and not changes.removed:
+            print("Index is up to date.")
+            return
+
+        with _memory.phase("insert files"):
+            delete_files(self.db, changes.removed)
+            self.db.bulk_insert(changes.added)
+        self._index_files(changes.added, incremental=True, jobs=jobs)
+        self._count_references()
+
+    def _index_files(
+        self, files: list[File], incremental: bool, jobs: Optional[int]
+    ) -> None:
+        """Collect definitions and references from `files`, then link them.
+
+        When `incremental`, only links that involve `files` are resolved.
+        `jobs` is the number of worker processes (defaults to the CPU count).
+        """
+        if not files:
+            return
 
-        transform = DefinitionCollector(context, files=filemap)
-        parallel_exec_transform_with_prettyprint(
-            transform, manager._paths, repo_root=str(manager.root_path)
+        package = self.index_path.parent
+        config = CollectConfig(
+            root_path=str(package.parent),
+            package=package.resolve().name,
+            ast_analysis=self.ast_analysis,
+            profile_memory=_memory.is_profiling(),
         )
+        # Rows are written to the index while files are collected.
+        with _memory.phase("collect and write"), IndexWriter(
+            self.index_path
+        ) as writer:
+            execute(files, config, writer.queue, jobs)
+
+        file_ids = [f.id for f in files] if incremental else None
+        with measure_time("Linking definitions and references..."):
+            with _memory.phase("find_defdef"):
+                self.db.bulk_insert(find_defdef(self.db, file_ids))
+            with _memory.phase("link_references"):
+                link_references(self.db, file_ids)
+
+    def _count_references(self) -> None:
+        """Materialize the external reference count of every definition."""
+        with measure_time("Counting references..."), _memory.phase(
+            "count_references"
+        ):
+            counts = count_all_references(self.db)
+            self.db.bulk_delete([(ReferenceCount, [])])
+            self.db.bulk_insert(counts)
+        self.db.cursor.execute(
+            "INSERT OR REPLACE INTO Meta (key, value) VALUES ('generation', ?)",
+            (uuid.uuid4().hex,),
+        )
+        self.db.conn.commit()
+        self._has_index = True
 
-        definitions = get_all_definitions(self.db)
-        defmap: MutableMapping[str, list[Definition]] = {}
-        for d in definitions:
-            if d not in defmap:
-                defmap[d.fully_qualified_name] = [d]
-            else:
-                defmap[d.fully_qualified_name].append(d)
-
-        defdefs = find_defdef(self.db)
-        self.db.bulk_insert(defdefs)
 
-        transform = ReferenceCollector(context, files=filemap, definitions=defmap)
-        parallel_exec_transform_with_prettyprint(
-            transform, manager._paths, repo_root=str(manager.root_path)
+def shared_index(index_path: Path) -> Index:
+    """Return a read-only `Index`, opened once per process and thread.
+
+    Connections are never shared with forked processes, which open their own.
+    An index that was re-created since it was opened is opened again.
+    Returns a `NoopIndex` if there is no index at `index_path`.
+    """
+    if getattr(_shared, "pid", None) != os.getpid():
+        # Never close connections inherited from the parent process: SQLite
+        # connections must not be used (or closed) across a fork.
+        _inherited.append(getattr(_shared, "indexes", {}))
+        _shared.pid = os.getpid()
+        _shared.indexes = {}
+    key = Path(index_path).resolve()
+    try:
+        stat = key.stat()
+        file_id = (stat.st_dev, stat.st_ino)
+    except FileNotFoundError:
+        file_id = None
+    opened = _shared.indexes.get(key)
+    if opened is None or opened[0] != file_id:
+        if opened is not None and not isinstance(opened[1], NoopIndex):
+            opened[1].db.close()
+        index = (
+            Index(index_path, read_only=True)
+            if file_id is not None
+            else NoopIndex(index_path.parent)
         )
-
-        self._has_index = True
+        opened = _shared.indexes[key] = (file_id, index)
+    return opened[1]
 
 
 class NoopIndex(Index):
     def __init__(self, package: Path):
         self.index_path = package
 
+    @property
+    def generation(self) -> str:
+        return ""
+
     def count_references(self, fully_qualified_name: str) -> int:
         return 0
 
+    def count_references_many(
+        self, fully_qualified_names: Iterable[str]
+    ) -> dict[str, int]:
+        return dict.fromkeys(fully_qualified_names, 0)
+
     def create(self, package: Path) -> None:
         return
+
+    def update(self, jobs: Optional[int] = None) -> None:
+        return
@@ -1,20 +1,17 @@
 import argparse
 import os
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
 import libcst as cst
 from libcst import codemod
-from libcst.metadata import (
-    FullyQualifiedNameProvider,
-    ParentNodeProvider,
-    PositionProvider,
-    ScopeProvider,
-)
+from libcst.metadata import MetadataWrapper, PositionProvider, ProviderT
 
-from tato._graph import create_graphs, topological_sort
-from tato._section import categorize_sections
-from tato.index.index import Index, NoopIndex
+from tato import _trace
+from tato._graph import create_graphs, sort_graphs
+from tato._metadata import GlobalDependencyProvider
+from tato.index.index import Index, NoopIndex, shared_index
 
 
 class ReorderFileCodemod(codemod.VisitorBasedCodemodCommand):
@@ -31,12 +28,7 @@ class ReorderFileCodemod(codemod.VisitorBasedCodemodCommand):
     is ordered.
     """
 
-    METADATA_DEPENDENCIES = (
-        ScopeProvider,
-        ParentNodeProvider,
-        PositionProvider,
-        FullyQualifiedNameProvider,
-    )
+    METADATA_DEPENDENCIES = (GlobalDependencyProvider,)
 
     @staticmethod
     def add_args(arg_parser: argparse.ArgumentParser) -> None:
@@ -55,23 +47,42 @@ class ReorderFileCodemod(codemod.VisitorBasedCodemodCommand):
     ) -> None:
         super().__init__(context)
         self.with_index = with_index
+        # False if the last module was already in order, so the code of the
+        # result is the code of the input.
+        self.reordered = True
+
+    @contextmanager
+    def resolve(self, wrapper: MetadataWrapper) -> Iterator[None]:
+        if _trace.enabled():
+            # Resolve providers one by one, dependencies first, to time each.
+            # Batchable providers then each visit the module on their own.
+            for provider in _resolution_order(self.get_inherited_dependencies()):
+                with _trace.span("metadata", provider=provider.__name__):
+                    wrapper.resolve(provider)
+        with super().resolve(wrapper):
+            yield
 
     def leave_Module(
         self, original_node: cst.Module, updated_node: cst.Module
     ) -> cst.Module:
         # Connect to index (database) inside of the transform to avoid pickling
-        # the db connections across forked processes.
-        index = (
-            Index(Path(self.with_index)) if self.with_index else NoopIndex(Path("."))
-        )
-        graphs = create_graphs(original_node, self.metadata, index)
-        topo_sorted_called_by = topological_sort(graphs["called_by"])
-        topo_sorted_calls = topological_sort(graphs["calls"])
-        imports, sections = categorize_sections(
-            topo_sorted_called_by, index, topo_sorted_calls
-        )
-
+        # the db connections across forked processes. Each process (and thread)
+        # opens the index once.
+        index = open_index(self.with_index)
         should_explain = os.environ.get("TATO_DEBUG_EXPLAIN", "") == "1"
+        positions = None
+        if should_explain and self.context.wrapper is not None:
+            positions = self.context.wrapper.resolve(PositionProvider)
+        with _trace.span("create_graphs"):
+            graphs = create_graphs(
+                original_node,
+                self.metadata,
+                index,
+                module_name=self.context.full_module_name if self.with_index else None,
+                positions=positions,
+            )
+        imports, sections = sort_graphs(graphs, index)
+
         if should_explain:
             body = []
             body.append(_comment("## Section #1: Imports"))
@@ -88,8 +99,34 @@ class ReorderFileCodemod(codemod.VisitorBasedCodemodCommand):
                 n.node for s in sections for n in s.flatten()
             ]
 
+        self.reordered = len(body) != len(original_node.body) or any(
+            a is not b for a, b in zip(body, original_node.body)
+        )
+        if not self.reordered:
+            return updated_node
         return updated_node.with_changes(body=body)
 
 
+def open_index(with_index: Optional[str]) -> Index:
+    """The index at `with_index` (see `--with-index`), if any."""
+    return shared_index(Path(with_index)) if with_index else NoopIndex(Path("."))
+
+
+def _resolution_order(providers: Iterable[ProviderT]) -> list[ProviderT]:
+    """`providers` and their dependencies, each after its dependencies."""
+    order: list[ProviderT] = []
+
+    def visit(provider: ProviderT) -> None:
+        if provider in order:
+            return
+        for dependency in provider.METADATA_DEPENDENCIES:
+            visit(dependency)
+        order.append(provider)
+
+    for provider in providers:
+        visit(provider)
+    return order
+
+
 def _comment(s: str) -> cst.EmptyLine:
     return cst.EmptyLine(comment=cst.Comment(s))
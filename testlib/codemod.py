@@ -4,9 +4,13 @@ from tempfile import NamedTemporaryFile
 from libcst.codemod import CodemodContext, CodemodTest
 from libcst.metadata import FullRepoManager
 
+from testlib.graph import assert_ast_analysis_matches
+
 
 class TatoCodemodTest(CodemodTest):
     def assertCodemodWithCache(self, before: str, after: str):
+        # Files in order are only checked with `ast`.
+        assert_ast_analysis_matches(self.make_fixture_data(before))
         with NamedTemporaryFile() as f:
             p = Path(f.name)
             manager = FullRepoManager(
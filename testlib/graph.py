@@ -0,0 +1,231 @@
+import ast
+from collections import defaultdict
+from pathlib import Path
+from typing import Mapping, Optional, cast
+
+import libcst as cst
+from libcst.metadata import (
+    Assignment,
+    BatchableMetadataProvider,
+    ClassScope,
+    CodeRange,
+    GlobalScope,
+    MetadataWrapper,
+    PositionProvider,
+    ProviderT,
+    Scope,
+    ScopeProvider,
+)
+
+from tato import _ast_analysis, _trace
+from tato._graph import (
+    LARGE_NUM,
+    Graphs,
+    _mark_cycles,
+    _top_level_fqns,
+    create_graphs,
+    sort_graphs,
+)
+from tato._metadata import GlobalDependencyProvider
+from tato._node import OrderedNode
+from tato._node_type import NodeType, TopLevelNode, node_type
+from tato.index.index import Index, NoopIndex
+
+
+class TopLevelNodeProvider(BatchableMetadataProvider[TopLevelNode]):
+    """Maps every node to the statement in `cst.Module.body` that contains it.
+
+    Statements map to themselves. The module, and the lines around its body,
+    have no metadata. Only `create_graphs_from_scopes` needs it.
+    """
+
+    def visit_Module(self, node: cst.Module) -> Optional[bool]:
+        for statement in node.body:
+            statement.visit(_TopLevelNodeVisitor(self, statement))
+        return None
+
+
+class _TopLevelNodeVisitor(cst.CSTVisitor):
+    def __init__(self, provider: TopLevelNodeProvider, statement: TopLevelNode):
+        super().__init__()
+        self.provider = provider
+        self.statement = statement
+
+    def on_visit(self, node: cst.CSTNode) -> bool:
+        self.provider.set_metadata(node, self.statement)
+        return True
+
+
+METADATA_DEPENDENCIES = (ScopeProvider, TopLevelNodeProvider, PositionProvider)
+
+
+def create_graphs_from_scopes(
+    module: cst.Module,
+    metadata: Mapping[ProviderT, Mapping[cst.CSTNode, object]],
+    index: Index,
+    module_name: Optional[str] = None,
+) -> Graphs:
+    """`tato._graph.create_graphs`, built on `ScopeProvider`.
+
+    The implementation `GlobalDependencyProvider` replaced, kept to test that
+    both find the same graphs. `metadata` must contain `METADATA_DEPENDENCIES`.
+    """
+    scopes = cast(Mapping[cst.CSTNode, Scope], metadata[ScopeProvider]).values()
+    top_level_nodes = cast(
+        Mapping[cst.CSTNode, TopLevelNode], metadata[TopLevelNodeProvider]
+    )
+    positions = cast(Mapping[cst.CSTNode, CodeRange], metadata[PositionProvider])
+
+    modulebodyset: set[TopLevelNode] = set(module.body)
+    globalscope = next((s.globals for s in scopes if s is not None))
+
+    names: dict[TopLevelNode, set[str]] = defaultdict(set)
+    calls: dict[TopLevelNode, list[TopLevelNode]] = {}
+    called_by: dict[TopLevelNode, list[TopLevelNode]] = {}
+    edges: list[tuple[TopLevelNode, TopLevelNode]] = []
+    first_access: dict[TopLevelNode, tuple[int, int]] = defaultdict(
+        lambda: (LARGE_NUM, LARGE_NUM)
+    )
+    for node in module.body:
+        calls[node] = []
+        called_by[node] = []
+
+    globalscope = next((s.globals for s in scopes if s is not None), None)
+    if globalscope is None:
+        raise Exception("No global scope found")
+
+    # In the order of `GlobalDependencyProvider`: names by their first
+    # assignment, then the assignments of each name in source order. The
+    # order of the edges decides which nodes `_mark_cycles` marks.
+    by_name: dict[str, list[Assignment]] = {}
+    for assignment in sorted(
+        (a for a in globalscope.assignments if isinstance(a, Assignment)),
+        key=lambda a: _start(positions[a.node]),
+    ):
+        by_name.setdefault(assignment.name, []).append(assignment)
+
+    for assignment in (a for group in by_name.values() for a in group):
+        top_level_assignment = top_level_nodes[assignment.node]
+        names[top_level_assignment].add(assignment.name)
+
+        # Nodes that are not accessed in this file are assumed to be
+        # public exports and used by other files. Assumed to be important,
+        # so they sort to the top of the file.
+        if len(assignment.references) == 0:
+            first_access[top_level_assignment] = (0, 0)
+
+        for access in sorted(
+            assignment.references, key=lambda a: _start(positions[a.node])
+        ):
+            top_level_access = top_level_nodes[access.node]
+
+            # Skip self-edges.
+            if top_level_assignment == top_level_access:
+                continue
+
+            # Ignore usages of imports
+            if node_type(top_level_assignment) == NodeType.IMPORT:
+                continue
+
+            # Accessess in globalscope/classscope happen at import time.
+            # These values MUST be topological sorted to maintain correctness.
+            if isinstance(access.scope, (GlobalScope, ClassScope)):
+                called_by[top_level_assignment].append(top_level_access)
+
+            # This is.. super confusing. A decorator must be defined before
+            # the function it decorates (compile time). We fake a call edge
+            # from assignment -> access so the topological function sorts
+            # the decorator first.
+            if (
+                node_type(top_level_assignment) == NodeType.FUNCTION
+                and node_type(top_level_access) == NodeType.FUNCTION
+                and access.scope == globalscope
+            ):
+                src, dst = top_level_assignment, top_level_access
+            else:
+                src, dst = top_level_access, top_level_assignment
+            calls[src].append(dst)
+            edges.append((src, dst))
+
+            # Track first access of the assignment.
+            first_access[top_level_assignment] = min(
+                first_access[top_level_assignment], _start(positions[access.node])
+            )
+
+    # Only the call graph should have cycles. A cycle in the called_by graph
+    # would be invalid.
+    # Remove all nodes with cycles from `calls`. Cycles can't be ordered well,
+    # so default to relying on original order.
+    has_cycle = _mark_cycles(calls, edges)
+    for k, vs in calls.items():
+        calls[k] = [v for v in vs if v not in has_cycle]
+
+    # All counts are fetched from the index at once.
+    node_fqns = _top_level_fqns(module, module_name) if module_name else {}
+    with _trace.span("count_references"):
+        num_references = index.count_references_many(node_fqns.values())
+
+    prev_line_nums = {node: i for i, node in enumerate(module.body)}
+    ordered_nodes = [
+        OrderedNode(
+            node=node,
+            names=list(names[node]),
+            node_type=node_type(node, prev_line_nums[node]),
+            num_references=num_references[node_fqns[node]] if node in node_fqns else 0,
+            first_access=first_access[node],
+            has_cycle=node in has_cycle,
+            prev_body_index=prev_line_nums[node],
+        )
+        for node in modulebodyset
+    ]
+    lookup = {n.node: n for n in ordered_nodes}
+    return {
+        "calls": {lookup[k]: set(lookup[v] for v in vs) for k, vs in calls.items()},
+        "called_by": {
+            lookup[k]: set(lookup[v] for v in vs) for k, vs in called_by.items()
+        },
+    }
+
+
+def assert_ast_analysis_matches(source: str) -> None:
+    """Check that `tato._ast_analysis` finds the graphs and order of libcst."""
+    index = NoopIndex(Path("."))
+    module = cst.parse_module(source)
+    metadata = MetadataWrapper(module, unsafe_skip_copy=True).resolve_many(
+        [GlobalDependencyProvider]
+    )
+    expected = create_graphs(module, metadata, index)
+    lines = _ast_analysis.top_level_lines(ast.parse(source), source.encode())
+    graphs = _ast_analysis.create_graphs(lines, index)
+
+    assert len(lines) == len(module.body)
+    assert _summary(graphs) == _summary(expected)
+    assert _order(graphs, index) == _order(expected, index)
+    in_order = _order(expected, index) == list(range(len(module.body)))
+    assert _ast_analysis.in_order(source.encode(), index) == in_order
+
+
+def _summary(graphs: Graphs) -> dict[int, tuple]:
+    # Accesses are numbered by libcst, but are positions for `ast`.
+    first_accesses = sorted({node.first_access for node in graphs["calls"]})
+    return {
+        node.prev_body_index: (
+            sorted(node.names),
+            node.node_type,
+            first_accesses.index(node.first_access),
+            node.has_cycle,
+            sorted(n.prev_body_index for n in graphs["calls"][node]),
+            sorted(n.prev_body_index for n in graphs["called_by"][node]),
+        )
+        for node in graphs["calls"]
+    }
+
+
+def _order(graphs: Graphs, index: Index) -> list[int]:
+    imports, sections = sort_graphs(graphs, index)
+    nodes = [*imports, *(n for section in sections for n in section.flatten())]
+    return [n.prev_body_index for n in nodes]
+
+
+def _start(coderange: CodeRange) -> tuple[int, int]:
+    return (coderange.start.line, coderange.start.column)
@@ -0,0 +1,109 @@
+import ast
+from pathlib import Path
+
+import libcst as cst
+import pytest
+from libcst.helpers import get_full_name_for_node
+
+from tato._ast_analysis import full_name, in_order, top_level_lines
+from tato.index.index import NoopIndex
+from testlib.graph import assert_ast_analysis_matches
+from tests.test_graph import SNIPPETS
+
+ROOT = Path(__file__).parent.parent
+
+# Code that `ast` and libcst represent differently.
+AST_SNIPPETS = {
+    "lines": (
+        "a = 1; b = a\n"
+        "c = b \\\n"
+        "  ; d = c\n"
+        "e = d;\n"
+        "f = e  # g; h\n"
+    ),
+    "match": (
+        "import enum\n"
+        "class Color(enum.Enum):\n"
+        "    RED = 1\n"
+        "def f(p):\n"
+        "    match p:\n"
+        "        case Color.RED:\n"
+        "            return x\n"
+        "        case {'k': y, **z}:\n"
+        "            return y\n"
+        "        case Point(x=w, y=[*u, _]) as q if q:\n"
+        "            return q\n"
+        "        case [v, *_] | (v,):\n"
+        "            return v\n"
+        "class Point: pass\n"
+        "x = y = z = w = u = v = 1\n"
+    ),
+    "parameters_and_strings": (
+        "from typing import Annotated, NewType, Optional\n"
+        "UserId = NewType('UserId', 'Base')\n"
+        "def g(a: Annotated[int, 'Base'], /, *args: 'Base', k=1, **kw) -> None:\n"
+        "    return f'{Base!r:{width}} {a}'\n"
+        "async def h():\n"
+        "    async with Base() as b, width as (c, d):\n"
+        "        pass\n"
+        "    try:\n"
+        "        pass\n"
+        "    except Base as e:\n"
+        "        print(e)\n"
+        "    return [y := j for j in range(width) for k in j if (m := k)]\n"
+        "class Base(object, metaclass=type):\n"
+        "    x: 'Base'\n"
+        "    def m(self, z=lambda q=width: q): return self.x\n"
+        "width = 10\n"
+    ),
+    "attributes_of_values": (
+        "import typing\n"
+        "def f(): return typing\n"
+        "x = f().cast(int, 'Base').x\n"
+        "y = [f][0]().cast(int, 'Base')\n"
+        "z = (f() or typing).cast(int, 'Base')\n"
+        "class Base: pass\n"
+    ),
+}
+
+# Every file of the test suite, inputs of `tests/large` included.
+FILES = sorted(ROOT.glob("tests/**/*.py"))
+
+
+@pytest.mark.parametrize(
+    "source",
+    [*SNIPPETS.values(), *AST_SNIPPETS.values(), *(f.read_text() for f in FILES)],
+    ids=[*SNIPPETS, *AST_SNIPPETS, *(str(f.relative_to(ROOT)) for f in FILES)],
+)
+def test_ast_analysis_matches_libcst(source: str) -> None:
+    assert_ast_analysis_matches(source)
+
+
+def test_top_level_lines() -> None:
+    source = AST_SNIPPETS["lines"].encode()
+
+    lines = top_level_lines(ast.parse(source), source)
+
+    assert [[ast.unparse(n) for n in line] for line in lines] == [
+        ["a = 1", "b = a"],
+        ["c = b", "d = c"],
+        ["e = d"],
+        ["f = e"],
+    ]
+
+
+def test_in_order() -> None:
+    index = NoopIndex(Path("."))
+    assert in_order(b"def b():\n    a()\ndef a():\n    pass\n", index)
+    assert not in_order(b"def a():\n    pass\ndef b():\n    a()\n", index)
+
+
+@pytest.mark.parametrize("source", ["a", "a.b", "f().x", "a[0].x", "a.f()[0].x.y"])
+def test_full_name(source: str) -> None:
+    expected = get_full_name_for_node(cst.parse_expression(source))
+    assert full_name(ast.parse(source, mode="eval").body) == expected
+
+
+def test_full_name_without_name() -> None:
+    assert full_name(ast.parse("(a + b).x", mode="eval").body) is None
+    assert full_name(ast.parse("''.join", mode="eval").body) is None
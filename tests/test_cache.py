@@ -0,0 +1,67 @@
+import itertools
+import time
+from pathlib import Path
+
+import pytest
+
+from tato._cache import FormatCache, cache_key
+
+
+def test_unformatted(tmp_path: Path) -> None:
+    a, b = tmp_path / "a.py", tmp_path / "b.py"
+    a.write_text("A = 1\n")
+    b.write_text("B = 1\n")
+    cache = FormatCache(tmp_path / "cache")
+    assert cache.unformatted([str(a), str(b)]) == [str(a), str(b)]
+
+    cache.add([cache.key(a.read_bytes(), str(a))])
+    assert cache.unformatted([str(a), str(b)]) == [str(b)]
+
+    a.write_text("A = 2\n")
+    assert cache.unformatted([str(a), str(b)]) == [str(a), str(b)]
+
+
+def test_unformatted_missing_file(tmp_path: Path) -> None:
+    cache = FormatCache(tmp_path / "cache")
+    missing = str(tmp_path / "missing.py")
+    assert cache.unformatted([missing]) == [missing]
+
+
+def test_keys_depend_on_index_generation(tmp_path: Path) -> None:
+    a = tmp_path / "a.py"
+    a.write_text("A = 1\n")
+    FormatCache(tmp_path / "cache", "gen1").add(
+        [cache_key(a.read_bytes(), "gen1", "a.py")]
+    )
+    gen1 = FormatCache(tmp_path / "cache", "gen1", repo_root=str(tmp_path))
+    gen2 = FormatCache(tmp_path / "cache", "gen2", repo_root=str(tmp_path))
+    assert gen1.unformatted([str(a)]) == []
+    assert gen2.unformatted([str(a)]) == [str(a)]
+
+
+def test_keys_depend_on_path_with_index(tmp_path: Path) -> None:
+    # Formatted with an index, the same content may be ordered differently in
+    # another module.
+    a, b = tmp_path / "a.py", tmp_path / "b.py"
+    a.write_text("A = 1\n")
+    b.write_text("A = 1\n")
+    cache = FormatCache(tmp_path / "cache", "gen", repo_root=str(tmp_path))
+    cache.add([cache_key(a.read_bytes(), "gen", "a.py")])
+    assert cache.unformatted([str(a), str(b)]) == [str(b)]
+
+    # Without an index, only the content matters.
+    cache = FormatCache(tmp_path / "cache", repo_root=str(tmp_path))
+    cache.add([cache_key(a.read_bytes(), "", "a.py")])
+    assert cache.unformatted([str(a), str(b)]) == []
+
+
+def test_evict(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    clock = itertools.count()
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+    cache = FormatCache(tmp_path / "cache", max_entries=2)
+    cache.add(["1"])
+    cache.add(["2"])
+    cache.add(["3"])
+    cache.evict()
+    keys = {row[0] for row in cache.conn.execute("SELECT key FROM Formatted")}
+    assert keys == {"2", "3"}
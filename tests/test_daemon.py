@@ -0,0 +1,58 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from tato._client import format_with_daemon, request
+from tato._daemon import DaemonError, serve, stop
+
+UNORDERED = "def a():\n    pass\n\n\ndef b():\n    a()\n"
+
+
+@pytest.fixture
+def daemon(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    path = tmp_path / "daemon.sock"
+    monkeypatch.setenv("TATO_DAEMON_SOCKET", str(path))
+    monkeypatch.setenv("TATO_CACHE_DIR", str(tmp_path / "cache"))
+    thread = threading.Thread(target=serve, args=(path,))
+    thread.start()
+    while request({"command": "ping"}, path) is None:
+        pass
+    yield path
+    stop(path)
+    thread.join()
+
+
+def test_format_with_daemon(
+    daemon: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys
+):
+    tmp_path.joinpath("mod.py").write_text(UNORDERED)
+    monkeypatch.chdir(tmp_path)
+
+    assert format_with_daemon(["format", "mod.py", "--no-format"]) == 0
+    assert tmp_path.joinpath("mod.py").read_text() != UNORDERED
+    assert "Transformed 1 files successfully." in capsys.readouterr().err
+
+    # The daemon uses the client's cache directory.
+    assert format_with_daemon(["format", "mod.py", "--no-format"]) == 0
+    assert "Skipped 1 cached files." in capsys.readouterr().err
+    assert tmp_path.joinpath("cache").exists()
+
+
+def test_version_mismatch(daemon: Path):
+    response = request({"command": "format", "version": "0.0.0"}, daemon)
+    assert response is not None and "error" in response
+
+
+def test_no_daemon(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("TATO_DAEMON_SOCKET", str(tmp_path / "daemon.sock"))
+    assert format_with_daemon(["format", "mod.py"]) is None
+
+    # A socket left behind by a daemon that is gone.
+    tmp_path.joinpath("daemon.sock").touch()
+    assert format_with_daemon(["format", "mod.py"]) is None
+
+
+def test_serve_twice(daemon: Path):
+    with pytest.raises(DaemonError):
+        serve(daemon)
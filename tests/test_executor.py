@@ -0,0 +1,153 @@
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+from tato._cache import cache_key
+from tato._executor import (
+    Backend,
+    ExecutorConfig,
+    Status,
+    choose_backend,
+    execute,
+    format_file,
+)
+
+UNORDERED = "def a():\n    pass\n\n\ndef b():\n    a()\n"
+ORDERED = "def b():\n    a()\n\n\ndef a():\n    pass\n"
+# Without a formatter, the blank lines move with the functions.
+REORDERED = "\n\ndef b():\n    a()\ndef a():\n    pass\n"
+
+
+@pytest.mark.parametrize("backend", list(Backend))
+def test_execute(tmp_path: Path, backend: Backend) -> None:
+    for i in range(10):
+        tmp_path.joinpath(f"unordered{i}.py").write_text(UNORDERED)
+        tmp_path.joinpath(f"ordered{i}.py").write_text(ORDERED)
+    tmp_path.joinpath("invalid.py").write_text("def (")
+    tmp_path.joinpath("generated.py").write_text(f"# @generated\n{UNORDERED}")
+    config = ExecutorConfig(repo_root=str(tmp_path), format_code=False)
+
+    result = execute(
+        [str(p) for p in tmp_path.glob("*.py")], config, jobs=2, backend=backend
+    )
+
+    assert (result.successes, result.skips, result.failures) == (20, 1, 1)
+    for i in range(10):
+        assert tmp_path.joinpath(f"unordered{i}.py").read_text() == REORDERED
+        assert tmp_path.joinpath(f"ordered{i}.py").read_text() == ORDERED
+    assert tmp_path.joinpath("generated.py").read_text() == f"# @generated\n{UNORDERED}"
+
+
+def test_format_file_cache_key(tmp_path: Path) -> None:
+    path = tmp_path / "mod.py"
+    path.write_text(UNORDERED)
+    config = ExecutorConfig(
+        repo_root=str(tmp_path), format_code=False, cache_generation="gen"
+    )
+
+    result = format_file(str(path), config)
+
+    assert result.status is Status.SUCCESS
+    assert result.changed
+    assert result.cache_key == cache_key(REORDERED.encode(), "gen", "mod.py")
+
+
+def test_choose_backend() -> None:
+    assert choose_backend(1000, jobs=1) is Backend.SERIAL
+    assert choose_backend(3, jobs=8) is Backend.SERIAL
+    assert choose_backend(1000, jobs=8) in (Backend.PROCESS, Backend.THREAD)
+
+
+def test_check(tmp_path: Path) -> None:
+    unordered, ordered = tmp_path / "unordered.py", tmp_path / "ordered.py"
+    unordered.write_text(UNORDERED)
+    ordered.write_text(ORDERED)
+    config = ExecutorConfig(repo_root=str(tmp_path), format_code=False, check=True)
+
+    result = execute([str(unordered), str(ordered)], config)
+
+    assert (result.successes, result.changed) == (2, 1)
+    assert unordered.read_text() == UNORDERED
+
+
+def test_diff(tmp_path: Path) -> None:
+    path = tmp_path / "mod.py"
+    path.write_text(UNORDERED)
+    config = ExecutorConfig(repo_root=str(tmp_path), format_code=False, diff=1)
+
+    result = format_file(str(path), config)
+
+    assert result.changed
+    assert "-def a():\n" in result.diff
+    assert path.read_text() == UNORDERED
+
+
+def test_ordered_file_is_not_written(tmp_path: Path) -> None:
+    path = tmp_path / "mod.py"
+    path.write_text(ORDERED)
+    mtime_ns = path.stat().st_mtime_ns
+    # The formatter would fail, but is not needed.
+    config = ExecutorConfig(repo_root=str(tmp_path), formatter_args=["false"])
+
+    result = format_file(str(path), config)
+
+    assert result.status is Status.SUCCESS
+    assert not result.changed
+    assert path.stat().st_mtime_ns == mtime_ns
+
+
+@pytest.mark.parametrize("ast_analysis", [True, False])
+def test_ast_analysis(tmp_path: Path, ast_analysis: bool) -> None:
+    unordered, ordered = tmp_path / "unordered.py", tmp_path / "ordered.py"
+    unordered.write_text(UNORDERED)
+    ordered.write_text(ORDERED)
+    config = ExecutorConfig(
+        repo_root=str(tmp_path),
+        format_code=False,
+        check=True,
+        cache_generation="gen",
+        trace=True,
+        ast_analysis=ast_analysis,
+    )
+
+    results = [format_file(str(p), config) for p in (unordered, ordered)]
+
+    assert [r.changed for r in results] == [True, False]
+    assert results[1].cache_key == cache_key(ORDERED.encode(), "gen", "ordered.py")
+    # libcst only parses the files to reorder.
+    parsed = [any(e["name"] == "parse" for e in r.trace_events) for r in results]
+    assert parsed == [True, not ast_analysis]
+
+
+@pytest.mark.parametrize("backend", [Backend.SERIAL, Backend.PROCESS])
+def test_trace(tmp_path: Path, backend: Backend) -> None:
+    for i in range(2):
+        tmp_path.joinpath(f"unordered{i}.py").write_text(UNORDERED)
+    config = ExecutorConfig(repo_root=str(tmp_path), format_code=False, trace=True)
+
+    result = execute(
+        [str(p) for p in tmp_path.glob("*.py")], config, jobs=2, backend=backend
+    )
+
+    names = [e["name"] for e in result.trace_events]
+    assert names.count("format_file") == 2
+    assert names.count("create_graphs") == 2
+    providers = {e["args"].get("provider") for e in result.trace_events}
+    assert "GlobalDependencyProvider" in providers
+
+
+def test_profile_memory(tmp_path: Path) -> None:
+    path = tmp_path / "mod.py"
+    path.write_text(UNORDERED)
+    config = ExecutorConfig(
+        repo_root=str(tmp_path), format_code=False, profile_memory=True
+    )
+
+    result = format_file(str(path), config)
+    # Started to measure the file, as a worker would.
+    tracemalloc.stop()
+
+    assert result.memory is not None
+    assert result.memory.filename == str(path)
+    assert result.memory.peak_traced > 0
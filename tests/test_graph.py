@@ -0,0 +1,313 @@
+import sys
+from pathlib import Path
+
+import libcst as cst
+import pytest
+from libcst.metadata import (
+    FullRepoManager,
+    FullyQualifiedNameProvider,
+    MetadataWrapper,
+    PositionProvider,
+)
+
+from tato._graph import (
+    Graphs,
+    _TopologicalOrder,
+    _find_cycles,
+    _mark_cycles,
+    _top_level_fqns,
+    create_graphs,
+    topological_sort,
+)
+from tato._metadata import GlobalDependencyProvider
+from tato._node import OrderedNode, rank_nodes
+from tato._node_type import NodeType
+from tato.index.index import NoopIndex
+from testlib.graph import METADATA_DEPENDENCIES, create_graphs_from_scopes
+
+ROOT = Path(__file__).parent.parent
+
+# Code where `ScopeProvider` has rules to follow.
+SNIPPETS = {
+    "shadowing": (
+        "x = 1\n"
+        "def f():\n"
+        "    print(x)\n"
+        "    x = 2\n"
+        "    return x\n"
+        "def g(x=x):\n"
+        "    return x\n"
+        "class A:\n"
+        "    x = x\n"
+        "    def m(self):\n"
+        "        return x\n"
+    ),
+    "global_and_nonlocal": (
+        "def f():\n"
+        "    global y\n"
+        "    y = 1\n"
+        "def g():\n"
+        "    return y\n"
+        "def h():\n"
+        "    z = 1\n"
+        "    def i():\n"
+        "        nonlocal z\n"
+        "        z = y\n"
+        "    return i\n"
+    ),
+    "comprehensions": (
+        "a = [1]\n"
+        "b = [a for a in a]\n"
+        "c = {k: v for k in b for v in a if k}\n"
+        "d = (e for e in c)\n"
+        "def f():\n"
+        "    return [x for x in d if x in c]\n"
+    ),
+    "decorators_and_lambdas": (
+        "def deco(fn):\n"
+        "    return fn\n"
+        "@deco\n"
+        "def f(key=lambda x: deco(x)):\n"
+        "    return key\n"
+        "g = lambda: f()\n"
+    ),
+    "dotted_imports": (
+        "import os.path\n"
+        "import a.b.c as d\n"
+        "from . import e\n"
+        "P = os.path.join(d.x, e)\n"
+        "def f():\n"
+        "    return os.sep\n"
+    ),
+    "annotations": (
+        "from typing import TYPE_CHECKING, Literal, TypeVar, cast\n"
+        "import typing as t\n"
+        "T = TypeVar('T', bound='A')\n"
+        "def f(a: 'A', b: 'list[B]') -> 'Literal[\"A\"]':\n"
+        "    return cast('B', t.cast('A', a))\n"
+        "x: Literal['A'] = 'A'\n"
+        "y: t.Optional['B'] = None\n"
+        "class A: pass\n"
+        "class B(A): pass\n"
+    ),
+    "statements": (
+        "import contextlib\n"
+        "try:\n"
+        "    import json\n"
+        "except ImportError as error:\n"
+        "    json = None\n"
+        "with contextlib.suppress(Exception) as s:\n"
+        "    pass\n"
+        "for i, (j, *k) in []:\n"
+        "    del i\n"
+        "if (n := 1):\n"
+        "    m = n\n"
+        "match m:\n"
+        "    case {'k': json} | [s, *json]:\n"
+        "        pass\n"
+        "def f():\n"
+        "    v = n\n"
+        "    v += m\n"
+        "    return f(v).x\n"
+    ),
+    # Only the edge order tells which nodes of the cycle are marked: `c` is
+    # in the cycle, but isn't on the path that finds it.
+    "cycles": (
+        "def a():\n"
+        "    b()\n"
+        "def c():\n"
+        "    a()\n"
+        "def b():\n"
+        "    a()\n"
+        "    c()\n"
+    ),
+}
+
+
+# Real code, besides the snippets.
+FILES = [
+    *sorted(ROOT.glob("tests/large/*/*.py")),
+    ROOT / "src/tato/cli.py",
+    ROOT / "src/tato/index/_definition.py",
+]
+
+
+def _summary(graphs: Graphs) -> dict[int, tuple]:
+    return {
+        node.prev_body_index: (
+            sorted(node.names),
+            node.node_type,
+            node.first_access,
+            node.has_cycle,
+            sorted(n.prev_body_index for n in graphs["calls"][node]),
+            sorted(n.prev_body_index for n in graphs["called_by"][node]),
+        )
+        for node in graphs["calls"]
+    }
+
+
+def _order(graphs: Graphs) -> tuple[list[int], list[int]]:
+    ranks = rank_nodes(graphs["calls"])
+    return (
+        [n.prev_body_index for n in topological_sort(graphs["called_by"], ranks)],
+        [n.prev_body_index for n in topological_sort(graphs["calls"], ranks)],
+    )
+
+
+@pytest.mark.parametrize(
+    "source",
+    [*SNIPPETS.values(), *(f.read_text() for f in FILES)],
+    ids=[*SNIPPETS, *(str(f.relative_to(ROOT)) for f in FILES)],
+)
+def test_create_graphs_matches_scope_provider(source: str) -> None:
+    wrapper = MetadataWrapper(cst.parse_module(source))
+    index = NoopIndex(Path("."))
+    expected = create_graphs_from_scopes(
+        wrapper.module, wrapper.resolve_many(METADATA_DEPENDENCIES), index
+    )
+    metadata = wrapper.resolve_many([GlobalDependencyProvider])
+    positions = wrapper.resolve(PositionProvider)
+
+    graphs = create_graphs(wrapper.module, metadata, index, positions=positions)
+    assert _summary(graphs) == _summary(expected)
+    # Numbering accesses in source order sorts like their positions.
+    assert _order(create_graphs(wrapper.module, metadata, index)) == _order(graphs)
+
+
+def test_find_cycles() -> None:
+    graph = {
+        "entry": ["a"],
+        "a": ["b"],
+        "b": ["c", "a"],
+        "c": ["d"],
+        "d": ["c"],
+        "e": [],
+    }
+    assert _find_cycles(graph) == {"a", "b", "c", "d"}
+
+
+def test_find_cycles_without_cycles() -> None:
+    assert _find_cycles({"a": ["b", "c"], "b": ["c"], "c": []}) == set()
+
+
+def test_mark_cycles() -> None:
+    edges = [
+        ("entry", "a"),
+        ("a", "b"),
+        ("b", "c"),
+        # Closes a -> b -> a, found on the path from `entry`, which is marked.
+        ("b", "a"),
+        ("c", "d"),
+        # Closes c -> d -> c, once `b -> a` is left out.
+        ("d", "c"),
+    ]
+    graph: dict[str, list[str]] = {n: [] for n in ["e", "entry", "a", "b", "c", "d"]}
+    for src, dst in edges:
+        graph[src].append(dst)
+    assert _find_cycles(graph) == {"a", "b", "c", "d"}
+    assert _mark_cycles(graph, edges) == {"entry", "a", "b", "c", "d"}
+
+
+def test_mark_cycles_without_cycles() -> None:
+    graph = {"a": ["b", "c"], "b": ["c"], "c": []}
+    assert _mark_cycles(graph, [("a", "b"), ("a", "c"), ("b", "c")]) == set()
+
+
+def test_mark_cycles_deep_graph() -> None:
+    depth = sys.getrecursionlimit() * 2
+    graph = {i: [i + 1] for i in range(depth)}
+    graph[depth] = [0]
+    edges = [(i, i + 1) for i in range(depth)] + [(depth, 0)]
+    assert len(_mark_cycles(graph, edges)) == depth + 1
+
+
+def test_topological_order() -> None:
+    order = _TopologicalOrder(["a", "b", "c", "d"])
+    # Against the order, so `d` and `c` move before `b`.
+    assert order.add_edge("d", "b")
+    assert order.add_edge("c", "d")
+    assert order.add_edge("a", "c")
+    # Would close a -> c -> d -> b -> a, and c -> d -> b -> c.
+    assert not order.add_edge("b", "a")
+    assert not order.add_edge("b", "c")
+    position = order.position
+    assert position["a"] < position["c"] < position["d"] < position["b"]
+
+
+def test_find_cycles_deep_graph() -> None:
+    depth = sys.getrecursionlimit() * 2
+    graph = {i: [i + 1] for i in range(depth)}
+    graph[depth] = [0]
+    assert len(_find_cycles(graph)) == depth + 1
+
+
+def test_top_level_fqns_match_provider(tmp_path: Path) -> None:
+    path = tmp_path / "pkg" / "mod.py"
+    path.parent.mkdir()
+    path.write_text(
+        "import os\n"
+        "from a import b as c\n"
+        "X = Y = 1\n"
+        "@decorator\n"
+        "def fn(): pass\n"
+        "async def afn(): pass\n"
+        "class K: pass\n"
+        "if X:\n"
+        "    def hidden(): pass\n"
+        "for i in []: pass\n"
+    )
+    manager = FullRepoManager(tmp_path, [str(path)], [FullyQualifiedNameProvider])
+    wrapper = MetadataWrapper(
+        cst.parse_module(path.read_text()),
+        cache=manager.get_cache_for_path(str(path)),
+    )
+    fqns = wrapper.resolve(FullyQualifiedNameProvider)
+
+    expected = {
+        node: fqn.name
+        for node in wrapper.module.body
+        for fqn in fqns.get(node, set())
+    }
+    assert _top_level_fqns(wrapper.module, "pkg.mod") == expected
+    assert sorted(expected.values()) == ["pkg.mod.K", "pkg.mod.afn", "pkg.mod.fn"]
+
+
+def _node(
+    index: int, node_type: NodeType, first_access=(0, 0), has_cycle=False
+) -> OrderedNode:
+    return OrderedNode(
+        node=cst.parse_statement(f"x{index} = 1"),
+        names=[f"x{index}"],
+        node_type=node_type,
+        num_references=0,
+        first_access=first_access,
+        has_cycle=has_cycle,
+        prev_body_index=index,
+    )
+
+
+def test_rank_nodes() -> None:
+    nodes = [
+        _node(0, NodeType.FUNCTION, first_access=(9, 0)),
+        _node(1, NodeType.IMPORT),
+        _node(2, NodeType.FUNCTION, first_access=(3, 0)),
+        _node(3, NodeType.CONSTANT, first_access=(5, 0)),
+        _node(4, NodeType.IMPORT),
+    ]
+    ranks = rank_nodes(nodes)
+    ordered = sorted(nodes, key=ranks.__getitem__)
+    assert ordered == sorted(nodes)
+    assert [n.prev_body_index for n in ordered] == [1, 4, 3, 2, 0]
+
+
+def test_rank_nodes_mixed_cycles() -> None:
+    # `__lt__` is not transitive here: 0 < 1 < 2 < 0.
+    nodes = [
+        _node(0, NodeType.FUNCTION, first_access=(1, 0)),
+        _node(1, NodeType.FUNCTION, has_cycle=True),
+        _node(2, NodeType.FUNCTION, first_access=(0, 0)),
+    ]
+    ranks = rank_nodes(nodes)
+    for a in nodes:
+        for b in nodes:
+            assert (ranks[a] < ranks[b]) == (a < b)
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from tato import _memory
+
+
+def test_memory_profiler() -> None:
+    with _memory.MemoryProfiler() as profiler:
+        assert _memory.is_profiling()
+        with _memory.phase("allocate"):
+            data = bytearray(8 * 2**20)
+            del data
+        _memory.reset_file_peak()
+        data = bytearray(2**20)
+        _memory.add_file(_memory.file_memory("a.py"))
+    assert not _memory.is_profiling()
+
+    [phase] = profiler.phases
+    assert phase.name == "allocate"
+    assert phase.peak_traced >= 8 * 2**20
+    assert phase.peak_rss > 0
+    [file] = profiler.files
+    assert 2**20 <= file.peak_traced < 8 * 2**20
+    assert "a.py" in profiler.format()
+
+
+def test_phase_without_profiler() -> None:
+    with _memory.phase("ignored"):
+        pass
+
+    assert not _memory.is_profiling()
+
+
+def test_import_without_resource() -> None:
+    # As on Windows, where there is no `resource` module.
+    code = (
+        "import sys; sys.modules['resource'] = None\n"
+        "import tato.cli, tato._executor, tato.index.index\n"
+        "from tato import _memory\n"
+        "assert _memory.children_peak_rss() == 0\n"
+    )
+    # Wherever this `tato` was imported from.
+    env = {**os.environ, "PYTHONPATH": str(Path(_memory.__file__).parents[1])}
+    subprocess.run([sys.executable, "-c", code], check=True, env=env)
@@ -0,0 +1,65 @@
+import libcst as cst
+from libcst.metadata import MetadataWrapper
+
+from tato._metadata import GlobalDependencyProvider
+from testlib.graph import TopLevelNodeProvider
+
+
+def test_top_level_node_provider() -> None:
+    wrapper = MetadataWrapper(
+        cst.parse_module("import os\n\n\ndef f():\n    return os.path\n")
+    )
+    top_level_nodes = wrapper.resolve(TopLevelNodeProvider)
+    module = wrapper.module
+    imp, func = module.body
+
+    assert top_level_nodes[imp] is imp
+    assert top_level_nodes[func] is func
+    names = [n for n in top_level_nodes if isinstance(n, cst.Name)]
+    assert [(n.value, top_level_nodes[n]) for n in names] == [
+        ("os", imp),
+        ("f", func),
+        ("os", func),
+        ("path", func),
+    ]
+    assert module not in top_level_nodes
+
+
+def test_global_dependency_provider() -> None:
+    wrapper = MetadataWrapper(
+        cst.parse_module(
+            "import os.path\n"
+            "X = os.path.sep\n"
+            "def f(x=X):\n"
+            "    X = 1\n"
+            "    return g(x, X)\n"
+            "def g(*args): pass\n"
+            "class A:\n"
+            "    y: 'X' = f()\n"
+        )
+    )
+    module = wrapper.module
+    imp, const, f, g, cls = module.body
+
+    assignments = wrapper.resolve(GlobalDependencyProvider)[module]
+    accesses = {
+        (a.name, a.statement): sorted(
+            (
+                module.body.index(access.statement),
+                type(access.node).__name__,
+                access.at_import_time,
+                access.in_global_scope,
+            )
+            for access in a.accesses
+        )
+        for a in assignments
+    }
+    assert accesses == {
+        ("os.path", imp): [(1, "Attribute", True, True)],
+        ("os", imp): [],
+        # The local `X` of `f` shadows it.
+        ("X", const): [(2, "Name", True, True), (4, "SimpleString", True, False)],
+        ("f", f): [(4, "Name", True, False)],
+        ("g", g): [(2, "Name", False, False)],
+        ("A", cls): [],
+    }
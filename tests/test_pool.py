@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from tato._pool import MAX_PENDING_PER_JOB, chunksize, is_serial, map_chunks
+
+
+def _double(chunk: list[int], offset: int) -> list[int]:
+    return [2 * i + offset for i in chunk]
+
+
+def test_is_serial() -> None:
+    assert is_serial(1000, jobs=1)
+    assert is_serial(15, jobs=8)
+    assert not is_serial(16, jobs=8)
+
+
+def test_chunksize() -> None:
+    assert chunksize(10, jobs=8) == 1
+    assert chunksize(320, jobs=8) == 10
+    assert chunksize(100_000, jobs=8) == 32
+
+
+def test_map_chunks() -> None:
+    items = list(range(100))
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = list(map_chunks(pool, _double, items, 2, 1))
+
+    assert sorted(results) == [2 * i + 1 for i in items]
+
+
+def test_map_chunks_cancels_pending_chunks() -> None:
+    submitted: list[list[int]] = []
+
+    def record(chunk: list[int]) -> list[int]:
+        submitted.append(chunk)
+        return chunk
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        results = map_chunks(pool, record, list(range(1000)), 1)
+        next(results)
+        results.close()
+
+    # Only the chunks in flight when iteration stopped ran, out of 32.
+    assert len(submitted) <= MAX_PENDING_PER_JOB
@@ -0,0 +1,33 @@
+import json
+from pathlib import Path
+
+from tato._report import build_report, format_report, write_report
+
+
+def _event(name: str, dur_ms: float, **args: str) -> dict:
+    return {"name": name, "ph": "X", "ts": 0, "dur": dur_ms * 1000, "args": args}
+
+
+def test_build_report(tmp_path: Path) -> None:
+    events = [_event("format_file", ms, filename=f"{ms}.py") for ms in range(1, 101)]
+    events += [_event("parse", 10), _event("parse", 20), _event("count_references", 5)]
+
+    report = build_report(events, wall_time=2.0, top=3)
+
+    assert report.files == 100
+    assert report.files_per_second == 50
+    assert report.latency == {"p50": 0.05, "p95": 0.095, "p99": 0.099}
+    assert report.slowest == [("100.py", 0.1), ("99.py", 0.099), ("98.py", 0.098)]
+    assert report.phases == {"parse": 0.03, "count_references": 0.005}
+    assert "100.py" in format_report(report)
+
+    path = tmp_path / "report.json"
+    write_report(report, path)
+    assert json.loads(path.read_text())["latency"]["p99"] == 0.099
+
+
+def test_build_report_without_files() -> None:
+    report = build_report([], wall_time=0.0)
+
+    assert report.files == 0
+    assert report.latency["p50"] == 0.0
@@ -202,6 +202,30 @@ class TestTato(TatoCodemodTest):
         """
         self.assertCodemodWithCache(before, after)
 
+    def test_functions_with_overlapping_cycles(self) -> None:
+        # Cycles are marked as calls are added. The last call, a -> b, closes
+        # a -> b -> a and is left out, so c is not marked, although it is on
+        # a -> b -> c -> a.
+        before = """
+            def a():
+                b()
+            def c():
+                a()
+            def b():
+                a()
+                c()
+        """
+        after = """
+            def a():
+                b()
+            def b():
+                a()
+                c()
+            def c():
+                a()
+        """
+        self.assertCodemodWithCache(before, after)
+
     def test_classes_with_cycle(self) -> None:
         before = """
             class A:
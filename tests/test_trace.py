@@ -0,0 +1,28 @@
+import json
+from pathlib import Path
+
+from tato import _trace
+
+
+def test_span_outside_record() -> None:
+    with _trace.span("ignored"):
+        pass
+
+    assert not _trace.enabled()
+
+
+def test_record(tmp_path: Path) -> None:
+    with _trace.record() as events:
+        with _trace.span("outer", filename="a.py"):
+            with _trace.span("inner"):
+                pass
+
+    assert [e["name"] for e in events] == ["inner", "outer"]
+    inner, outer = events
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+    assert outer["args"] == {"filename": "a.py"}
+
+    path = tmp_path / "trace.json"
+    _trace.write(path, events)
+    assert json.loads(path.read_text())["traceEvents"] == events